@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
-from .models import UserProfile
+from core.admin import delete_in_background
+from core.pagination import EstimatedCountPaginator
+from .models import UserImport, UserProfile
 
 class UserProfileInline(admin.StackedInline):
     model = UserProfile
@@ -10,7 +12,20 @@ class UserProfileInline(admin.StackedInline):
 
 class UserAdmin(BaseUserAdmin):
     inlines = (UserProfileInline,)
+    actions = (delete_in_background,)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 # Re-register UserAdmin
 admin.site.unregister(User)
 admin.site.register(User, UserAdmin)
+
+@admin.register(UserImport)
+class UserImportAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'total_rows', 'created_count', 'existing_count', 'invalid_count', 'created_by', 'created_at')
+    list_filter = ('status',)
+    exclude = ('rows',)
+    readonly_fields = (
+        'created_by', 'status', 'total_rows', 'created_count', 'existing_count', 'invalid_count',
+        'results', 'created_at', 'finished_at'
+    )
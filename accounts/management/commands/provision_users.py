@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import UserProfile
+from accounts.provisioning import count_results, default_workers, provision_users, read_csv
+
+
+class Command(BaseCommand):
+    help = 'Create users in bulk from a CSV roster; usernames that already exist are skipped, so it is safe to re-run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='Columns: username, password, and optionally email, first_name, last_name, user_type')
+        parser.add_argument('--user-type', choices=[choice for choice, _ in UserProfile.USER_TYPES], help='For rows without a user_type (default: student)')
+        parser.add_argument('--workers', type=int, default=None, help='Password hashing processes (default: PROVISIONING_WORKERS, or one per core)')
+        parser.add_argument('--batch-size', type=int, default=None, help='Users per transaction (default: PROVISIONING_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['csv_file'], newline='', encoding='utf-8-sig') as handle:
+                rows = read_csv(handle)
+        except (OSError, UnicodeDecodeError) as error:
+            raise CommandError(f'Cannot read {options["csv_file"]}: {error}')
+        if options['user_type']:
+            for row in rows:
+                row.setdefault('user_type', options['user_type'])
+
+        workers = options['workers'] or default_workers()
+        self.stdout.write(f'Provisioning {len(rows):,} row(s) with {workers} hashing process(es)')
+        results = provision_users(rows, workers=workers, batch_size=options['batch_size'], log=self.log)
+        for result in results:
+            if result['status'] == 'invalid':
+                errors = '; '.join(f'{field}: {" ".join(messages)}' for field, messages in result['errors'].items())
+                self.stdout.write(self.style.WARNING(f'Row {result["row"]} ({result["username"] or "?"}): {errors}'))
+        counts = count_results(results)
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {counts["created"]}, already existed {counts["exists"]}, invalid {counts["invalid"]}'
+        ))
+
+    def log(self, done, total):
+        self.stdout.write(f'{done:,}/{total:,} valid rows processed')
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-19 07:44
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='profile_picture',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.cas_storage, upload_to='profile_pictures/'),
+        ),
+    ]
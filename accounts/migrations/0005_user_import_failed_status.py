@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_user_imports'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userimport',
+            name='rows',
+            field=models.JSONField(blank=True, default=list, help_text='Submitted rows; cleared once processed or failed, as they hold passwords'),
+        ),
+        migrations.AlterField(
+            model_name='userimport',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20),
+        ),
+    ]
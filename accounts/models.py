@@ -2,8 +2,12 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from core.deletion import deletion_scheduled
+from core.images import schedule_renditions
+from core.models import DirtyFieldsMixin
+from core.storage import cas_storage, track_references
 
-class UserProfile(models.Model):
+class UserProfile(DirtyFieldsMixin, models.Model):
     USER_TYPES = (
         ('student', 'Student'),
         ('instructor', 'Instructor'),
@@ -12,7 +16,8 @@ class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     user_type = models.CharField(max_length=20, choices=USER_TYPES, default='student')
     bio = models.TextField(max_length=500, blank=True)
-    profile_picture = models.ImageField(upload_to='profile_pictures/', blank=True, null=True)
+    profile_picture = models.ImageField(upload_to='profile_pictures/', storage=cas_storage, blank=True, null=True)
+    profile_picture_renditions = models.JSONField(default=dict, blank=True, editable=False)
     date_of_birth = models.DateField(blank=True, null=True)
     phone_number = models.CharField(max_length=15, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -29,6 +34,32 @@ class UserProfile(models.Model):
     def is_student(self):
         return self.user_type == 'student'
 
+class UserImport(models.Model):
+    """A bulk provisioning run (see accounts.provisioning), processed in the background"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    rows = models.JSONField(default=list, blank=True, help_text="Submitted rows; cleared once processed or failed, as they hold passwords")
+    total_rows = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    existing_count = models.PositiveIntegerField(default=0)
+    invalid_count = models.PositiveIntegerField(default=0)
+    results = models.JSONField(default=list, blank=True, help_text="Per-row outcome, in submission order")
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Import {self.pk} ({self.status}, {self.total_rows} rows)"
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
@@ -36,4 +67,20 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
+    # Only a profile already loaded through this user can have unsaved edits;
+    # fetching it just to save it would cost a query and a write per user save
+    profile = User.profile.related.get_cached_value(instance, None)
+    if profile is not None:
+        profile.save()
+
+@receiver(deletion_scheduled, sender=User)
+def deactivate_user(sender, instance, **kwargs):
+    # Inactive users can't log in, and their tokens stop authenticating
+    instance.is_active = False
+    instance.save(update_fields=['is_active'])
+
+@receiver(post_save, sender=UserProfile)
+def render_profile_picture(sender, instance, **kwargs):
+    schedule_renditions(instance, 'profile_picture', 'profile_picture_renditions')
+
+track_references(UserProfile, 'profile_picture')
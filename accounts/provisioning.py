@@ -0,0 +1,186 @@
+"""
+Bulk user provisioning from school rosters.
+
+`provision_users(rows)` creates accounts for a list of dicts with username,
+email, password, first_name, last_name and user_type, without going through
+create_user and its profile signals:
+
+- every row is validated in memory first (ProvisionRowSerializer) and a
+  username repeated within the import is rejected;
+- passwords are hashed in a process pool across all cores, since PBKDF2
+  costs far more than everything else put together;
+- each batch of users and their profiles is inserted with two bulk_creates
+  in one transaction.
+
+Usernames that already exist are reported and skipped before hashing, so an
+interrupted import can simply be run again.
+"""
+import codecs
+import csv
+import logging
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import UserImport, UserProfile
+from .serializers import ProvisionRowSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def read_csv(lines):
+    """Rows of a CSV roster as dicts; header names are case-insensitive and blank cells are dropped."""
+    rows = []
+    for row in csv.DictReader(lines):
+        rows.append({
+            key.strip().lower(): value if key.strip().lower() == 'password' else value.strip()
+            for key, value in row.items()
+            if key and value and value.strip()
+        })
+    return rows
+
+
+def read_csv_upload(upload):
+    return read_csv(codecs.iterdecode(upload, 'utf-8-sig'))
+
+
+def validate_rows(rows):
+    """Split rows into valid (row number, data) pairs and results for the invalid ones."""
+    valid, invalid, seen = [], [], {}
+    for number, row in enumerate(rows, 1):
+        serializer = ProvisionRowSerializer(data=row)
+        if not serializer.is_valid():
+            username = row.get('username') if isinstance(row, dict) else None
+            invalid.append(_result(number, username, 'invalid', serializer.errors))
+            continue
+        username = serializer.validated_data['username']
+        if username in seen:
+            invalid.append(_result(number, username, 'invalid', {'username': [f'Duplicate of row {seen[username]}.']}))
+            continue
+        seen[username] = number
+        valid.append((number, serializer.validated_data))
+    return valid, invalid
+
+
+def _result(number, username, status, errors=None):
+    result = {'row': number, 'username': username, 'status': status}
+    if errors:
+        result['errors'] = {field: [str(message) for message in messages] for field, messages in errors.items()}
+    return result
+
+
+def count_results(results):
+    counts = Counter(result['status'] for result in results)
+    return {status: counts[status] for status in ('created', 'exists', 'invalid')}
+
+
+def default_workers():
+    return getattr(settings, 'PROVISIONING_WORKERS', 0) or os.cpu_count() or 1
+
+
+@contextmanager
+def password_hasher(workers):
+    """Yield a function hashing a list of passwords, on `workers` processes."""
+    if workers <= 1:
+        yield lambda passwords: [make_password(password) for password in passwords]
+        return
+    # Spawned, not forked: forking a process with database connections and
+    # other threads (run_worker runs jobs on several) copies their locks.
+    # The hasher is chosen here, so fresh processes need no Django settings.
+    hasher = get_hasher()
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        yield lambda passwords: list(pool.map(
+            hasher.encode, passwords, [hasher.salt() for _ in passwords],
+            chunksize=max(1, len(passwords) // (workers * 4)),
+        ))
+
+
+def _existing_usernames(usernames):
+    return set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+
+
+def _create_batch(batch, hash_passwords):
+    existing = _existing_usernames([data['username'] for _, data in batch])
+    results = [_result(number, data['username'], 'exists') for number, data in batch if data['username'] in existing]
+    pending = [(number, data) for number, data in batch if data['username'] not in existing]
+    hashes = hash_passwords([data['password'] for _, data in pending])
+
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(
+                        username=data['username'], email=data['email'], first_name=data['first_name'],
+                        last_name=data['last_name'], password=password,
+                    )
+                    for (_, data), password in zip(pending, hashes)
+                ])
+                if users and users[0].pk is None:
+                    # Backends that can't return ids from a bulk insert
+                    ids = dict(User.objects.filter(username__in=[user.username for user in users]).values_list('username', 'pk'))
+                    for user in users:
+                        user.pk = ids[user.username]
+                UserProfile.objects.bulk_create([
+                    UserProfile(user=user, user_type=data['user_type'])
+                    for user, (_, data) in zip(users, pending)
+                ])
+            break
+        except IntegrityError:
+            if attempt:
+                raise
+            # Someone registered one of these usernames since we looked
+            taken = _existing_usernames([data['username'] for _, data in pending])
+            results += [_result(number, data['username'], 'exists') for number, data in pending if data['username'] in taken]
+            kept = [index for index, (_, data) in enumerate(pending) if data['username'] not in taken]
+            pending = [pending[index] for index in kept]
+            hashes = [hashes[index] for index in kept]
+
+    results += [_result(number, data['username'], 'created') for number, data in pending]
+    return results
+
+
+def provision_users(rows, workers=None, batch_size=None, log=None):
+    """Create users for `rows` and return one result per row, in row order."""
+    workers = workers or default_workers()
+    batch_size = batch_size or getattr(settings, 'PROVISIONING_BATCH_SIZE', 1000)
+    log = log or (lambda done, total: None)
+    valid, results = validate_rows(rows)
+    with password_hasher(min(workers, len(valid))) as hash_passwords:
+        for start in range(0, len(valid), batch_size):
+            batch = valid[start:start + batch_size]
+            results += _create_batch(batch, hash_passwords)
+            log(start + len(batch), len(valid))
+    return sorted(results, key=lambda result: result['row'])
+
+
+def run_import(user_import):
+    """Process a queued UserImport and record its results."""
+    UserImport.objects.filter(pk=user_import.pk).update(status='running')
+    try:
+        results = provision_users(user_import.rows)
+    except Exception:
+        # The rows hold plaintext passwords: never leave them behind
+        logger.exception('User import %s failed', user_import.pk)
+        user_import.status, user_import.rows, user_import.finished_at = 'failed', [], timezone.now()
+        UserImport.objects.filter(pk=user_import.pk).update(
+            status='failed', rows=[], finished_at=user_import.finished_at,
+        )
+        return
+    counts = count_results(results)
+    user_import.status = 'done'
+    user_import.rows = []
+    user_import.results = results
+    user_import.created_count = counts['created']
+    user_import.existing_count = counts['exists']
+    user_import.invalid_count = counts['invalid']
+    user_import.finished_at = timezone.now()
+    user_import.save()
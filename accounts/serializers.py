@@ -1,12 +1,20 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
-from .models import UserProfile
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError as DjangoValidationError
+from core.images import rendition_urls
+from .models import UserImport, UserProfile
 
 class UserProfileSerializer(serializers.ModelSerializer):
+    profile_picture_renditions = serializers.SerializerMethodField()
+    
     class Meta:
         model = UserProfile
-        fields = ['user_type', 'bio', 'profile_picture', 'date_of_birth', 'phone_number', 'created_at', 'updated_at']
+        fields = [
+            'user_type', 'bio', 'profile_picture', 'profile_picture_renditions',
+            'date_of_birth', 'phone_number', 'created_at', 'updated_at'
+        ]
         read_only_fields = ['created_at', 'updated_at']
     
     def __init__(self, *args, **kwargs):
@@ -15,6 +23,9 @@ class UserProfileSerializer(serializers.ModelSerializer):
         if self.instance:
             self.fields['user_type'].required = False
     
+    def get_profile_picture_renditions(self, obj):
+        return rendition_urls(obj.profile_picture_renditions, self.context.get('request'))
+    
     def validate_date_of_birth(self, value):
         # Handle empty string as None for date_of_birth
         if value == '':
@@ -32,12 +43,14 @@ class UserSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         profile_data = validated_data.pop('profile', {})
         
-        # Update user fields
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+        # Update user fields; User has no dirty tracking, so only write what changed
+        changed = [attr for attr, value in validated_data.items() if getattr(instance, attr) != value]
+        for attr in changed:
+            setattr(instance, attr, validated_data[attr])
+        if changed:
+            instance.save(update_fields=changed)
         
-        # Update profile fields
+        # Update profile fields; the profile saves only the columns that changed
         if profile_data:
             profile = instance.profile
             for attr, value in profile_data.items():
@@ -86,3 +99,29 @@ class ChangePasswordSerializer(serializers.Serializer):
         if not user.check_password(value):
             raise serializers.ValidationError("Old password is not correct.")
         return value
+
+class ProvisionRowSerializer(serializers.Serializer):
+    """One user in a bulk import; checked without touching the database"""
+    username = serializers.CharField(max_length=150, validators=[UnicodeUsernameValidator()])
+    email = serializers.EmailField(required=False, allow_blank=True, default='')
+    password = serializers.CharField(write_only=True)
+    first_name = serializers.CharField(max_length=150, required=False, allow_blank=True, default='')
+    last_name = serializers.CharField(max_length=150, required=False, allow_blank=True, default='')
+    user_type = serializers.ChoiceField(choices=UserProfile.USER_TYPES, default='student')
+    
+    def validate(self, attrs):
+        user = User(**{field: attrs[field] for field in ('username', 'email', 'first_name', 'last_name')})
+        try:
+            validate_password(attrs['password'], user)
+        except DjangoValidationError as error:
+            raise serializers.ValidationError({'password': list(error.messages)})
+        return attrs
+
+class UserImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserImport
+        fields = [
+            'id', 'status', 'total_rows', 'created_count', 'existing_count', 'invalid_count',
+            'results', 'created_at', 'finished_at'
+        ]
+        read_only_fields = fields
@@ -0,0 +1,11 @@
+from core.jobs import task
+
+from .models import UserImport
+from .provisioning import run_import
+
+
+@task(name='accounts.run_user_import')
+def run_user_import(import_id):
+    user_import = UserImport.objects.filter(pk=import_id).filter(status__in=['queued', 'running']).first()
+    if user_import is not None:
+        run_import(user_import)
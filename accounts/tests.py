@@ -1,10 +1,23 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User
 from rest_framework.test import APITestCase
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
-from .models import UserProfile
+from django.contrib.auth.models import update_last_login
+from core.jobs import run_pending
+from core.testing import WriteCountAssertionsMixin
+from .models import UserImport, UserProfile
+from .provisioning import provision_users
 
 class UserProfileModelTest(TestCase):
     def setUp(self):
@@ -167,3 +180,157 @@ class AccountsAPITest(APITestCase):
         
         response = self.client.put(self.change_password_url, password_data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class WriteCountTest(WriteCountAssertionsMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer', password='testpass123', first_name='Ada')
+        self.profile_url = reverse('profile')
+    
+    def test_creating_a_user_saves_the_profile_once(self):
+        """Test create_user inserts the profile without re-saving it"""
+        with self.assertNumWrites(2):
+            User.objects.create_user(username='newcomer', password='testpass123')
+    
+    def test_login_does_not_touch_the_profile(self):
+        """Test logging in writes nothing, and last_login only writes the user"""
+        with self.assertNumWrites(0):
+            response = self.client.post(reverse('login'), {'username': 'writer', 'password': 'testpass123'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        user = User.objects.select_related('profile').get(pk=self.user.pk)
+        with self.assertNumWrites(1) as context:
+            update_last_login(None, user)
+        self.assertIn('auth_user', context.captured_queries[-1]['sql'])
+    
+    def test_profile_update_writes_only_changes(self):
+        """Test profile updates write only the rows and columns that changed"""
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumWrites(1) as context:
+            self.client.patch(self.profile_url, {'first_name': 'Grace'}, format='json')
+        self.assertNotIn('"email"', context.captured_queries[-1]['sql'])
+        
+        with self.assertNumWrites(1) as context:
+            response = self.client.patch(self.profile_url, {'profile': {'bio': 'Hello'}}, format='json')
+        self.assertEqual(response.data['profile']['bio'], 'Hello')
+        update = [query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE')][0]
+        self.assertIn('"bio"', update)
+        self.assertNotIn('"phone_number"', update)
+        
+        with self.assertNumWrites(0):
+            response = self.client.patch(self.profile_url, {'first_name': 'Grace', 'profile': {'bio': 'Hello'}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+def roster(count, start=0):
+    return [
+        {'username': f'student{number}', 'password': f'Roster-pass-{number}', 'email': f'student{number}@school.example'}
+        for number in range(start, start + count)
+    ]
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ProvisioningTest(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass123', is_staff=True)
+        self.import_url = reverse('user_import')
+    
+    def test_provision_users(self):
+        """Test rows are validated, created with profiles and reported per row"""
+        User.objects.create_user(username='student1', password='testpass123')
+        rows = roster(3) + [
+            {'username': 'teacher', 'password': 'Roster-pass-t', 'user_type': 'instructor'},
+            {'username': 'student2', 'password': 'Roster-pass-x'},
+            {'username': 'bad name!', 'password': 'Roster-pass-y'},
+            {'username': 'weak', 'password': '123'},
+        ]
+        results = provision_users(rows, workers=1)
+        self.assertEqual([result['status'] for result in results], [
+            'created', 'exists', 'created', 'created', 'invalid', 'invalid', 'invalid'
+        ])
+        self.assertIn('row 3', results[4]['errors']['username'][0])
+        self.assertIn('password', results[6]['errors'])
+        
+        teacher = User.objects.get(username='teacher')
+        self.assertTrue(teacher.check_password('Roster-pass-t'))
+        self.assertEqual(teacher.profile.user_type, 'instructor')
+        self.assertEqual(User.objects.get(username='student0').profile.user_type, 'student')
+        self.assertEqual(User.objects.get(username='student0').email, 'student0@school.example')
+    
+    def test_query_count_is_per_batch(self):
+        """Test provisioning costs the same queries for 2 users as for 40"""
+        with CaptureQueriesContext(connection) as small:
+            provision_users(roster(2), workers=1)
+        with CaptureQueriesContext(connection) as large:
+            provision_users(roster(40, start=100), workers=1)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(UserProfile.objects.filter(user__username__startswith='student').count(), 42)
+    
+    def test_rerun_skips_existing_users(self):
+        """Test running the same import twice only creates users once"""
+        provision_users(roster(5), workers=1, batch_size=2)
+        results = provision_users(roster(6), workers=1, batch_size=2)
+        self.assertEqual([result['status'] for result in results], ['exists'] * 5 + ['created'])
+        self.assertEqual(User.objects.filter(username__startswith='student').count(), 6)
+    
+    def test_hashing_in_process_pool(self):
+        """Test passwords hashed by worker processes are usable"""
+        provision_users(roster(4), workers=2)
+        self.assertTrue(User.objects.get(username='student3').check_password('Roster-pass-3'))
+    
+    def test_import_api(self):
+        """Test an admin CSV upload is queued, processed and reported"""
+        self.client.force_authenticate(user=self.admin)
+        csv_file = SimpleUploadedFile('roster.csv', (
+            '\ufeffUsername,Password,Email,User_Type\n'
+            'pupil1,Roster-pass-1,pupil1@school.example,\n'
+            'pupil2,Roster-pass-2,,instructor\n'
+            'pupil3,short,,\n'
+        ).encode(), content_type='text/csv')
+        response = self.client.post(self.import_url, {'file': csv_file}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'queued')
+        self.assertEqual([result['row'] for result in response.data['results']], [3])
+        
+        run_pending()
+        user_import = UserImport.objects.get(pk=response.data['id'])
+        self.assertEqual(user_import.rows, [])
+        response = self.client.get(reverse('user_import_detail', args=[user_import.pk]))
+        self.assertEqual(response.data['status'], 'done')
+        self.assertEqual((response.data['created_count'], response.data['invalid_count']), (2, 1))
+        self.assertTrue(User.objects.get(username='pupil2').profile.is_instructor)
+    
+    def test_failed_import_clears_passwords(self):
+        """Test an import that fails is marked failed and its rows are discarded"""
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(self.import_url, {'users': roster(2)}, format='json')
+        with mock.patch('accounts.provisioning.provision_users', side_effect=RuntimeError('pool died')):
+            with self.assertLogs('accounts.provisioning', 'ERROR'):
+                run_pending()
+        user_import = UserImport.objects.get(pk=response.data['id'])
+        self.assertEqual(user_import.status, 'failed')
+        self.assertEqual(user_import.rows, [])
+        self.assertIsNotNone(user_import.finished_at)
+    
+    def test_import_api_requires_admin(self):
+        """Test only staff can import users"""
+        user = User.objects.create_user(username='teacher', password='testpass123')
+        self.client.force_authenticate(user=user)
+        response = self.client.post(self.import_url, {'users': roster(1)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(self.import_url, {'users': [{'username': 'x'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('password', response.data['results'][0]['errors'])
+    
+    def test_provision_users_command(self):
+        """Test the command imports a CSV and reports invalid rows"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'roster.csv')
+        with open(path, 'w') as handle:
+            handle.write('username,password\nteacher1,Roster-pass-1\nteacher2,\n')
+        out = io.StringIO()
+        call_command('provision_users', path, '--user-type', 'instructor', '--workers', '1', stdout=out)
+        self.assertIn('Row 2 (teacher2)', out.getvalue())
+        self.assertIn('Created 1', out.getvalue())
+        self.assertTrue(User.objects.get(username='teacher1').profile.is_instructor)
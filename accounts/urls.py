@@ -5,7 +5,9 @@ from .views import (
     LoginView,
     UserProfileView,
     ChangePasswordView,
-    LogoutView
+    LogoutView,
+    UserImportView,
+    UserImportDetailView
 )
 
 urlpatterns = [
@@ -15,4 +17,6 @@ urlpatterns = [
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('profile/', UserProfileView.as_view(), name='profile'),
     path('change-password/', ChangePasswordView.as_view(), name='change_password'),
+    path('imports/', UserImportView.as_view(), name='user_import'),
+    path('imports/<int:pk>/', UserImportDetailView.as_view(), name='user_import_detail'),
 ]
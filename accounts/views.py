@@ -1,23 +1,29 @@
+import csv
 from rest_framework import generics, status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
+from django.conf import settings
 from django.contrib.auth.models import User
+from core.jobs import enqueue
+from core.timing import ServerTimingMixin
 from .serializers import (
     RegisterSerializer, 
     UserSerializer, 
     UserProfileSerializer,
-    ChangePasswordSerializer
+    ChangePasswordSerializer,
+    UserImportSerializer
 )
-from .models import UserProfile
+from .models import UserImport, UserProfile
+from .provisioning import read_csv_upload, validate_rows
 
-class RegisterView(generics.CreateAPIView):
+class RegisterView(ServerTimingMixin, generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (permissions.AllowAny,)
     serializer_class = RegisterSerializer
 
-class LoginView(APIView):
+class LoginView(ServerTimingMixin, APIView):
     permission_classes = (permissions.AllowAny,)
     
     def post(self, request):
@@ -43,14 +49,14 @@ class LoginView(APIView):
                 'error': 'Invalid credentials'
             }, status=status.HTTP_401_UNAUTHORIZED)
 
-class UserProfileView(generics.RetrieveUpdateAPIView):
+class UserProfileView(ServerTimingMixin, generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = (permissions.IsAuthenticated,)
     
     def get_object(self):
         return self.request.user
 
-class ChangePasswordView(generics.UpdateAPIView):
+class ChangePasswordView(ServerTimingMixin, generics.UpdateAPIView):
     serializer_class = ChangePasswordSerializer
     permission_classes = (permissions.IsAuthenticated,)
     
@@ -66,7 +72,7 @@ class ChangePasswordView(generics.UpdateAPIView):
             'message': 'Password updated successfully'
         }, status=status.HTTP_200_OK)
 
-class LogoutView(APIView):
+class LogoutView(ServerTimingMixin, APIView):
     permission_classes = (permissions.IsAuthenticated,)
     
     def post(self, request):
@@ -81,3 +87,44 @@ class LogoutView(APIView):
             return Response({
                 'error': 'Invalid token'
             }, status=status.HTTP_400_BAD_REQUEST)
+
+class UserImportView(ServerTimingMixin, APIView):
+    """Queue a bulk user import from a CSV file or a JSON `users` list (admins only)"""
+    permission_classes = (permissions.IsAdminUser,)
+    
+    def post(self, request):
+        if 'file' in request.FILES:
+            try:
+                rows = read_csv_upload(request.FILES['file'])
+            except (UnicodeDecodeError, csv.Error):
+                return Response({
+                    'error': 'The file is not a UTF-8 CSV'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            rows = request.data.get('users')
+        if not isinstance(rows, list) or not rows:
+            return Response({
+                'error': 'Send a CSV file or a non-empty users list'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > settings.PROVISIONING_MAX_ROWS:
+            return Response({
+                'error': f'At most {settings.PROVISIONING_MAX_ROWS} rows per import; use the provision_users command for more'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Report invalid rows now; the slow part (hashing) runs in the background
+        valid, invalid = validate_rows(rows)
+        if not valid:
+            return Response({
+                'error': 'No valid rows',
+                'results': invalid
+            }, status=status.HTTP_400_BAD_REQUEST)
+        user_import = UserImport.objects.create(created_by=request.user, rows=rows, total_rows=len(rows))
+        enqueue('accounts.run_user_import', {'import_id': user_import.pk}, dedup_key=f'user-import:{user_import.pk}')
+        data = UserImportSerializer(user_import).data
+        data['results'] = invalid
+        return Response(data, status=status.HTTP_202_ACCEPTED)
+
+class UserImportDetailView(ServerTimingMixin, generics.RetrieveAPIView):
+    queryset = UserImport.objects.all()
+    serializer_class = UserImportSerializer
+    permission_classes = (permissions.IsAdminUser,)
@@ -0,0 +1,26 @@
+from django.contrib import admin
+from .deletion import schedule_deletion
+from .models import Deletion, Job
+
+@admin.action(description='Delete selected %(verbose_name_plural)s in the background', permissions=['delete'])
+def delete_in_background(modeladmin, request, queryset):
+    """Hide the selected objects now and remove them in chunks (see core.deletion)"""
+    count = 0
+    for obj in queryset:
+        schedule_deletion(obj, requested_by=request.user)
+        count += 1
+    modeladmin.message_user(request, f"{count} scheduled for deletion; progress is listed under Deletions.")
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['task', 'queue', 'priority', 'status', 'attempts', 'run_at', 'locked_by', 'updated_at']
+    list_filter = ['status', 'queue', 'task']
+    search_fields = ['task', 'dedup_key']
+    readonly_fields = ['created_at', 'updated_at']
+
+@admin.register(Deletion)
+class DeletionAdmin(admin.ModelAdmin):
+    list_display = ['model', 'object_id', 'status', 'requested_by', 'created_at', 'finished_at']
+    list_filter = ['status', 'model']
+    exclude = ['files']
+    readonly_fields = ['model', 'object_id', 'requested_by', 'status', 'deleted', 'created_at', 'updated_at', 'finished_at']
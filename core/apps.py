@@ -0,0 +1,15 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.utils.module_loading import autodiscover_modules
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+
+    def ready(self):
+        from .sqlite import configure_sqlite_connection
+
+        connection_created.connect(configure_sqlite_connection, dispatch_uid='core.configure_sqlite_connection')
+        # Register @task functions from every app's tasks.py
+        autodiscover_modules('tasks')
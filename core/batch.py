@@ -0,0 +1,120 @@
+"""
+Several GET requests to the accounts and courses APIs in one round trip.
+
+POST /api/batch/ with
+
+    {"requests": [{"path": "/api/courses/1/"}, {"path": "/api/auth/profile/"}]}
+
+authenticates once, then resolves each path and calls its view directly,
+with the batch's user forced onto the sub-request so no token is decoded
+again. Views run their usual permission checks and the responses come back
+in order as {"status", "body"} entries. While a batch runs, detail views
+using IdentityCacheMixin reuse objects an earlier sub-request already
+loaded with the same query.
+"""
+import io
+from contextlib import contextmanager
+from contextvars import ContextVar
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.urls import Resolver404, resolve
+
+_identity_cache = ContextVar('batch_identity_cache', default=None)
+
+_batchable_views = None
+
+
+def max_requests():
+    return getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+
+
+def batchable_views():
+    """View functions a batch may call: those in accounts.urls and courses.urls."""
+    global _batchable_views
+    if _batchable_views is None:
+        from accounts import urls as accounts_urls
+        from courses import urls as courses_urls
+        _batchable_views = {pattern.callback for pattern in accounts_urls.urlpatterns + courses_urls.urlpatterns}
+    return _batchable_views
+
+
+@contextmanager
+def identity_cache():
+    token = _identity_cache.set({})
+    try:
+        yield
+    finally:
+        _identity_cache.reset(token)
+
+
+class IdentityCacheMixin:
+    """
+    Within a batch, reuse the object an earlier GET sub-request fetched with
+    the same query instead of loading it again. Object permissions are
+    still checked for each view.
+    """
+
+    def get_object(self):
+        cache = _identity_cache.get()
+        if cache is None or self.request.method != 'GET':
+            return super().get_object()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        query = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}).query
+        key = (queryset.model._meta.label, str(query))
+        if key not in cache:
+            cache[key] = super().get_object()
+            return cache[key]
+        obj = cache[key]
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+def _subrequest(request, path, query_string):
+    environ = {key: value for key, value in request.META.items() if not key.startswith('wsgi.')}
+    environ.update({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query_string,
+        'CONTENT_TYPE': '',
+        'CONTENT_LENGTH': '0',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.url_scheme': request.scheme,
+    })
+    subrequest = WSGIRequest(environ)
+    # DRF authenticates a request carrying these as the given user and token
+    subrequest._force_auth_user = request.user if request.user.is_authenticated else None
+    subrequest._force_auth_token = request.auth
+    return subrequest
+
+
+def _error(status, message):
+    return {'status': status, 'body': {'error': message}}
+
+
+def run_subrequest(request, item):
+    """Run one entry of a batch and return its {"status", "body"}."""
+    url = item.get('path') if isinstance(item, dict) else None
+    if not isinstance(url, str) or not url.startswith('/'):
+        return _error(400, 'Each request needs a "path" starting with /')
+    method = item.get('method', 'GET')
+    if not isinstance(method, str) or method.upper() != 'GET':
+        return _error(405, 'Only GET requests can be batched')
+    parts = urlsplit(url)
+    try:
+        match = resolve(parts.path)
+    except Resolver404:
+        return _error(404, 'Not found')
+    if match.func not in batchable_views():
+        return _error(400, 'This endpoint cannot be batched')
+
+    response = match.func(_subrequest(request, parts.path, parts.query), *match.args, **match.kwargs)
+    if hasattr(response, 'data'):
+        # DRF response: its data goes into the envelope without rendering it twice
+        return {'status': response.status_code, 'body': response.data}
+    if response.streaming:
+        response.close()
+        return _error(400, 'Streamed responses (file downloads) cannot be batched')
+    return {'status': response.status_code, 'body': response.content.decode(response.charset, 'replace')}
@@ -0,0 +1,354 @@
+"""
+In-process API benchmark used by `manage.py benchmark_api`.
+
+Seeds a dataset, then drives each endpoint of the accounts and courses APIs
+through DRF's test client (no network, no external services) and records
+latency percentiles, throughput, query counts, response size and peak
+Python memory. Results are plain dicts so they can be written out as a JSON
+baseline and compared with later runs.
+"""
+import hashlib
+import io
+import math
+import platform
+import random
+import time
+import tracemalloc
+from collections import Counter
+
+import django
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import UserImport
+from courses.models import Course, Enrollment, Lesson
+from courses.uploads import create_upload, write_chunk
+
+from .synthetic import SyntheticDataset
+
+PASSWORD = 'Bench-pass-2024!'
+OTHER_PASSWORD = 'Bench-pass-2025!'
+MATERIALS = bytes(range(256)) * 1024  # 256 KiB
+MATERIALS_SHA256 = hashlib.sha256(MATERIALS).hexdigest()
+
+
+def percentile(sorted_values, fraction):
+    """Linearly interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def seed_dataset(users=200, instructors=20, courses=100, lessons=5, enrollments=5, seed=1):
+    """
+    Generate a synthetic dataset (see core.synthetic) plus the accounts the
+    scenarios act as, and return the context the scenarios read ids from.
+    `lessons` and `enrollments` are averages per course and per user.
+    """
+    rng = random.Random(seed)
+    SyntheticDataset(
+        users=users + instructors, instructors=instructors, courses=courses,
+        lessons=courses * lessons, enrollments=users * enrollments, seed=seed,
+    ).generate()
+    catalog = list(Course.objects.order_by('pk'))
+
+    learner = User.objects.create_user('bench_learner', 'learner@example.com', PASSWORD)
+    password_user = User.objects.create_user('bench_password', 'password@example.com', PASSWORD)
+    instructor = User.objects.create_user('bench_instructor', 'instructor@example.com', PASSWORD)
+    instructor.profile.user_type = 'instructor'
+    instructor.profile.save()
+    admin = User.objects.create_user('bench_admin', 'admin@example.com', PASSWORD, is_staff=True)
+    user_import = UserImport.objects.create(created_by=admin, status='done', finished_at=timezone.now())
+
+    course = Course.objects.create(
+        title='Benchmark course', description='Owned by the benchmark instructor',
+        category='programming', difficulty='beginner', instructor=instructor,
+    )
+    course_lessons = [
+        Lesson(course=course, title=f'Benchmark lesson {order}', order=order)
+        for order in range(1, lessons + 1)
+    ]
+    Lesson.objects.bulk_create(course_lessons)
+    lesson = Lesson.objects.filter(course=course).first()
+    lesson.materials.save('materials.bin', ContentFile(MATERIALS))
+    enrollment = Enrollment.objects.create(user=learner, course=course)
+    for other in rng.sample(catalog, min(enrollments, len(catalog))):
+        Enrollment.objects.get_or_create(user=learner, course=other)
+
+    return {
+        'learner': learner,
+        'instructor': instructor,
+        'password_user': password_user,
+        'admin': admin,
+        'user_import': user_import,
+        'course': course,
+        'lesson': lesson,
+        'enrollment': enrollment,
+        'catalog': [other.pk for other in catalog],
+        'search': 'Python',
+    }
+
+
+def clients(context):
+    """An anonymous client plus one authenticated with a real JWT per actor."""
+    result = {'anonymous': APIClient()}
+    for actor in ('learner', 'instructor', 'password_user', 'admin'):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(context[actor]).access_token}')
+        result[actor] = client
+    return result
+
+
+class Scenario:
+    """
+    One benchmarked request. `prepare(context, i)` runs untimed before each
+    request and returns any of `kwargs` (URL), `query`, `data`, `raw` (body
+    bytes) and `headers`. Every request should answer `expected_status`;
+    timing a request that fails measures the error path instead.
+    """
+
+    def __init__(self, label, url_name, method='get', actor='learner', prepare=None, expected_status=200):
+        self.label = label
+        self.url_name = url_name
+        self.method = method
+        self.actor = actor
+        self.prepare = prepare or (lambda context, i: {})
+        self.expected_status = expected_status
+
+    def perform(self, client, request):
+        path = reverse(self.url_name, kwargs=request.get('kwargs'))
+        headers = request.get('headers', {})
+        if self.method == 'get':
+            response = client.get(path, request.get('query'), **headers)
+        elif 'raw' in request:
+            response = getattr(client, self.method)(path, request['raw'], content_type='application/octet-stream', **headers)
+        else:
+            response = getattr(client, self.method)(path, request.get('data') or {}, format='json', **headers)
+        # Streamed files are only read when consumed; include that in the timing
+        size = len(b''.join(response.streaming_content)) if response.streaming else len(response.content)
+        response.close()
+        return response.status_code, size
+
+
+def _course(context, i):
+    return {'kwargs': {'pk': context['course'].pk}}
+
+
+def _lesson(context, i):
+    return {'kwargs': {'pk': context['lesson'].pk}}
+
+
+def _unenrolled_course(context, i):
+    course_id = context['catalog'][i % len(context['catalog'])]
+    Enrollment.objects.filter(user=context['learner'], course_id=course_id).delete()
+    return course_id
+
+
+def _new_upload(context, complete=False):
+    upload = create_upload(context['lesson'], context['instructor'], 'materials.bin', len(MATERIALS), MATERIALS_SHA256)
+    if complete:
+        write_chunk(upload, 0, io.BytesIO(MATERIALS), len(MATERIALS))
+    return {'kwargs': {'pk': upload.pk}}
+
+
+def _upload_chunk(context, i):
+    request = _new_upload(context)
+    request['raw'] = MATERIALS
+    request['headers'] = {'HTTP_CONTENT_RANGE': f'bytes 0-{len(MATERIALS) - 1}/{len(MATERIALS)}'}
+    return request
+
+
+def _existing_upload(context, i):
+    if 'upload' not in context:
+        context['upload'] = _new_upload(context)
+    return context['upload']
+
+
+def _change_password(context, i):
+    old, new = (PASSWORD, OTHER_PASSWORD) if i % 2 == 0 else (OTHER_PASSWORD, PASSWORD)
+    return {'data': {'old_password': old, 'new_password': new, 'new_password2': new}}
+
+
+# Routes without a scenario. Logout blacklists the refresh token, which needs
+# rest_framework_simplejwt.token_blacklist; that app isn't installed (it would
+# add a write to every login), so the request can only fail.
+UNBENCHMARKED = {'logout'}
+
+SCENARIOS = [
+    # accounts
+    Scenario('register', 'register', 'post', 'anonymous', lambda context, i: {'data': {
+        'username': f'bench_register_{i}', 'email': f'register{i}@example.com', 'password': PASSWORD,
+        'password2': PASSWORD, 'user_type': 'student',
+    }}, expected_status=201),
+    Scenario('login', 'login', 'post', 'anonymous', lambda context, i: {'data': {'username': 'bench_learner', 'password': PASSWORD}}),
+    Scenario('token_refresh', 'token_refresh', 'post', 'anonymous', lambda context, i: {'data': {'refresh': str(RefreshToken.for_user(context['learner']))}}),
+    Scenario('profile', 'profile'),
+    Scenario('profile:update', 'profile', 'patch', prepare=lambda context, i: {'data': {'first_name': f'Bench {i}'}}),
+    Scenario('change_password', 'change_password', 'put', 'password_user', _change_password),
+    # Validation and queueing only; the import itself runs in a worker
+    Scenario('user_import', 'user_import', 'post', 'admin', lambda context, i: {'data': {'users': [
+        {'username': f'bench_import_{i}_{row}', 'password': PASSWORD} for row in range(50)
+    ]}}, expected_status=202),
+    Scenario('user_import_detail', 'user_import_detail', actor='admin', prepare=lambda context, i: {'kwargs': {'pk': context['user_import'].pk}}),
+    # courses
+    Scenario('course-list-create', 'course-list-create', actor='anonymous'),
+    Scenario('course-list-create:filtered', 'course-list-create', actor='anonymous', prepare=lambda context, i: {'query': {'category': 'programming', 'difficulty': 'beginner'}}),
+    Scenario('course-list-create:search', 'course-list-create', actor='anonymous', prepare=lambda context, i: {'query': {'search': context['search']}}),
+    Scenario('course-list-create:create', 'course-list-create', 'post', 'instructor', lambda context, i: {'data': {
+        'title': f'New course {i}', 'description': 'Created by the benchmark', 'category': 'design', 'difficulty': 'advanced',
+    }}, expected_status=201),
+    Scenario('course-facets', 'course-facets', actor='anonymous'),
+    Scenario('course-facets:filtered', 'course-facets', actor='anonymous', prepare=lambda context, i: {'query': {'category': 'programming'}}),
+    Scenario('course-autocomplete', 'course-autocomplete', actor='anonymous', prepare=lambda context, i: {'query': {'q': context['search'][:1 + i % 4]}}),
+    Scenario('course-detail', 'course-detail', actor='anonymous', prepare=_course),
+    Scenario('course-detail:expand', 'course-detail', actor='anonymous', prepare=lambda context, i: {**_course(context, i), 'query': {'expand': 'lessons'}}),
+    Scenario('course-detail:update', 'course-detail', 'patch', 'instructor', lambda context, i: {**_course(context, i), 'data': {'title': f'Benchmark course {i}'}}),
+    Scenario('course-recommendations', 'course-recommendations', actor='anonymous', prepare=_course),
+    Scenario('recommendations', 'recommendations'),
+    Scenario('course-enroll', 'course-enroll', 'post', prepare=lambda context, i: {'kwargs': {'course_id': _unenrolled_course(context, i)}}, expected_status=201),
+    Scenario('instructor-courses', 'instructor-courses', actor='instructor'),
+    Scenario('lesson-list-create', 'lesson-list-create', actor='anonymous', prepare=lambda context, i: {'kwargs': {'course_id': context['course'].pk}}),
+    Scenario('lesson-list-create:create', 'lesson-list-create', 'post', 'instructor', lambda context, i: {
+        'kwargs': {'course_id': context['course'].pk}, 'data': {'title': f'New lesson {i}', 'order': 1000 + i},
+    }, expected_status=201),
+    Scenario('lesson-detail', 'lesson-detail', actor='anonymous', prepare=_lesson),
+    Scenario('lesson-materials', 'lesson-materials', prepare=_lesson),
+    Scenario('lesson-materials:range', 'lesson-materials', prepare=lambda context, i: {**_lesson(context, i), 'headers': {'HTTP_RANGE': 'bytes=0-65535'}}, expected_status=206),
+    Scenario('material-upload-create', 'material-upload-create', 'post', 'instructor', lambda context, i: {
+        **_lesson(context, i), 'data': {'filename': 'materials.bin', 'size': len(MATERIALS), 'sha256': MATERIALS_SHA256},
+    }, expected_status=201),
+    Scenario('material-upload-detail', 'material-upload-detail', actor='instructor', prepare=_existing_upload),
+    Scenario('material-upload-detail:chunk', 'material-upload-detail', 'put', 'instructor', _upload_chunk),
+    Scenario('material-upload-finalize', 'material-upload-finalize', 'post', 'instructor', lambda context, i: _new_upload(context, complete=True)),
+    Scenario('enrollment-list', 'enrollment-list'),
+    Scenario('enrollment-create', 'enrollment-create', 'post', prepare=lambda context, i: {'data': {'course': _unenrolled_course(context, i)}}, expected_status=201),
+    Scenario('enrollment-detail', 'enrollment-detail', prepare=lambda context, i: {'kwargs': {'pk': context['enrollment'].pk}}),
+    Scenario('progress-update', 'progress-update', 'patch', prepare=lambda context, i: {
+        'kwargs': {'pk': context['enrollment'].pk}, 'data': {'progress': i % 100},
+    }),
+    Scenario('resume', 'resume'),
+    Scenario('course-resume', 'course-resume', prepare=lambda context, i: {'kwargs': {'course_id': context['course'].pk}}),
+    # core
+    Scenario('batch', 'batch', 'post', prepare=lambda context, i: {'data': {'requests': [
+        {'path': reverse('course-detail', kwargs={'pk': context['course'].pk})},
+        {'path': reverse('lesson-list-create', kwargs={'course_id': context['course'].pk})},
+        {'path': reverse('course-resume', kwargs={'course_id': context['course'].pk})},
+        {'path': reverse('profile')},
+    ]}}),
+]
+
+
+def run_scenario(scenario, context, client, iterations, warmup=0):
+    """Time `iterations` requests after `warmup` untimed ones, then trace one more."""
+    timings = []
+    statuses = Counter()
+    sizes = []
+    for i in range(warmup + iterations):
+        request = scenario.prepare(context, i)
+        start = time.perf_counter()
+        status_code, size = scenario.perform(client, request)
+        elapsed = time.perf_counter() - start
+        if i >= warmup:
+            timings.append(elapsed)
+            statuses[status_code] += 1
+            sizes.append(size)
+
+    # Query counting and tracemalloc both slow requests down, so they get
+    # a separate request that isn't part of the latency figures
+    request = scenario.prepare(context, warmup + iterations)
+    with CaptureQueriesContext(connection) as queries:
+        tracemalloc.start()
+        try:
+            scenario.perform(client, request)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    timings.sort()
+    total = sum(timings)
+    return {
+        'method': scenario.method.upper(),
+        'url_name': scenario.url_name,
+        'requests': len(timings),
+        'status': {str(code): count for code, count in sorted(statuses.items())},
+        'expected_status': scenario.expected_status,
+        'p50_ms': percentile(timings, 0.50) * 1000,
+        'p95_ms': percentile(timings, 0.95) * 1000,
+        'p99_ms': percentile(timings, 0.99) * 1000,
+        'mean_ms': total / len(timings) * 1000 if timings else 0.0,
+        'throughput_rps': len(timings) / total if total else 0.0,
+        'queries': len(queries),
+        'response_bytes': int(sum(sizes) / len(sizes)) if sizes else 0,
+        'peak_kib': peak / 1024,
+    }
+
+
+def run_benchmark(iterations=30, warmup=3, only=None, dataset=None, seed=1, progress=None):
+    """Seed the current database and benchmark every scenario; returns the results document."""
+    dataset = dataset or {}
+    context = seed_dataset(seed=seed, **dataset)
+    actors = clients(context)
+    endpoints = {}
+    for scenario in SCENARIOS:
+        if only and not any(pattern in scenario.label for pattern in only):
+            continue
+        endpoints[scenario.label] = run_scenario(scenario, context, actors[scenario.actor], iterations, warmup)
+        if progress:
+            progress(scenario.label, endpoints[scenario.label])
+    return {
+        'meta': {
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': iterations,
+            'warmup': warmup,
+            'seed': seed,
+            'dataset': dataset,
+        },
+        'endpoints': endpoints,
+    }
+
+
+def unexpected_statuses(result):
+    """The status codes of a scenario result other than the one it expects."""
+    expected = result.get('expected_status')
+    if expected is None:
+        return []
+    return [code for code in result.get('status', {}) if code != str(expected)]
+
+
+def compare_results(current, baseline, latency_tolerance=0.25, query_tolerance=0, memory_tolerance=0.5, noise_ms=1.0):
+    """
+    List regressions of `current` against `baseline`. Latency may grow by
+    `latency_tolerance` (a fraction) plus `noise_ms`, query counts by
+    `query_tolerance` queries and peak memory by `memory_tolerance`. Any
+    response other than a scenario's expected status is a regression too:
+    an endpoint that starts failing usually gets faster.
+    """
+    regressions = []
+    for label, result in current['endpoints'].items():
+        if unexpected_statuses(result):
+            statuses = ' '.join(f'{code}x{count}' for code, count in result['status'].items())
+            regressions.append(f"{label}: status {statuses}, expected {result['expected_status']}")
+    for label, base in baseline.get('endpoints', {}).items():
+        result = current['endpoints'].get(label)
+        if result is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if result[metric] > base[metric] * (1 + latency_tolerance) + noise_ms:
+                regressions.append(f'{label}: {metric} {result[metric]:.2f} > {base[metric]:.2f}')
+        if result['queries'] > base['queries'] + query_tolerance:
+            regressions.append(f"{label}: queries {result['queries']} > {base['queries']}")
+        if result['peak_kib'] > base['peak_kib'] * (1 + memory_tolerance):
+            regressions.append(f"{label}: peak_kib {result['peak_kib']:.0f} > {base['peak_kib']:.0f}")
+    return regressions
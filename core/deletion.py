@@ -0,0 +1,136 @@
+"""
+Background deletion of objects with many dependent rows.
+
+`instance.delete()` has Django collect every dependent row in Python and
+delete them all in one transaction: for a course with hundreds of thousands
+of enrollments that outlasts the request timeout and holds SQLite's write
+lock throughout. Instead, `schedule_deletion(instance)`:
+
+- sends `deletion_scheduled`, whose receivers hide the object right away
+  (a course gets `deleted_at`, a user is deactivated), and records a
+  Deletion;
+- queues `core.run_deletion`, which walks the reverse relations and removes
+  rows depth first, dependents before the rows they point to, each chunk
+  with one `DELETE ... WHERE id IN (...)` in its own short transaction.
+  SET_NULL relations are cleared the same way.
+
+Signals aren't sent for the removed rows. Their files are recorded as they
+go and deleted through their storage (which for the content-addressed store
+releases the reference) once every row is gone. Deletion.deleted counts the
+rows removed so far, per model, and a failed run picks up where it stopped
+when the job is retried.
+"""
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, models, router, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .jobs import enqueue
+from .models import Deletion
+
+# Sent with `instance` inside the scheduling transaction; receivers hide it
+deletion_scheduled = Signal()
+
+
+def chunk_size():
+    return getattr(settings, 'DELETION_CHUNK_SIZE', 500)
+
+
+def schedule_deletion(instance, requested_by=None):
+    """Hide `instance` and queue its removal; returns the Deletion tracking it."""
+    label = instance._meta.label
+    with transaction.atomic():
+        deletion_scheduled.send(sender=type(instance), instance=instance)
+        deletion = Deletion.objects.exclude(status='done').filter(model=label, object_id=str(instance.pk)).first()
+        if deletion is None:
+            deletion = Deletion.objects.create(model=label, object_id=str(instance.pk), requested_by=requested_by)
+        enqueue('core.run_deletion', {'deletion_id': deletion.pk}, dedup_key=f'deletion:{deletion.pk}')
+    return deletion
+
+
+def _dependents(model):
+    # Hidden relations too: related_name='+' and many-to-many through tables
+    return [
+        field for field in model._meta.get_fields(include_hidden=True)
+        if field.auto_created and not field.concrete and (field.one_to_many or field.one_to_one)
+    ]
+
+
+def _file_fields(model):
+    return [field for field in model._meta.concrete_fields if isinstance(field, models.FileField)]
+
+
+def _field_label(field):
+    return f'{field.model._meta.label}.{field.name}'
+
+
+def _get_field(label):
+    model_label, name = label.rsplit('.', 1)
+    return apps.get_model(model_label)._meta.get_field(name)
+
+
+class ChunkedDeleter:
+    def __init__(self, deletion, size=None):
+        self.deletion = deletion
+        self.size = size or chunk_size()
+
+    def purge(self, model, lookup):
+        """Delete every `model` row matching `lookup`, and their dependents first."""
+        queryset = model._base_manager.filter(**lookup).order_by().values_list('pk', flat=True)
+        while ids := list(queryset[:self.size]):
+            for relation in _dependents(model):
+                related = {f'{relation.field.name}__in': ids}
+                if relation.on_delete is models.CASCADE:
+                    self.purge(relation.related_model, related)
+                elif relation.on_delete is models.SET_NULL:
+                    relation.related_model._base_manager.filter(**related).update(**{relation.field.name: None})
+                elif relation.on_delete is not models.DO_NOTHING:
+                    raise ValueError(
+                        f'{relation.related_model._meta.label}.{relation.field.name} uses '
+                        f'{relation.on_delete.__name__}, which chunked deletion does not support'
+                    )
+            self._delete_chunk(model, ids)
+
+    def _delete_chunk(self, model, ids):
+        deletion = self.deletion
+        files = []
+        for field in _file_fields(model):
+            names = model._base_manager.filter(pk__in=ids).exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+            files += [[_field_label(field), name] for name in names.values_list(field.name, flat=True)]
+
+        using = router.db_for_write(model)
+        connection = connections[using]
+        quote = connection.ops.quote_name
+        meta = model._meta
+        sql = 'DELETE FROM {table} WHERE {pk} IN ({placeholders})'.format(
+            table=quote(meta.db_table), pk=quote(meta.pk.column), placeholders=', '.join(['%s'] * len(ids)),
+        )
+        params = [meta.pk.get_db_prep_value(pk, connection) for pk in ids]
+        with transaction.atomic(using=using):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                count = cursor.rowcount
+            # Progress commits with the rows it counts
+            deletion.deleted[meta.label] = deletion.deleted.get(meta.label, 0) + count
+            deletion.files += files
+            Deletion.objects.filter(pk=deletion.pk).update(
+                deleted=deletion.deleted, files=deletion.files, updated_at=timezone.now(),
+            )
+
+
+def run_deletion(deletion, size=None):
+    """Remove a scheduled deletion's rows in chunks, then their files."""
+    Deletion.objects.filter(pk=deletion.pk).update(status='running', updated_at=timezone.now())
+    model = apps.get_model(deletion.model)
+    ChunkedDeleter(deletion, size).purge(model, {'pk': deletion.object_id})
+
+    for label, name in deletion.files:
+        # Content-addressed files are only released; the blob collector
+        # removes them once nothing else references them
+        _get_field(label).storage.delete(name)
+    # update(), not save(): purging a user may have cleared requested_by
+    deletion.status, deletion.files, deletion.finished_at = 'done', [], timezone.now()
+    Deletion.objects.filter(pk=deletion.pk).update(
+        status='done', files=[], finished_at=deletion.finished_at, updated_at=deletion.finished_at,
+    )
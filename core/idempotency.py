@@ -0,0 +1,156 @@
+"""
+Idempotency-Key support for unsafe API requests.
+
+A client that may retry a request (flaky mobile networks, double clicks)
+sends a unique `Idempotency-Key` header. The first request with a key
+records it, runs normally and stores its response; later requests with the
+same key from the same user get that response back, marked with
+`Idempotent-Replayed: true`, without running the view again. A retry that
+arrives while the first request is still running gets 409, and reusing a
+key for a different request gets 422.
+
+Responses are kept for IDEMPOTENCY_KEY_TTL; server errors aren't stored,
+so those requests can be retried with the same key. Expired keys are
+deleted by `purge_expired_keys`, which the job worker runs periodically.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# A key still pending after this long belongs to a request that died
+PENDING_TIMEOUT = timedelta(minutes=1)
+
+
+class IdempotencyConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'A request with this Idempotency-Key is still being processed.'
+    default_code = 'idempotency_conflict'
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = 422
+    default_detail = 'This Idempotency-Key was already used for a different request.'
+    default_code = 'idempotency_key_reused'
+
+
+class _Replay(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+def key_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 3600))
+
+
+def _comparable(value):
+    if hasattr(value, 'read'):
+        return f'{value.name}:{value.size}'
+    return value
+
+
+def request_fingerprint(request):
+    """Hash of what the request asks for; uploaded files count by name and size."""
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = sorted((key, [_comparable(value) for value in values]) for key, values in data.lists())
+    payload = json.dumps([request.method, request.get_full_path(), data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def claim_key(user, key, fingerprint):
+    """
+    Record `key` as in progress and return it, or raise _Replay with the
+    stored response, IdempotencyConflict or IdempotencyKeyReused.
+    """
+    now = timezone.now()
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    user=user, key=key, fingerprint=fingerprint, expires_at=now + key_ttl(),
+                )
+        except IntegrityError:
+            existing = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if existing is None:
+            continue
+        abandoned = existing.response_status is None and existing.created_at < now - PENDING_TIMEOUT
+        if existing.expires_at <= now or abandoned:
+            IdempotencyKey.objects.filter(pk=existing.pk, created_at=existing.created_at).delete()
+            continue
+        if existing.fingerprint != fingerprint:
+            raise IdempotencyKeyReused()
+        if existing.response_status is None:
+            raise IdempotencyConflict()
+        response = HttpResponse(
+            existing.response_body, status=existing.response_status, content_type=existing.content_type,
+        )
+        response['Idempotent-Replayed'] = 'true'
+        raise _Replay(response)
+    raise IdempotencyConflict()
+
+
+def purge_expired_keys(now=None):
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
+
+
+class IdempotencyMixin:
+    """
+    DRF view mixin honouring the Idempotency-Key header for authenticated
+    requests using one of `idempotent_methods`.
+    """
+    idempotent_methods = ('POST',)
+
+    def initial(self, request, *args, **kwargs):
+        self.idempotency_key = None
+        super().initial(request, *args, **kwargs)
+        key = request.headers.get(HEADER)
+        if key is None or request.method not in self.idempotent_methods or not request.user.is_authenticated:
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise ValidationError({HEADER: f'Must be 1 to {MAX_KEY_LENGTH} characters.'})
+        self.idempotency_key = claim_key(request.user, key, request_fingerprint(request))
+
+    def handle_exception(self, exc):
+        if isinstance(exc, _Replay):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except Exception:
+            self._release_key()
+            raise
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        record = getattr(self, 'idempotency_key', None)
+        if record is None:
+            return response
+        if response.status_code >= 500:
+            self._release_key()
+            return response
+        response.render()
+        record.response_status = response.status_code
+        record.response_body = response.content.decode()
+        record.content_type = response.get('Content-Type', '')
+        record.save(update_fields=['response_status', 'response_body', 'content_type'])
+        return response
+
+    def _release_key(self):
+        record = getattr(self, 'idempotency_key', None)
+        if record is not None:
+            record.delete()
+            self.idempotency_key = None
@@ -0,0 +1,135 @@
+"""
+Fixed-size WebP/JPEG renditions for uploaded images.
+
+Renditions are rendered from the original by a background job (see
+core.tasks.render_image_renditions) and recorded on the model in a JSON
+field:
+
+    {"source": "course_thumbnails/a.jpg",
+     "sizes": {"160": {"webp": "renditions/<key>/160.webp", "jpeg": ...}, ...}}
+"""
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .jobs import enqueue
+
+DEFAULT_SIZES = (160, 480, 960)
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+
+class ImageRejected(Exception):
+    pass
+
+
+def rendition_sizes():
+    return tuple(getattr(settings, 'IMAGE_RENDITION_SIZES', DEFAULT_SIZES))
+
+
+def render_renditions(data, sizes=None, max_pixels=None):
+    """
+    Render `data` (the original image bytes) at every size, returning
+    {size: {format: bytes}}. Pure function with no database or storage
+    access, so it can run in a worker process.
+    """
+    sizes = sorted(sizes or rendition_sizes(), reverse=True)
+    max_pixels = max_pixels or getattr(settings, 'IMAGE_MAX_PIXELS', 40_000_000)
+
+    with Image.open(io.BytesIO(data)) as image:
+        # Only the header has been read so far: refuse decompression bombs
+        # before any pixel data is decoded.
+        width, height = image.size
+        if width * height > max_pixels:
+            raise ImageRejected(f'{width}x{height} exceeds the {max_pixels} pixel limit')
+        # Let the JPEG decoder downscale by up to 8x while decoding
+        image.draft('RGB', (sizes[0], sizes[0]))
+        # Apply the EXIF orientation, then drop EXIF entirely
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        renditions = {}
+        for size in sizes:
+            # Each smaller size is resized from the previous one
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            renditions[size] = {}
+            for extension, image_format in FORMATS.items():
+                frame = image
+                if image_format == 'JPEG' and has_alpha:
+                    frame = Image.new('RGB', image.size, 'white')
+                    frame.paste(image, mask=image.getchannel('A'))
+                buffer = io.BytesIO()
+                frame.save(buffer, image_format, quality=80, optimize=True)
+                renditions[size][extension] = buffer.getvalue()
+        return renditions
+
+
+def rendition_names(source_name, sizes=None):
+    key = hashlib.sha256(source_name.encode()).hexdigest()[:32]
+    return {
+        size: {extension: f'renditions/{key}/{size}.{extension}' for extension in FORMATS}
+        for size in sizes or rendition_sizes()
+    }
+
+
+def save_renditions(instance, field_name, renditions_field, rendered):
+    """Store rendered bytes and record their names on `instance`."""
+    source_name = getattr(instance, field_name).name
+    names = rendition_names(source_name, rendered)
+    sizes = {}
+    for size, formats in rendered.items():
+        sizes[str(size)] = {}
+        for extension, content in formats.items():
+            name = names[size][extension]
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            sizes[str(size)][extension] = default_storage.save(name, ContentFile(content))
+    value = {'source': source_name, 'sizes': sizes}
+    # Update only the JSON column so no save() signals fire again
+    type(instance)._default_manager.filter(pk=instance.pk).update(**{renditions_field: value})
+    setattr(instance, renditions_field, value)
+    return value
+
+
+def generate_renditions(instance, field_name, renditions_field):
+    image = getattr(instance, field_name)
+    if not image:
+        if getattr(instance, renditions_field):
+            type(instance)._default_manager.filter(pk=instance.pk).update(**{renditions_field: {}})
+        return None
+    with image.open('rb') as source:
+        data = source.read()
+    return save_renditions(instance, field_name, renditions_field, render_renditions(data))
+
+
+def needs_renditions(instance, field_name, renditions_field):
+    image = getattr(instance, field_name)
+    current = getattr(instance, renditions_field) or {}
+    return (image.name or None) != current.get('source')
+
+
+def schedule_renditions(instance, field_name, renditions_field):
+    """Queue rendering when the image changed; the job commits with the caller's transaction."""
+    if not needs_renditions(instance, field_name, renditions_field):
+        return None
+    label = instance._meta.label
+    return enqueue(
+        'core.render_image_renditions',
+        {'model': label, 'pk': instance.pk, 'field_name': field_name, 'renditions_field': renditions_field},
+        dedup_key=f'renditions:{label}:{instance.pk}:{field_name}',
+    )
+
+
+def rendition_urls(value, request=None):
+    """Turn a renditions JSON value into {size: {format: url}}."""
+    urls = {}
+    for size, formats in (value or {}).get('sizes', {}).items():
+        urls[size] = {}
+        for extension, name in formats.items():
+            url = default_storage.url(name)
+            urls[size][extension] = request.build_absolute_uri(url) if request is not None else url
+    return urls
@@ -0,0 +1,183 @@
+"""
+A minimal job queue stored in the application database.
+
+Tasks are plain functions registered with `@task` in an app's `tasks.py`
+and enqueued with JSON payloads:
+
+    @task(queue='media')
+    def render_thumbnail(course_id): ...
+
+    enqueue(render_thumbnail, {'course_id': 1}, dedup_key='thumbnail:1')
+
+`manage.py run_worker` claims and runs them. Claims use
+SELECT ... FOR UPDATE SKIP LOCKED where supported (Postgres) and a
+compare-and-set UPDATE elsewhere (SQLite).
+"""
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class TaskNotRegistered(KeyError):
+    pass
+
+
+def task(func=None, *, name=None, queue='default', max_attempts=5):
+    """Register `func` as a task runnable by the worker."""
+    def register(func):
+        func.task_name = name or f'{func.__module__}.{func.__name__}'
+        func.queue = queue
+        func.max_attempts = max_attempts
+        _registry[func.task_name] = func
+        return func
+    return register(func) if func is not None else register
+
+
+def get_task(name):
+    try:
+        return _registry[name]
+    except KeyError:
+        raise TaskNotRegistered(name) from None
+
+
+def queue_priority(queue):
+    return getattr(settings, 'JOB_QUEUE_PRIORITIES', {}).get(queue, 0)
+
+
+def enqueue(func, payload=None, *, queue=None, priority=None, dedup_key=None, run_at=None, max_attempts=None):
+    """
+    Add a job for the registered task `func` (or its name). With a
+    `dedup_key`, a job still waiting in the queue with the same key is
+    returned instead of creating a second one. Running jobs don't count:
+    they may have started before whatever prompted the new enqueue.
+    """
+    func = get_task(func) if isinstance(func, str) else func
+    queue = queue or func.queue
+    job = Job(
+        task=func.task_name,
+        queue=queue,
+        priority=queue_priority(queue) if priority is None else priority,
+        payload=payload or {},
+        dedup_key=dedup_key,
+        max_attempts=max_attempts or func.max_attempts,
+        run_at=run_at or timezone.now(),
+    )
+    if dedup_key is None:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+        return job
+    except IntegrityError:
+        existing = Job.objects.filter(dedup_key=dedup_key, status='queued').first()
+        if existing is None:
+            # The holder was claimed between our insert and lookup
+            job.save()
+            return job
+        return existing
+
+
+def _runnable(queues, now):
+    stale = now - timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 600))
+    runnable = Q(status='queued', run_at__lte=now) | Q(status='running', locked_at__lt=stale)
+    queryset = Job.objects.filter(runnable)
+    if queues:
+        queryset = queryset.filter(queue__in=queues)
+    return queryset.order_by('-priority', 'run_at', 'id')
+
+
+def claim(queues=None, worker_id=None):
+    """Atomically mark the next runnable job as running and return it, or None."""
+    worker_id = worker_id or default_worker_id()
+    now = timezone.now()
+    claimed = dict(status='running', locked_at=now, locked_by=worker_id, attempts=F('attempts') + 1)
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = _runnable(queues, now).select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            Job.objects.filter(pk=job.pk).update(**claimed)
+    else:
+        # Compare-and-set: only one worker's UPDATE can still match the row
+        for _ in range(5):
+            job = _runnable(queues, now).only('pk').first()
+            if job is None:
+                return None
+            if _runnable(queues, now).filter(pk=job.pk).update(**claimed):
+                break
+        else:
+            return None
+    return Job.objects.get(pk=job.pk)
+
+
+def backoff_delay(attempts):
+    base = getattr(settings, 'JOB_RETRY_BASE_DELAY', 10)
+    cap = getattr(settings, 'JOB_RETRY_MAX_DELAY', 3600)
+    delay = min(cap, base * 2 ** max(0, attempts - 1))
+    # Jitter so jobs that failed together don't retry in lockstep
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def run_job(job):
+    """Run a claimed job and record its outcome."""
+    try:
+        get_task(job.task)(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Job %s (%s) failed on attempt %s', job.pk, job.task, job.attempts, exc_info=True)
+        if job.attempts >= job.max_attempts:
+            Job.objects.filter(pk=job.pk).update(status='failed', last_error=error, locked_at=None, updated_at=timezone.now())
+        else:
+            try:
+                with transaction.atomic():
+                    Job.objects.filter(pk=job.pk).update(
+                        status='queued', last_error=error, locked_at=None,
+                        run_at=timezone.now() + backoff_delay(job.attempts), updated_at=timezone.now(),
+                    )
+            except IntegrityError:
+                # A newer job with the same dedup_key is already queued and
+                # will do the work; this one is superseded rather than retried
+                Job.objects.filter(pk=job.pk).update(
+                    status='failed', last_error=f'Superseded by a queued job with the same dedup_key\n\n{error}',
+                    locked_at=None, updated_at=timezone.now(),
+                )
+        return False
+    Job.objects.filter(pk=job.pk).update(status='done', locked_at=None, updated_at=timezone.now())
+    return True
+
+
+def run_pending(queues=None, worker_id=None):
+    """Run jobs until none are runnable; returns how many ran."""
+    count = 0
+    while (job := claim(queues, worker_id)) is not None:
+        run_job(job)
+        count += 1
+    return count
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def purge_finished(older_than=None):
+    """Delete jobs that finished successfully before `older_than` seconds ago."""
+    older_than = older_than if older_than is not None else getattr(settings, 'JOB_RETENTION', 7 * 24 * 3600)
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    deleted, _ = Job.objects.filter(status='done', updated_at__lt=cutoff).delete()
+    return deleted
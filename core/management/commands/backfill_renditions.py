@@ -0,0 +1,78 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.images import ImageRejected, needs_renditions, render_renditions, rendition_sizes, save_renditions
+
+IMAGE_FIELDS = [
+    ('courses.Course', 'thumbnail', 'thumbnail_renditions'),
+    ('accounts.UserProfile', 'profile_picture', 'profile_picture_renditions'),
+]
+
+
+def _render(data, sizes):
+    try:
+        return render_renditions(data, sizes), None
+    except (ImageRejected, OSError) as exc:
+        return None, str(exc)
+
+
+class Command(BaseCommand):
+    help = 'Render missing image renditions for existing uploads in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=64, help='Images held in memory at once')
+        parser.add_argument('--force', action='store_true', help='Re-render images that already have renditions')
+
+    def handle(self, *args, **options):
+        sizes = rendition_sizes()
+        # Children are forked: start them all before the first query so
+        # they never inherit an open database connection
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            pool.submit(int).result()
+            for label, field_name, renditions_field in IMAGE_FIELDS:
+                model = apps.get_model(label)
+                queryset = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                batch = []
+                rendered = failed = 0
+                for instance in queryset.order_by('pk').iterator(chunk_size=options['batch_size']):
+                    if not options['force'] and not needs_renditions(instance, field_name, renditions_field):
+                        continue
+                    batch.append(instance)
+                    if len(batch) >= options['batch_size']:
+                        done, errors = self.render_batch(pool, batch, sizes, field_name, renditions_field)
+                        rendered, failed, batch = rendered + done, failed + errors, []
+                if batch:
+                    done, errors = self.render_batch(pool, batch, sizes, field_name, renditions_field)
+                    rendered, failed = rendered + done, failed + errors
+                self.stdout.write(f'{label}.{field_name}: {rendered} rendered, {failed} failed')
+
+    def render_batch(self, pool, batch, sizes, field_name, renditions_field):
+        payloads = []
+        for instance in batch:
+            try:
+                with getattr(instance, field_name).open('rb') as source:
+                    payloads.append(source.read())
+            except OSError as exc:
+                payloads.append(None)
+                self.stderr.write(f'{instance.pk}: {exc}')
+
+        rendered = failed = 0
+        futures = [pool.submit(_render, data, sizes) if data is not None else None for data in payloads]
+        for instance, future in zip(batch, futures):
+            if future is None:
+                failed += 1
+                continue
+            result, error = future.result()
+            if error:
+                failed += 1
+                self.stderr.write(f'{instance.pk}: {error}')
+                continue
+            save_renditions(instance, field_name, renditions_field, result)
+            rendered += 1
+        return rendered, failed
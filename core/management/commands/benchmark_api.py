@@ -0,0 +1,89 @@
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from core.benchmark import SCENARIOS, compare_results, run_benchmark, unexpected_statuses
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every API endpoint in-process against a seeded throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--instructors', type=int, default=20)
+        parser.add_argument('--courses', type=int, default=100)
+        parser.add_argument('--lessons', type=int, default=5, help='Lessons per course')
+        parser.add_argument('--enrollments', type=int, default=5, help='Enrollments per user')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--requests', type=int, default=30, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per endpoint')
+        parser.add_argument('--only', action='append', default=[], help='Only scenarios whose label contains this (repeatable)')
+        parser.add_argument('--output', help='Write the results as JSON (e.g. a new baseline)')
+        parser.add_argument('--baseline', help='Compare against a previous --output file; exits non-zero on regressions')
+        parser.add_argument('--latency-tolerance', type=float, default=0.25, help='Allowed latency growth as a fraction')
+        parser.add_argument('--noise-ms', type=float, default=1.0, help='Latency growth always tolerated, in milliseconds')
+        parser.add_argument('--query-tolerance', type=int, default=0, help='Allowed extra queries per request')
+        parser.add_argument('--memory-tolerance', type=float, default=0.5, help='Allowed peak memory growth as a fraction')
+        parser.add_argument('--list', action='store_true', help='List the scenarios and exit')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for scenario in SCENARIOS:
+                self.stdout.write(f'{scenario.label:<32} {scenario.method.upper():<6} {scenario.url_name}')
+            return
+
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as handle:
+                    baseline = json.load(handle)
+            except (OSError, ValueError) as error:
+                raise CommandError(f"Cannot read {options['baseline']}: {error}")
+
+        dataset = {key: options[key] for key in ('users', 'instructors', 'courses', 'lessons', 'enrollments')}
+        self.stdout.write(
+            'Seeding ' + ', '.join(f'{key}={value}' for key, value in dataset.items())
+            + f"; {options['requests']} request(s) per endpoint"
+        )
+        self.stdout.write(f"{'endpoint':<32} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>8} {'queries':>7} {'KiB':>8}  status")
+
+        # A throwaway test database and media root, so real data is never touched
+        setup_test_environment(debug=False)
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        databases = runner.setup_databases()
+        try:
+            with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root, CHUNKED_UPLOAD_DIR=f'{media_root}/chunked'):
+                results = run_benchmark(
+                    iterations=options['requests'], warmup=options['warmup'], only=options['only'],
+                    dataset=dataset, seed=options['seed'], progress=self.report,
+                )
+        finally:
+            runner.teardown_databases(databases)
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2, sort_keys=True)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            regressions = compare_results(
+                results, baseline,
+                latency_tolerance=options['latency_tolerance'], query_tolerance=options['query_tolerance'],
+                memory_tolerance=options['memory_tolerance'], noise_ms=options['noise_ms'],
+            )
+            if regressions:
+                raise CommandError('Regressions against the baseline:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
+
+    def report(self, label, result):
+        status = ' '.join(f'{code}x{count}' for code, count in result['status'].items())
+        if unexpected_statuses(result):
+            status += f" (expected {result['expected_status']})"
+        self.stdout.write(
+            f"{label:<32} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+            f"{result['throughput_rps']:>8.1f} {result['queries']:>7} {result['peak_kib']:>8.0f}  {status}"
+        )
@@ -0,0 +1,61 @@
+import json
+import pstats
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import list_profiles
+
+
+class Command(BaseCommand):
+    help = 'List and summarize request profiles captured by ProfilingMiddleware'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', nargs='?', help='Show one profile (file name or a unique prefix)')
+        parser.add_argument('--view', help='Only profiles of this URL name')
+        parser.add_argument('--limit', type=int, default=20, help='Profiles to list')
+        parser.add_argument('--sort', default='cumulative', help='pstats sort key for a single profile')
+        parser.add_argument('--top', type=int, default=25, help='Functions shown for a single profile')
+        parser.add_argument('--summary', action='store_true', help='Aggregate timings per view instead of listing')
+
+    def handle(self, *args, **options):
+        profiles = list_profiles()
+        if options['view']:
+            profiles = [profile for profile in profiles if profile['view'] == options['view']]
+        if options['name']:
+            return self.show(profiles, options)
+        if options['summary']:
+            return self.summarize(profiles)
+        if not profiles:
+            self.stdout.write('No profiles captured')
+            return
+        for profile in profiles[:options['limit']]:
+            slow = ' slow-sql' if profile['slow_queries'] else ''
+            self.stdout.write(
+                f"{profile['timestamp']:%Y-%m-%d %H:%M:%S}  {profile['method']:<6} {profile['view']:<32} "
+                f"{profile['status']}  {profile['ms']:>6} ms{slow}  {profile['name']}"
+            )
+
+    def summarize(self, profiles):
+        by_view = defaultdict(list)
+        for profile in profiles:
+            by_view[(profile['method'], profile['view'])].append(profile['ms'])
+        self.stdout.write(f"{'view':<40} {'count':>6} {'mean ms':>9} {'max ms':>8}")
+        for (method, view), timings in sorted(by_view.items(), key=lambda item: -max(item[1])):
+            self.stdout.write(f"{method + ' ' + view:<40} {len(timings):>6} {sum(timings) / len(timings):>9.1f} {max(timings):>8}")
+
+    def show(self, profiles, options):
+        matches = [profile for profile in profiles if profile['name'].startswith(options['name'])]
+        if len(matches) != 1:
+            raise CommandError(f"{len(matches)} profiles match {options['name']!r}")
+        profile = matches[0]
+        self.stdout.write(f"{profile['method']} {profile['view']} -> {profile['status']} in {profile['ms']} ms")
+        stats = pstats.Stats(profile['path'], stream=self.stdout)
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['top'])
+        if profile['slow_queries']:
+            with open(profile['slow_queries']) as handle:
+                queries = json.load(handle)['queries']
+            self.stdout.write(f'{len(queries)} slow quer{"y" if len(queries) == 1 else "ies"}:')
+            for query in queries:
+                self.stdout.write(f"\n[{query['database']}] {query['duration_ms']:.1f} ms: {query['sql']}")
+                self.stdout.write(''.join(query['stack']))
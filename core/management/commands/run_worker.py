@@ -0,0 +1,75 @@
+import logging
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.idempotency import purge_expired_keys
+from core.jobs import claim, default_worker_id, enqueue, purge_finished, run_job
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs from the database job queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queues', default='',
+            help='Comma separated queues to work on (default: all)',
+        )
+        parser.add_argument('--concurrency', type=int, default=1, help='Worker threads')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when idle')
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is runnable')
+
+    def handle(self, *args, **options):
+        queues = [queue.strip() for queue in options['queues'].split(',') if queue.strip()]
+        self.stopping = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *args: self.stopping.set())
+        signal.signal(signal.SIGINT, lambda *args: self.stopping.set())
+
+        threads = [
+            threading.Thread(
+                target=self.work, args=(queues, f'{default_worker_id()}:{number}', options),
+                name=f'worker-{number}', daemon=True,
+            )
+            for number in range(options['concurrency'])
+        ]
+        self.stdout.write(
+            f"Worker started: queues={','.join(queues) or '*'} concurrency={options['concurrency']}"
+        )
+        for thread in threads:
+            thread.start()
+        # Join with a timeout so signals are still delivered to this thread
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=0.5)
+        self.stdout.write('Worker stopped')
+
+    def work(self, queues, worker_id, options):
+        last_purge = 0
+        try:
+            while not self.stopping.is_set():
+                try:
+                    job = claim(queues, worker_id)
+                    if job is not None:
+                        succeeded = run_job(job)
+                        self.stdout.write(f"{job.task} #{job.pk}: {'done' if succeeded else 'failed'}")
+                        continue
+                    if options['burst']:
+                        break
+                    if time.monotonic() - last_purge > 3600:
+                        purge_finished()
+                        purge_expired_keys()
+                        # Also sweeps blob files left by rolled-back saves
+                        enqueue('core.collect_orphaned_blobs', dedup_key='cas-gc', queue='maintenance')
+                        last_purge = time.monotonic()
+                except Exception:
+                    # A database error must not kill the thread; back off and carry on
+                    logger.exception('Worker %s failed', worker_id)
+                    connections.close_all()
+                self.stopping.wait(options['poll_interval'])
+        finally:
+            connections.close_all()
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from core.synthetic import SyntheticDataset
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generate synthetic users, courses, lessons and enrollments (resumable)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--instructors', type=int, default=10_000, help='How many of the users are instructors')
+        parser.add_argument('--courses', type=int, default=50_000)
+        parser.add_argument('--lessons', type=int, default=2_000_000, help='Total lessons, spread unevenly over courses')
+        parser.add_argument('--enrollments', type=int, default=20_000_000, help='Total enrollments, approximately')
+        parser.add_argument('--scale', type=float, default=1.0, help='Multiply every volume, e.g. 0.01 for a quick run')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per transaction; keep it the same when resuming')
+        parser.add_argument('--password', default='synthetic-pass', help='Password shared by every synthetic user')
+
+    def handle(self, *args, **options):
+        scale = options['scale']
+        volumes = {
+            key: max(1, int(options[key] * scale))
+            for key in ('users', 'instructors', 'courses', 'lessons', 'enrollments')
+        }
+        self.stdout.write('Generating ' + ', '.join(f'{key}={value:,}' for key, value in volumes.items()))
+        dataset = SyntheticDataset(
+            **volumes, seed=options['seed'], batch_size=options['batch_size'],
+            password=options['password'], log=self.log,
+        )
+        dataset.generate()
+        self.stdout.write(self.style.SUCCESS('Done'))
+
+    def log(self, kind, done, total, rate):
+        self.stdout.write(f'{kind}: {done:,}/{total:,} ({rate:,.0f} rows/s)')
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = 'Checkpoint the SQLite WAL and refresh query planner statistics, once or periodically'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--mode', default='TRUNCATE', choices=['PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'],
+            help='wal_checkpoint mode (TRUNCATE also shrinks the -wal file)',
+        )
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Repeat every N seconds instead of running once',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError(f"Database '{options['database']}' is not SQLite")
+
+        while True:
+            self.run_maintenance(connection, options['mode'])
+            if not options['interval']:
+                break
+            # Don't hold a connection (and its WAL read mark) while sleeping
+            connection.close()
+            time.sleep(options['interval'])
+
+    def run_maintenance(self, connection, mode):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA wal_checkpoint({mode})')
+            busy, log_frames, checkpointed = cursor.fetchone()
+            cursor.execute('PRAGMA optimize')
+        self.stdout.write(
+            f'wal_checkpoint({mode}): busy={busy} log_frames={log_frames} checkpointed={checkpointed}; optimize done'
+        )
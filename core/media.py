@@ -0,0 +1,176 @@
+"""
+Serve access-controlled files from storage.
+
+The view checks permissions and then either hands the transfer to the web
+server (X-Accel-Redirect for nginx, X-Sendfile for Apache/lighttpd) or
+returns a FileResponse. FileResponse goes through wsgi.file_wrapper, which
+gunicorn implements with sendfile(2) starting at the file's current
+position, so seeking into a large video never reads the bytes before it.
+"""
+import mimetypes
+import os
+import re
+import uuid
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+
+from .storage import content_digest
+
+RANGE_RE = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+MAX_RANGES = 16
+BLOCK_SIZE = 64 * 1024
+
+
+class FileRange:
+    """A read-only window on an open file that still exposes fileno() for sendfile."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range_header(header, size):
+    """
+    Parse a `Range: bytes=...` header into a list of (start, end) inclusive
+    pairs. Returns None when the header should be ignored and [] when no
+    range is satisfiable.
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    ranges = []
+    for spec in header[len('bytes='):].split(','):
+        match = RANGE_RE.match(spec)
+        if not match:
+            return None
+        first, last = match.groups()
+        if not first and not last:
+            return None
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length == 0:
+                continue
+            ranges.append((max(0, size - length), size - 1))
+            continue
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+        if start < size:
+            ranges.append((start, end))
+    if len(ranges) > MAX_RANGES:
+        return None
+    return ranges
+
+
+def file_etag(field_file):
+    digest = content_digest(field_file.name)
+    if digest:
+        # Content-addressed names never change content
+        return f'"{digest}"'
+    stat = os.stat(field_file.path)
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    candidates = [candidate.strip().removeprefix('W/') for candidate in header.split(',')]
+    return '*' in candidates or etag in candidates
+
+
+def serve_file(request, field_file, etag=None, cache_control='private, max-age=0, must-revalidate'):
+    """Return a response for `field_file` honouring If-None-Match and Range."""
+    path = field_file.path
+    etag = etag or file_etag(field_file)
+    content_type = mimetypes.guess_type(field_file.name)[0] or 'application/octet-stream'
+
+    if etag_matches(request.META.get('HTTP_IF_NONE_MATCH'), etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
+
+    accel_prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '')
+    sendfile_header = getattr(settings, 'MEDIA_SENDFILE_HEADER', '')
+    if accel_prefix or sendfile_header:
+        # The web server handles ranges and conditional requests itself
+        response = HttpResponse(content_type=content_type)
+        if accel_prefix:
+            response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + quote(field_file.name)
+        else:
+            response[sendfile_header] = path
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
+
+    size = os.path.getsize(path)
+    ranges = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range or if_range.strip() == etag:
+        ranges = parse_range_header(request.META.get('HTTP_RANGE'), size)
+
+    if ranges is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    elif not ranges:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        response = FileResponse(FileRange(open(path, 'rb'), start, end - start + 1), status=206, content_type=content_type)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        response = multipart_range_response(path, ranges, size, content_type)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def multipart_range_response(path, ranges, size, content_type):
+    boundary = uuid.uuid4().hex
+    parts = [
+        (
+            f'--{boundary}\r\nContent-Type: {content_type}\r\n'
+            f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+        ).encode()
+        for start, end in ranges
+    ]
+    closing = f'--{boundary}--\r\n'.encode()
+    length = sum(len(part) + (end - start + 1) + 2 for part, (start, end) in zip(parts, ranges)) + len(closing)
+
+    def stream():
+        with open(path, 'rb') as file:
+            for part, (start, end) in zip(parts, ranges):
+                yield part
+                window = FileRange(file, start, end - start + 1)
+                while data := window.read(BLOCK_SIZE):
+                    yield data
+                yield b'\r\n'
+        yield closing
+
+    response = StreamingHttpResponse(
+        stream(), status=206, content_type=f'multipart/byteranges; boundary={boundary}'
+    )
+    response['Content-Length'] = length
+    return response
@@ -0,0 +1,292 @@
+"""
+Request metrics shared across gunicorn worker processes.
+
+Every process writes its samples into its own memory-mapped file in
+METRICS_DIR (one float per sample, updated in place), so recording costs a
+dict lookup and an 8-byte write. The metrics endpoint reads all files,
+sums them and renders the Prometheus text format. When gunicorn reaps a
+worker its file is folded into an archive file (see gunicorn.conf.py),
+keeping counters monotonic without letting files pile up.
+"""
+import fcntl
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+HEADER = struct.Struct('Q')  # bytes in use, including the header
+ENTRY_LENGTH = struct.Struct('I')
+VALUE = struct.Struct('d')
+INITIAL_SIZE = 64 * 1024
+ARCHIVE_NAME = 'metrics_archive.db'
+LOCK_NAME = '.lock'
+
+
+class MmapDict:
+    """
+    An append-only {key: float} in a memory-mapped file. Entries are
+    (length, key padded to 8 bytes, value); the header is only advanced
+    once an entry is fully written, so readers never see half an entry.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(INITIAL_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), os.fstat(self._file.fileno()).st_size)
+        self._used = HEADER.unpack_from(self._map, 0)[0] or HEADER.size
+        if self._used == HEADER.size:
+            HEADER.pack_into(self._map, 0, self._used)
+        self._positions = {key: position for key, position, _ in _entries(self._map, self._used)}
+
+    def add(self, key, amount):
+        position = self._positions.get(key)
+        if position is None:
+            position = self._append(key)
+        VALUE.pack_into(self._map, position, VALUE.unpack_from(self._map, position)[0] + amount)
+
+    def _append(self, key):
+        encoded = key.encode()
+        padded = -(-(ENTRY_LENGTH.size + len(encoded)) // 8) * 8
+        needed = self._used + padded + VALUE.size
+        if needed > len(self._map):
+            size = len(self._map)
+            while size < needed:
+                size *= 2
+            self._map.close()
+            self._file.truncate(size)
+            self._map = mmap.mmap(self._file.fileno(), size)
+        ENTRY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + ENTRY_LENGTH.size:self._used + ENTRY_LENGTH.size + len(encoded)] = encoded
+        position = self._used + padded
+        VALUE.pack_into(self._map, position, 0.0)
+        self._used = needed
+        HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def _entries(buffer, used):
+    offset = HEADER.size
+    while offset < used:
+        length = ENTRY_LENGTH.unpack_from(buffer, offset)[0]
+        key = bytes(buffer[offset + ENTRY_LENGTH.size:offset + ENTRY_LENGTH.size + length]).decode()
+        position = offset + -(-(ENTRY_LENGTH.size + length) // 8) * 8
+        yield key, position, VALUE.unpack_from(buffer, position)[0]
+        offset = position + VALUE.size
+
+
+def read_file(path):
+    with open(path, 'rb') as handle:
+        data = handle.read()
+    if len(data) < HEADER.size:
+        return {}
+    used = min(HEADER.unpack_from(data, 0)[0], len(data))
+    return {key: value for key, _, value in _entries(data, used)}
+
+
+@contextmanager
+def _directory_lock(directory, exclusive):
+    with open(os.path.join(directory, LOCK_NAME), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def process_filename(pid):
+    return f'metrics_{pid}.db'
+
+
+def merge_process(directory, pid):
+    """Fold a dead process's samples into the archive file (gunicorn's child_exit hook)."""
+    path = os.path.join(directory, process_filename(pid))
+    if not os.path.exists(path):
+        return
+    with _directory_lock(directory, exclusive=True):
+        archive = MmapDict(os.path.join(directory, ARCHIVE_NAME))
+        try:
+            for key, value in read_file(path).items():
+                archive.add(key, value)
+        finally:
+            archive.close()
+        os.remove(path)
+
+
+def collect(directory):
+    """Sum every process's samples: {key: value}."""
+    totals = defaultdict(float)
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return totals
+    with _directory_lock(directory, exclusive=False):
+        for name in names:
+            if name.startswith('metrics_') and name.endswith('.db'):
+                try:
+                    samples = read_file(os.path.join(directory, name))
+                except FileNotFoundError:
+                    continue
+                for key, value in samples.items():
+                    totals[key] += value
+    return totals
+
+
+class _ProcessStore:
+    """This process's metrics file, reopened after a fork."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._dict = None
+
+    def add(self, key, amount):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            # No METRICS_DIR set up by gunicorn.conf.py: nothing would merge or remove the file
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                directory = settings.METRICS_DIR
+                os.makedirs(directory, exist_ok=True)
+                self._pid = os.getpid()
+                self._dict = MmapDict(os.path.join(directory, process_filename(self._pid)))
+            self._dict.add(key, amount)
+
+    def reset(self):
+        with self._lock:
+            if self._dict is not None and self._pid == os.getpid():
+                self._dict.close()
+            self._pid = self._dict = None
+
+
+store = _ProcessStore()
+registry = []
+
+
+def _key(sample, labels):
+    return json.dumps([sample, sorted(labels.items())])
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.type = 'counter'
+        registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        store.add(_key(self.name, labels), amount)
+
+
+class Histogram:
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.type = 'histogram'
+        registry.append(self)
+
+    def observe(self, value, **labels):
+        # Per-bucket counts here; the exposition makes them cumulative
+        bound = next((bucket for bucket in self.buckets if value <= bucket), float('inf'))
+        store.add(_key(f'{self.name}_bucket', dict(labels, le=_format_value(bound))), 1)
+        store.add(_key(f'{self.name}_sum', labels), value)
+        store.add(_key(f'{self.name}_count', labels), 1)
+
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by URL name', ['view', 'method'],
+)
+REQUESTS = Counter('http_requests_total', 'Requests by URL name and status', ['view', 'method', 'status'])
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes', 'Response body size by URL name', ['view'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+DB_QUERIES = Counter('db_queries_total', 'Database queries by URL name', ['view'])
+DB_DURATION = Counter('db_query_duration_seconds_total', 'Time spent in database queries by URL name', ['view'])
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups by cache and result', ['cache', 'result'])
+
+
+def record_cache(name, hit):
+    CACHE_REQUESTS.inc(cache=name, result='hit' if hit else 'miss')
+
+
+class QueryTimer:
+    """A connection.execute_wrapper that counts queries and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+def _format_value(value):
+    return '+Inf' if value == float('inf') else repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _render_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def render(directory=None):
+    """Everything recorded by every process, in Prometheus text format 0.0.4."""
+    totals = collect(directory or settings.METRICS_DIR)
+    samples = defaultdict(list)
+    for key, value in totals.items():
+        sample, labels = json.loads(key)
+        samples[sample].append((tuple(map(tuple, labels)), value))
+
+    lines = []
+    for metric in registry:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        if metric.type == 'counter':
+            for labels, value in sorted(samples.get(metric.name, [])):
+                lines.append(f'{metric.name}{_render_labels(labels)} {value!r}')
+            continue
+        # Histogram: accumulate buckets per label set
+        buckets = defaultdict(dict)
+        for labels, value in samples.get(f'{metric.name}_bucket', []):
+            rest = tuple(item for item in labels if item[0] != 'le')
+            le = dict(labels)['le']
+            buckets[rest][le] = buckets[rest].get(le, 0) + value
+        sums = dict(samples.get(f'{metric.name}_sum', []))
+        counts = dict(samples.get(f'{metric.name}_count', []))
+        for labels in sorted(counts):
+            cumulative = 0.0
+            for bound in [*metric.buckets, float('inf')]:
+                le = _format_value(bound)
+                cumulative += buckets[labels].get(le, 0)
+                lines.append(f'{metric.name}_bucket{_render_labels(labels + (("le", le),))} {cumulative!r}')
+            lines.append(f'{metric.name}_sum{_render_labels(labels)} {sums.get(labels, 0.0)!r}')
+            lines.append(f'{metric.name}_count{_render_labels(labels)} {counts[labels]!r}')
+    return '\n'.join(lines) + '\n'
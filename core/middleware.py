@@ -0,0 +1,184 @@
+import cProfile
+import hashlib
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import connections
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .metrics import DB_DURATION, DB_QUERIES, REQUEST_LATENCY, REQUESTS, RESPONSE_SIZE
+from .profiling import SlowQueryRecorder, save_profile
+from .routers import replica_configured, use_primary, use_replica
+from .timing import request_timings
+
+access_logger = logging.getLogger('core.access')
+
+
+def _client_key(request):
+    """Identify the client by its credentials so pinning works across workers."""
+    credential = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credential:
+        return None
+    return 'db-pin:' + hashlib.sha256(credential.encode()).hexdigest()
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Route safe-method requests to views with `replica_reads = True` to the
+    read replica, unless the client wrote recently (read-your-writes).
+
+    The pin is kept in the default cache, which must be shared by every
+    worker: a write handled by one process has to pin the client for all.
+    """
+
+    def __init__(self, get_response):
+        if not replica_configured():
+            raise MiddlewareNotUsed
+        if isinstance(caches['default'], (LocMemCache, DummyCache)):
+            raise ImproperlyConfigured(
+                'Replica routing pins clients to the primary in the default cache, so it needs a '
+                'backend shared by all workers (CACHE_BACKEND), not a per-process one.'
+            )
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            use_primary()
+
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            key = _client_key(request)
+            if key:
+                cache.set(key, True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in SAFE_METHODS:
+            return None
+        view_class = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+        if not getattr(view_class, 'replica_reads', False):
+            return None
+        key = _client_key(request)
+        if key and cache.get(key):
+            return None
+        use_replica()
+        return None
+
+
+class ProfilingMiddleware:
+    """
+    Profile a request with cProfile when a staff user sends the
+    PROFILING_HEADER header, or at random for a PROFILING_SAMPLE_RATE
+    fraction of requests. Not installed at all unless PROFILING_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.header = 'HTTP_' + settings.PROFILING_HEADER.upper().replace('-', '_')
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.slow_query_ms = settings.SLOW_QUERY_MS
+
+    def __call__(self, request):
+        requested = self.header in request.META
+        if not (requested and self.is_staff(request)) and not (self.sample_rate and random.random() < self.sample_rate):
+            return self.get_response(request)
+
+        recorder = SlowQueryRecorder(self.slow_query_ms)
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        name = save_profile(profiler, request, response, time.perf_counter() - start, recorder.queries)
+        if requested:
+            response['X-Profile-Id'] = name
+        return response
+
+    def is_staff(self, request):
+        """Staff check that also understands JWTs, which DRF only reads later in the view."""
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user.is_staff
+        try:
+            authenticated = JWTAuthentication().authenticate(request)
+        except (AuthenticationFailed, InvalidToken, TokenError):
+            return False
+        return bool(authenticated and authenticated[0].is_staff)
+
+
+class RequestTimingMiddleware:
+    """
+    Time every request and count its SQL (see core.timing), then:
+
+    - record latency, status, response size and database time per URL name
+      into the multiprocess metrics store (METRICS_ENABLED, see core.metrics);
+    - report the breakdown to the client in a Server-Timing header
+      (SERVER_TIMING_ENABLED);
+    - log one JSON line per request to the `core.access` logger
+      (ACCESS_LOG_ENABLED).
+    """
+
+    def __init__(self, get_response):
+        self.metrics = getattr(settings, 'METRICS_ENABLED', False)
+        self.server_timing = getattr(settings, 'SERVER_TIMING_ENABLED', False)
+        self.access_log = getattr(settings, 'ACCESS_LOG_ENABLED', False)
+        if not (self.metrics or self.server_timing or self.access_log):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with request_timings() as timings, ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timings.db))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        # Unmatched paths share one label so scanners can't blow up cardinality
+        view = (match.view_name if match else None) or 'unresolved'
+        if response.streaming:
+            size = int(response.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+
+        if self.metrics:
+            REQUEST_LATENCY.observe(elapsed, view=view, method=request.method)
+            REQUESTS.inc(view=view, method=request.method, status=str(response.status_code))
+            RESPONSE_SIZE.observe(size, view=view)
+            DB_QUERIES.inc(timings.db.count, view=view)
+            DB_DURATION.inc(timings.db.duration, view=view)
+        if self.server_timing:
+            response['Server-Timing'] = timings.server_timing(elapsed)
+        if self.access_log:
+            user = getattr(request, 'user', None)
+            access_logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'view': view,
+                'status': response.status_code,
+                'user_id': user.pk if user is not None and user.is_authenticated else None,
+                'bytes': size,
+                'queries': timings.db.count,
+                'timings_ms': timings.as_milliseconds(elapsed),
+            }))
+        return response
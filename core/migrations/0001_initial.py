@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-19 07:37
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=100)),
+                ('queue', models.CharField(default='default', max_length=50)),
+                ('priority', models.IntegerField(default=0, help_text='Higher runs first')),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('dedup_key', models.CharField(blank=True, help_text='At most one queued job may hold a given key', max_length=200, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=5)),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('locked_by', models.CharField(blank=True, max_length=100)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-priority', 'run_at', 'id'],
+                'indexes': [models.Index(fields=['status', '-priority', 'run_at', 'id'], name='job_claim_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'queued')), fields=('dedup_key',), name='job_queued_dedup_key_unique')],
+            },
+        ),
+    ]
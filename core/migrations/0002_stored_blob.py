@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-19 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('digest', models.CharField(db_index=True, max_length=64)),
+                ('size', models.BigIntegerField()),
+                ('refcount', models.IntegerField(default=0)),
+                ('orphaned_at', models.DateTimeField(blank=True, help_text='When the last reference went away', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['refcount', 'orphaned_at'], name='blob_orphan_idx')],
+            },
+        ),
+    ]
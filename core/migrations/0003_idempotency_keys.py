@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_stored_blob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('fingerprint', models.CharField(help_text='SHA-256 of the method, path and request data', max_length=64)),
+                ('response_status', models.PositiveSmallIntegerField(blank=True, help_text='Empty while the first request is still being handled', null=True)),
+                ('response_body', models.TextField(blank=True)),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='idempotency_expiry_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'key'), name='unique_idempotency_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_idempotency_keys'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Deletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(help_text='App label and model name, e.g. courses.Course', max_length=100)),
+                ('object_id', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done')], default='queued', max_length=20)),
+                ('deleted', models.JSONField(blank=True, default=dict, help_text='Rows deleted so far, per model')),
+                ('files', models.JSONField(blank=True, default=list, help_text="[field, name] pairs of the deleted rows' files, removed once every row is gone")),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'done'), _negated=True), fields=('model', 'object_id'), name='unique_pending_deletion')],
+            },
+        ),
+    ]
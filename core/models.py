@@ -0,0 +1,189 @@
+import copy
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+def _comparable(value):
+    # Files compare by name (FieldFile.save() renames in place) and JSON
+    # values are copied so in-place edits still show up as changes
+    if isinstance(value, (dict, list)):
+        return copy.deepcopy(value)
+    return getattr(value, 'name', value) if hasattr(value, 'storage') else value
+
+class DirtyFieldsMixin(models.Model):
+    """
+    Save only the columns that changed since the row was loaded or last
+    saved, plus auto_now fields, and skip saves that change nothing (no
+    query, no signals). Inserts and saves with explicit update_fields are
+    left alone.
+    """
+    
+    class Meta:
+        abstract = True
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_values()
+        return instance
+    
+    def _remember_values(self, attnames=None):
+        # Deferred fields aren't in __dict__ until they are loaded
+        saved = getattr(self, '_saved_values', {})
+        for field in self._meta.concrete_fields:
+            if (attnames is None or field.attname in attnames) and field.attname in self.__dict__:
+                saved[field.attname] = _comparable(self.__dict__[field.attname])
+        self._saved_values = saved
+    
+    def get_dirty_fields(self):
+        """Names of the fields whose value differs from the database's."""
+        saved = getattr(self, '_saved_values', None)
+        if saved is None:
+            return [field.name for field in self._meta.concrete_fields if not field.primary_key]
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and not getattr(field, 'auto_now', False)
+            and field.attname in self.__dict__
+            and (field.attname not in saved or _comparable(self.__dict__[field.attname]) != saved[field.attname])
+        ]
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if not (args or self._state.adding or update_fields is not None or kwargs.get('force_insert')):
+            dirty = self.get_dirty_fields()
+            if not dirty:
+                return
+            kwargs['update_fields'] = dirty + [
+                field.name for field in self._meta.concrete_fields if getattr(field, 'auto_now', False)
+            ]
+        super().save(*args, **kwargs)
+        self._remember_values(
+            None if update_fields is None else {self._meta.get_field(name).attname for name in update_fields}
+        )
+    
+    save.alters_data = True
+    
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._remember_values(None if fields is None else {self._meta.get_field(name).attname for name in fields})
+
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    task = models.CharField(max_length=100)
+    queue = models.CharField(max_length=50, default='default')
+    priority = models.IntegerField(default=0, help_text="Higher runs first")
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    dedup_key = models.CharField(
+        max_length=200, blank=True, null=True,
+        help_text="At most one queued job may hold a given key"
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-priority', 'run_at', 'id']
+        indexes = [
+            # Claim query: next runnable job across the worker's queues
+            models.Index(fields=['status', '-priority', 'run_at', 'id'], name='job_claim_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=Q(status='queued'),
+                name='job_queued_dedup_key_unique',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
+
+class StoredBlob(models.Model):
+    """A file in the content-addressed store, shared by every field that references it"""
+    name = models.CharField(max_length=255, unique=True)
+    digest = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField()
+    refcount = models.IntegerField(default=0)
+    orphaned_at = models.DateTimeField(blank=True, null=True, help_text="When the last reference went away")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['refcount', 'orphaned_at'], name='blob_orphan_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.refcount} references)"
+
+class IdempotencyKey(models.Model):
+    """A client's Idempotency-Key and the response its first request produced (see core.idempotency)"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, help_text="SHA-256 of the method, path and request data")
+    response_status = models.PositiveSmallIntegerField(
+        blank=True, null=True,
+        help_text="Empty while the first request is still being handled"
+    )
+    response_body = models.TextField(blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expiry_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.key} ({self.response_status or 'pending'})"
+
+class Deletion(models.Model):
+    """A soft-deleted object whose rows are being removed in the background (see core.deletion)"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+    ]
+    
+    model = models.CharField(max_length=100, help_text="App label and model name, e.g. courses.Course")
+    object_id = models.CharField(max_length=64)
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    deleted = models.JSONField(default=dict, blank=True, help_text="Rows deleted so far, per model")
+    files = models.JSONField(
+        default=list, blank=True,
+        help_text="[field, name] pairs of the deleted rows' files, removed once every row is gone"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['model', 'object_id'],
+                condition=~Q(status='done'),
+                name='unique_pending_deletion',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.model} #{self.object_id} ({self.status})"
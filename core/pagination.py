@@ -0,0 +1,49 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimate_row_count(model, using='default'):
+    """
+    Return the planner's row estimate for `model`'s table, or None when the
+    database has no statistics. Reading catalog stats is O(1), unlike
+    COUNT(*) which scans the table (or a whole index).
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+            row = cursor.fetchone()
+            # -1 means the table was never analyzed
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s AND idx IS NULL', [table])
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+                row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses the planner's estimate instead of COUNT(*) for
+    unfiltered querysets over large tables. Filtered querysets, and tables
+    below `estimate_threshold` rows, are counted exactly.
+    """
+    estimate_threshold = 50_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is not None and not query.where and not query.distinct:
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return estimate
+        return super().count
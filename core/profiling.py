@@ -0,0 +1,117 @@
+"""
+On-demand request profiling (see core.middleware.ProfilingMiddleware).
+
+A profiled request is run under cProfile and written to PROFILING_DIR as
+
+    <timestamp>_<url name>_<method>_<status>_<ms>ms.prof
+
+which `python -m pstats`, snakeviz and friends read directly. SQL statements
+slower than SLOW_QUERY_MS during the request are logged with the Python
+stack that issued them and saved next to the profile as `.sql.json`.
+`manage.py profiles` lists and summarizes what has been captured.
+"""
+import json
+import logging
+import os
+import re
+import time
+import traceback
+from datetime import datetime
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+INTERNAL_FRAMES = (
+    os.path.join('django', 'db', 'backends'),
+    os.path.join('django', 'db', 'models', 'sql'),
+    os.path.join('core', 'profiling.py'),
+)
+
+PROFILE_NAME_RE = re.compile(
+    r'^(?P<timestamp>\d{8}T\d{6}\.\d{6})_(?P<view>.+)_(?P<method>[A-Z]+)_(?P<status>\d{3})_(?P<ms>\d+)ms\.prof$'
+)
+
+
+def profile_dir():
+    return getattr(settings, 'PROFILING_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+
+
+def query_stack(limit=15):
+    """The stack that issued a query, minus the ORM and database driver frames below it."""
+    frames = [
+        frame for frame in traceback.extract_stack()[:-2]
+        if not any(part in frame.filename for part in INTERNAL_FRAMES)
+    ]
+    return traceback.format_list(frames[-limit:])
+
+
+class SlowQueryRecorder:
+    """A connection.execute_wrapper that records statements slower than `threshold_ms`."""
+
+    def __init__(self, threshold_ms):
+        self.threshold_ms = threshold_ms
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            if duration_ms >= self.threshold_ms:
+                stack = query_stack()
+                self.queries.append({
+                    'database': context['connection'].alias,
+                    'duration_ms': round(duration_ms, 3),
+                    'sql': sql,
+                    'params': [repr(param) for param in (params or [])] if not many else [],
+                    'stack': stack,
+                })
+                logger.warning('Slow query (%.1f ms): %s\n%s', duration_ms, sql, ''.join(stack))
+
+
+def profile_filename(request, response, elapsed):
+    match = getattr(request, 'resolver_match', None)
+    view = (match.view_name if match else None) or 'unresolved'
+    view = re.sub(r'[^A-Za-z0-9.-]+', '-', view)
+    timestamp = datetime.now().strftime('%Y%m%dT%H%M%S.%f')
+    return f'{timestamp}_{view}_{request.method}_{response.status_code}_{int(elapsed * 1000)}ms.prof'
+
+
+def save_profile(profiler, request, response, elapsed, slow_queries=()):
+    """Write the profile (and any slow queries) and return the file name."""
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    name = profile_filename(request, response, elapsed)
+    profiler.dump_stats(os.path.join(directory, name))
+    if slow_queries:
+        with open(os.path.join(directory, name[:-len('.prof')] + '.sql.json'), 'w') as handle:
+            json.dump({'path': request.get_full_path(), 'queries': list(slow_queries)}, handle, indent=2)
+    return name
+
+
+def list_profiles(directory=None):
+    """Saved profiles, newest first, as dicts of the metadata in their names."""
+    directory = directory or profile_dir()
+    try:
+        names = set(os.listdir(directory))
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in names:
+        match = PROFILE_NAME_RE.match(name)
+        if match is None:
+            continue
+        sql_name = name[:-len('.prof')] + '.sql.json'
+        profiles.append({
+            'name': name,
+            'path': os.path.join(directory, name),
+            'timestamp': datetime.strptime(match['timestamp'], '%Y%m%dT%H%M%S.%f'),
+            'view': match['view'],
+            'method': match['method'],
+            'status': int(match['status']),
+            'ms': int(match['ms']),
+            'slow_queries': os.path.join(directory, sql_name) if sql_name in names else None,
+        })
+    return sorted(profiles, key=lambda profile: profile['timestamp'], reverse=True)
@@ -0,0 +1,50 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+
+REPLICA_DB_ALIAS = 'replica'
+
+# Alias that reads should go to for the current request, set by
+# core.middleware.ReplicaRoutingMiddleware. None means the primary.
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+def use_replica():
+    """Route reads for the rest of the current request to the replica."""
+    return _read_alias.set(REPLICA_DB_ALIAS)
+
+
+def use_primary(token=None):
+    """Stop routing reads to the replica."""
+    if token is not None:
+        _read_alias.reset(token)
+    else:
+        _read_alias.set(None)
+
+
+class PrimaryReplicaRouter:
+    """
+    Send reads to the replica only when the current request opted in,
+    everything else (writes, migrations, management commands) to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Follow relations on the database the instance came from
+            return instance._state.db
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,10 @@
+from rest_framework import serializers
+
+from .models import Deletion
+
+
+class DeletionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Deletion
+        fields = ['id', 'model', 'object_id', 'status', 'deleted', 'created_at', 'updated_at', 'finished_at']
+        read_only_fields = fields
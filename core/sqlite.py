@@ -0,0 +1,81 @@
+import functools
+import random
+import sqlite3
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+# Defaults for multi-worker deployments on a single SQLite file. Override
+# individual values with the SQLITE_PRAGMAS setting.
+DEFAULT_PRAGMAS = {
+    # Readers no longer block the writer and commits only append to the WAL
+    'journal_mode': 'wal',
+    # Safe with WAL: fsync on checkpoint instead of on every commit
+    'synchronous': 'normal',
+    # Milliseconds to wait for the write lock before raising "database is locked"
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative values are KiB rather than pages
+    'cache_size': -64 * 1024,
+    'temp_store': 'memory',
+}
+
+
+def get_pragmas():
+    return {**DEFAULT_PRAGMAS, **getattr(settings, 'SQLITE_PRAGMAS', {})}
+
+
+def configure_connection(dbapi_connection, pragmas=None):
+    """Apply tuning PRAGMAs to a raw sqlite3 connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in (pragmas or get_pragmas()).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """connection_created receiver for SQLite databases."""
+    if connection.vendor == 'sqlite':
+        configure_connection(connection.connection)
+
+
+def is_lock_error(exc):
+    message = str(exc).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def retry_on_lock(func=None, *, using=DEFAULT_DB_ALIAS, attempts=None, base_delay=None, max_delay=None):
+    """
+    Run `func` in its own transaction and retry it when SQLite reports
+    the database as locked, sleeping with full jitter between attempts.
+
+    With `transaction_mode = IMMEDIATE` the write lock is taken at BEGIN, so
+    a retry never repeats work that another writer invalidated. Calls nested
+    in an outer atomic block run once: only the outermost block can retry.
+    """
+    if func is None:
+        return functools.partial(
+            retry_on_lock, using=using, attempts=attempts, base_delay=base_delay, max_delay=max_delay
+        )
+
+    attempts = attempts or getattr(settings, 'SQLITE_LOCK_RETRY_ATTEMPTS', 5)
+    base_delay = base_delay or getattr(settings, 'SQLITE_LOCK_RETRY_BASE_DELAY', 0.05)
+    max_delay = max_delay or getattr(settings, 'SQLITE_LOCK_RETRY_MAX_DELAY', 1.0)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if connections[using].in_atomic_block:
+            return func(*args, **kwargs)
+        for attempt in range(attempts):
+            try:
+                with transaction.atomic(using=using):
+                    return func(*args, **kwargs)
+            except (OperationalError, sqlite3.OperationalError) as exc:
+                if not is_lock_error(exc) or attempt == attempts - 1:
+                    raise
+                time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+
+    return wrapper
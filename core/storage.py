@@ -0,0 +1,283 @@
+"""
+Content-addressed, deduplicating file storage.
+
+Uploads are hashed while they are streamed to disk and stored once under
+their SHA-256 digest (`cas/ab/cd/abcd...ef.pdf`), however many courses,
+lessons or profiles reference them. Identical uploads share one blob, and
+because a name always refers to the same bytes its URL can be cached
+forever.
+
+Every save takes a reference on the blob's StoredBlob row. References are
+released when a model instance is deleted or its file is replaced, and
+blobs left without references are garbage-collected by a background job
+after CAS_GC_GRACE_SECONDS. The same job removes blob files with no
+StoredBlob row at all, which a save rolled back with its transaction
+leaves behind.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.fields.files import FieldFile, ImageFieldFile
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+
+from .images import rendition_names
+from .jobs import enqueue
+from .models import StoredBlob
+
+CAS_PREFIX = 'cas/'
+CAS_NAME_RE = re.compile(r'^cas/[0-9a-f]{2}/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(\.[\w.-]*)?$')
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# (model, field name) pairs whose files live in the content-addressed store
+_tracked_fields = []
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        while data := source.read(COPY_BUFFER_SIZE):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def content_digest(name):
+    """Return the SHA-256 encoded in a content-addressed name, or None."""
+    match = CAS_NAME_RE.match(name or '')
+    return match.group('digest') if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # The final name depends on the content; _save() picks it
+        return name
+
+    def _save(self, name, content):
+        extension = os.path.splitext(name)[1].lower()
+        temp_dir = self.path(CAS_PREFIX + 'tmp')
+        os.makedirs(temp_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+        try:
+            if hasattr(content, 'temporary_file_path'):
+                # Already on disk (large uploads): hash unless the caller
+                # did, then move rather than copy
+                digest = getattr(content, 'sha256', None) or file_sha256(content.temporary_file_path())
+                os.close(fd)
+                file_move_safe(content.temporary_file_path(), temp_path, allow_overwrite=True)
+            else:
+                hasher = hashlib.sha256()
+                with os.fdopen(fd, 'wb') as temp_file:
+                    for chunk in content.chunks():
+                        hasher.update(chunk)
+                        temp_file.write(chunk)
+                digest = hasher.hexdigest()
+
+            final_name = f'{CAS_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+            # Reference first, file second: a concurrent garbage collection
+            # either sees the reference or has its deletion undone by the
+            # rename below.
+            acquire(final_name, digest, os.path.getsize(temp_path))
+            final_path = self.path(final_name)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(temp_path, final_path)
+            if self.file_permissions_mode is not None:
+                os.chmod(final_path, self.file_permissions_mode)
+            return final_name
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def delete(self, name):
+        if content_digest(name):
+            release(name)
+        else:
+            # Files stored before the content-addressed store existed
+            super().delete(name)
+
+
+_storage = None
+
+
+def cas_storage():
+    global _storage
+    if _storage is None:
+        _storage = ContentAddressedStorage()
+    return _storage
+
+
+def acquire(name, digest, size):
+    if StoredBlob.objects.filter(name=name).update(refcount=F('refcount') + 1, orphaned_at=None):
+        return
+    try:
+        with transaction.atomic():
+            StoredBlob.objects.create(name=name, digest=digest, size=size, refcount=1)
+    except IntegrityError:
+        StoredBlob.objects.filter(name=name).update(refcount=F('refcount') + 1, orphaned_at=None)
+
+
+def release(name):
+    """Drop one reference to a blob and schedule collection if it was the last."""
+    if not StoredBlob.objects.filter(name=name).update(refcount=F('refcount') - 1):
+        return
+    if StoredBlob.objects.filter(name=name, refcount__lte=0, orphaned_at__isnull=True).update(orphaned_at=timezone.now()):
+        grace = getattr(settings, 'CAS_GC_GRACE_SECONDS', 3600)
+        enqueue(
+            'core.collect_orphaned_blobs', dedup_key='cas-gc', queue='maintenance',
+            run_at=timezone.now() + timedelta(seconds=grace),
+        )
+
+
+class _SingleReferenceMixin:
+    def save(self, name, content, save=True):
+        previous = getattr(self.instance, '_cas_names', {}).get(self.field.name)
+        super().save(name, content, save)
+        if content_digest(previous) and self.name == previous:
+            # Same content as the file the field already held: the store
+            # took a second reference for a field that only holds one
+            release(previous)
+
+
+class ContentAddressedFieldFile(_SingleReferenceMixin, FieldFile):
+    pass
+
+
+class ContentAddressedImageFieldFile(_SingleReferenceMixin, ImageFieldFile):
+    pass
+
+
+def _raw_name(instance, field_name):
+    value = instance.__dict__.get(field_name)
+    return getattr(value, 'name', value)
+
+
+def _remember_names(sender, instance, **kwargs):
+    # Read the raw attribute: building FieldFile wrappers on every
+    # instantiation would be wasted work, and deferred fields are skipped
+    instance._cas_names = {
+        field_name: _raw_name(instance, field_name)
+        for model, field_name in _tracked_fields
+        if isinstance(instance, model) and field_name in instance.__dict__
+    }
+
+
+def _release_replaced(sender, instance, **kwargs):
+    previous = getattr(instance, '_cas_names', {})
+    for field_name, old_name in previous.items():
+        if content_digest(old_name) and _raw_name(instance, field_name) != old_name:
+            release(old_name)
+    _remember_names(sender, instance)
+
+
+def _release_deleted(sender, instance, **kwargs):
+    for model, field_name in _tracked_fields:
+        if isinstance(instance, model):
+            name = getattr(instance, field_name).name
+            if content_digest(name):
+                release(name)
+
+
+def track_references(model, field_name):
+    """Release blob references when `model` rows are deleted or their file changes."""
+    _tracked_fields.append((model, field_name))
+    field = model._meta.get_field(field_name)
+    if issubclass(field.attr_class, ImageFieldFile):
+        field.attr_class = ContentAddressedImageFieldFile
+    else:
+        field.attr_class = ContentAddressedFieldFile
+    uid = f'cas:{model._meta.label}'
+    post_init.connect(_remember_names, sender=model, dispatch_uid=uid)
+    post_save.connect(_release_replaced, sender=model, dispatch_uid=uid)
+    post_delete.connect(_release_deleted, sender=model, dispatch_uid=uid)
+
+
+def referenced_names():
+    names = set()
+    for model, field_name in _tracked_fields:
+        names.update(
+            model._base_manager.filter(**{f'{field_name}__startswith': CAS_PREFIX})
+            .values_list(field_name, flat=True).iterator()
+        )
+    return names
+
+
+def collect_orphaned_blobs(grace_seconds=None):
+    """
+    Delete blobs that have had no references for the grace period. Reference
+    counts are only a hint: the referencing tables are checked before
+    anything is deleted, and counts that drifted are corrected.
+    """
+    grace = grace_seconds if grace_seconds is not None else getattr(settings, 'CAS_GC_GRACE_SECONDS', 3600)
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    candidates = list(StoredBlob.objects.filter(refcount__lte=0, orphaned_at__lte=cutoff).values_list('name', flat=True))
+    storage = cas_storage()
+    deleted = _collect_stray_files(storage, cutoff)
+    if not candidates:
+        return deleted
+    referenced = referenced_names()
+    for name in candidates:
+        if name in referenced:
+            StoredBlob.objects.filter(name=name).update(refcount=1, orphaned_at=None)
+            continue
+        if not StoredBlob.objects.filter(name=name, refcount__lte=0).delete()[0]:
+            continue  # Re-referenced since we looked
+        path = storage.path(name)
+        tombstone = path + '.deleting'
+        try:
+            os.rename(path, tombstone)
+        except FileNotFoundError:
+            continue
+        if StoredBlob.objects.filter(name=name).exists():
+            # A save took a new reference meanwhile: put the file back
+            os.replace(tombstone, path)
+            continue
+        os.remove(tombstone)
+        _delete_renditions(name)
+        deleted += 1
+    return deleted
+
+
+def _delete_renditions(name):
+    for formats in rendition_names(name).values():
+        for rendition in formats.values():
+            if default_storage.exists(rendition):
+                default_storage.delete(rendition)
+
+
+def _collect_stray_files(storage, cutoff):
+    """Delete blob files older than `cutoff` that have no StoredBlob row."""
+    root = storage.path(CAS_PREFIX)
+    deleted = 0
+    for directory, subdirectories, files in os.walk(root):
+        if directory == root:
+            subdirectories[:] = [name for name in subdirectories if name != 'tmp']
+        names = {
+            CAS_PREFIX + os.path.relpath(os.path.join(directory, file), root).replace(os.sep, '/'): file
+            for file in files if not file.endswith('.deleting')
+        }
+        names = {name: file for name, file in names.items() if content_digest(name)}
+        if not names:
+            continue
+        known = set(StoredBlob.objects.filter(name__in=names).values_list('name', flat=True))
+        for name in names.keys() - known:
+            path = storage.path(name)
+            tombstone = path + '.deleting'
+            try:
+                if datetime.fromtimestamp(os.path.getmtime(path), tz=dt_timezone.utc) > cutoff:
+                    continue  # Possibly a save whose transaction is still open
+                os.rename(path, tombstone)
+            except FileNotFoundError:
+                continue
+            if StoredBlob.objects.filter(name=name).exists():
+                os.replace(tombstone, path)
+                continue
+            os.remove(tombstone)
+            deleted += 1
+    return deleted
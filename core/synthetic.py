@@ -0,0 +1,191 @@
+"""
+Synthetic users, courses, lessons and enrollments at production volumes.
+
+Rows are written with bulk_create in batches, each in its own transaction,
+so no model signals fire and every password shares one precomputed hash.
+Popularity is skewed the way real catalogs are: a few instructors teach
+most courses and a few courses draw most enrollments (Zipf-like weights).
+
+Generation is deterministic: each batch draws from a random generator
+seeded with (seed, kind, first index). A run can be interrupted and started
+again with the same arguments; it counts what already exists and carries on
+from the next batch.
+"""
+import bisect
+import itertools
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Max
+
+from accounts.models import UserProfile
+from courses.models import Course, Enrollment, Lesson
+
+USER_PREFIX = 'synth_'
+
+TOPICS = {
+    'programming': ['Python', 'JavaScript', 'Django', 'React', 'SQL', 'Rust', 'Go', 'Algorithms'],
+    'design': ['Figma', 'Typography', 'UX', 'Illustration', 'Branding'],
+    'business': ['Startup', 'Finance', 'Leadership', 'Negotiation', 'Accounting'],
+    'marketing': ['SEO', 'Content', 'Email', 'Social Media', 'Analytics'],
+    'music': ['Guitar', 'Piano', 'Music Theory', 'Production', 'Singing'],
+    'photography': ['Portrait', 'Lightroom', 'Landscape', 'Film', 'Street'],
+    'health': ['Yoga', 'Nutrition', 'Running', 'Strength', 'Meditation'],
+    'language': ['Spanish', 'French', 'German', 'Japanese', 'English'],
+    'other': ['Chess', 'Cooking', 'Gardening', 'Writing'],
+}
+CATEGORY_WEIGHTS = {
+    'programming': 30, 'design': 12, 'business': 14, 'marketing': 10, 'music': 8,
+    'photography': 6, 'health': 8, 'language': 9, 'other': 3,
+}
+DIFFICULTY_WEIGHTS = {'beginner': 50, 'intermediate': 35, 'advanced': 15}
+LEVELS = ['Introduction to', 'Practical', 'Mastering', 'Complete', 'Hands-on', 'Modern']
+SUFFIXES = ['for Beginners', 'Bootcamp', 'in Practice', 'Fundamentals', 'Masterclass', 'Deep Dive']
+FIRST_NAMES = ['Amina', 'Brian', 'Chen', 'Diego', 'Eve', 'Fatma', 'Grace', 'Hiro', 'Ivan', 'Jo', 'Kwame', 'Lena']
+LAST_NAMES = ['Otieno', 'Smith', 'Wang', 'Garcia', 'Ivanova', 'Kim', 'Mensah', 'Novak', 'Rossi', 'Sato']
+
+
+def zipf_cum_weights(count, exponent=1.0):
+    return list(itertools.accumulate(1 / (rank + 1) ** exponent for rank in range(count)))
+
+
+def count_draw(rng, mean):
+    """A non-negative integer with the given mean and a long tail."""
+    return int(rng.expovariate(1 / mean) + 0.5) if mean > 0 else 0
+
+
+class SyntheticDataset:
+    def __init__(self, users, instructors, courses, lessons, enrollments, seed=0,
+                 batch_size=5000, password='synthetic-pass', log=None):
+        self.users = users
+        self.instructors = min(instructors, users)
+        self.courses = courses
+        self.lessons = lessons
+        self.enrollments = enrollments
+        self.seed = seed
+        self.batch_size = batch_size
+        self.password_hash = make_password(password)
+        self.log = log or (lambda kind, done, total, rate: None)
+
+    def rng(self, kind, start):
+        return random.Random(f'{self.seed}:{kind}:{start}')
+
+    def generate(self):
+        self.create_users()
+        self.create_courses()
+        self.create_lessons()
+        self.create_enrollments()
+
+    def synthetic_users(self):
+        return User.objects.filter(username__startswith=USER_PREFIX)
+
+    def synthetic_courses(self):
+        return Course.objects.filter(instructor__username__startswith=USER_PREFIX)
+
+    def batches(self, kind, done, total, step, create):
+        """Run create(start, stop, rng) for each remaining batch, one transaction each."""
+        # Resume at the batch boundary after the last completed one
+        start = -(-done // step) * step if done else 0
+        began = time.monotonic()
+        created = 0
+        for start in range(start, total, step):
+            stop = min(start + step, total)
+            with transaction.atomic():
+                created += create(start, stop, self.rng(kind, start))
+            self.log(kind, stop, total, created / max(time.monotonic() - began, 1e-9))
+
+    def create_users(self):
+        def create(start, stop, rng):
+            users = User.objects.bulk_create([
+                User(
+                    username=f'{USER_PREFIX}{number:08d}', email=f'{USER_PREFIX}{number}@example.com',
+                    first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                    password=self.password_hash,
+                )
+                for number in range(start, stop)
+            ])
+            UserProfile.objects.bulk_create([
+                UserProfile(user=user, user_type='instructor' if number < self.instructors else 'student')
+                for number, user in zip(range(start, stop), users)
+            ])
+            return len(users) * 2
+
+        self.batches('users', self.synthetic_users().count(), self.users, self.batch_size, create)
+
+    def create_courses(self):
+        instructor_ids = list(self.synthetic_users().order_by('pk').values_list('pk', flat=True)[:self.instructors])
+        if not instructor_ids:
+            return
+        instructor_weights = zipf_cum_weights(len(instructor_ids), 1.2)
+        categories = list(CATEGORY_WEIGHTS)
+        difficulties = list(DIFFICULTY_WEIGHTS)
+
+        def create(start, stop, rng):
+            courses = []
+            for number in range(start, stop):
+                category = rng.choices(categories, weights=list(CATEGORY_WEIGHTS.values()))[0]
+                topic = rng.choice(TOPICS[category])
+                courses.append(Course(
+                    title=f'{rng.choice(LEVELS)} {topic} {rng.choice(SUFFIXES)}',
+                    description=f'Synthetic course {number}: {topic.lower()} for {category} learners.',
+                    category=category,
+                    difficulty=rng.choices(difficulties, weights=list(DIFFICULTY_WEIGHTS.values()))[0],
+                    instructor_id=rng.choices(instructor_ids, cum_weights=instructor_weights)[0],
+                ))
+            return len(Course.objects.bulk_create(courses))
+
+        self.batches('courses', self.synthetic_courses().count(), self.courses, self.batch_size, create)
+
+    def create_lessons(self):
+        course_ids = list(self.synthetic_courses().order_by('pk').values_list('pk', flat=True))
+        if not course_ids:
+            return
+        mean = self.lessons / len(course_ids)
+        last = Lesson.objects.filter(course_id__in=self.synthetic_courses().values('pk')).aggregate(last=Max('course_id'))['last']
+        done = bisect.bisect_right(course_ids, last) if last is not None else 0
+
+        def create(start, stop, rng):
+            lessons = []
+            for number, course_id in enumerate(course_ids[start:stop], start):
+                for order in range(1, 1 + max(1, count_draw(rng, mean))):
+                    lessons.append(Lesson(
+                        course_id=course_id, title=f'Lesson {order}', order=order,
+                        video_url=f'https://videos.example.com/{number}/{order}' if rng.random() < 0.7 else None,
+                    ))
+            return len(Lesson.objects.bulk_create(lessons, batch_size=self.batch_size))
+
+        step = max(1, int(self.batch_size // max(mean, 1)))
+        self.batches('lessons', done, len(course_ids), step, create)
+
+    def create_enrollments(self):
+        user_ids = list(self.synthetic_users().order_by('pk').values_list('pk', flat=True))[self.instructors:]
+        course_ids = list(self.synthetic_courses().order_by('pk').values_list('pk', flat=True))
+        if not user_ids or not course_ids:
+            return
+        # Popularity is independent of creation order
+        popularity = course_ids[:]
+        random.Random(f'{self.seed}:popularity').shuffle(popularity)
+        course_weights = zipf_cum_weights(len(popularity))
+        mean = self.enrollments / len(user_ids)
+        last = Enrollment.objects.filter(user__username__startswith=USER_PREFIX).aggregate(last=Max('user_id'))['last']
+        done = bisect.bisect_right(user_ids, last) if last is not None else 0
+
+        def create(start, stop, rng):
+            enrollments = []
+            for user_id in user_ids[start:stop]:
+                wanted = min(count_draw(rng, mean), len(popularity))
+                picked = set()
+                while len(picked) < wanted:
+                    picked.update(rng.choices(popularity, cum_weights=course_weights, k=wanted - len(picked)))
+                for course_id in sorted(picked):
+                    progress = rng.choice((0, 0, 0, 10, 25, 50, 75, 100))
+                    enrollments.append(Enrollment(
+                        user_id=user_id, course_id=course_id, progress=progress, completed=progress == 100,
+                    ))
+            return len(Enrollment.objects.bulk_create(enrollments, batch_size=self.batch_size))
+
+        step = max(1, int(self.batch_size // max(mean, 1)))
+        self.batches('enrollments', done, len(user_ids), step, create)
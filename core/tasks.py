@@ -0,0 +1,26 @@
+from django.apps import apps
+
+from .deletion import run_deletion as purge
+from .images import generate_renditions, needs_renditions
+from .jobs import task
+from .models import Deletion
+from .storage import collect_orphaned_blobs as collect
+
+
+@task(name='core.render_image_renditions', queue='media')
+def render_image_renditions(model, pk, field_name, renditions_field):
+    instance = apps.get_model(model)._default_manager.filter(pk=pk).first()
+    if instance is not None and needs_renditions(instance, field_name, renditions_field):
+        generate_renditions(instance, field_name, renditions_field)
+
+
+@task(name='core.collect_orphaned_blobs', queue='maintenance')
+def collect_orphaned_blobs():
+    collect()
+
+
+@task(name='core.run_deletion', queue='maintenance')
+def run_deletion(deletion_id):
+    deletion = Deletion.objects.filter(pk=deletion_id).exclude(status='done').first()
+    if deletion is not None:
+        purge(deletion)
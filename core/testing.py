@@ -0,0 +1,70 @@
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+# Plan details that mean SQLite reads a whole table or sorts in a temp B-tree
+# instead of walking an index in the requested order.
+BAD_PLAN_MARKERS = ('USE TEMP B-TREE',)
+
+
+def explain_query_plan(sql):
+    """Return the EXPLAIN QUERY PLAN detail lines for an SQLite query."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_problems(details):
+    problems = []
+    for detail in details:
+        if any(marker in detail for marker in BAD_PLAN_MARKERS):
+            problems.append(detail)
+        elif detail.startswith('SCAN ') and ' USING ' not in detail and 'CONSTANT ROW' not in detail:
+            problems.append(detail)
+    return problems
+
+
+class QueryPlanAssertionsMixin:
+    """
+    TestCase mixin that runs EXPLAIN QUERY PLAN on every SELECT issued by a
+    block of code and fails on full table scans or temporary sorts.
+    """
+
+    def assertQueriesUseIndexes(self, func, *args, **kwargs):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN checks are SQLite specific')
+
+        with CaptureQueriesContext(connection) as context:
+            result = func(*args, **kwargs)
+
+        failures = []
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            problems = plan_problems(explain_query_plan(sql))
+            if problems:
+                failures.append(f"{sql}\n    -> {'; '.join(problems)}")
+        if failures:
+            self.fail('Queries without a usable index:\n' + '\n'.join(failures))
+        return result
+
+
+class WriteCountAssertionsMixin:
+    """TestCase mixin counting the INSERT, UPDATE and DELETE statements a block issues."""
+
+    @contextmanager
+    def assertNumWrites(self, count):
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        writes = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].lstrip().upper().startswith(WRITE_STATEMENTS)
+        ]
+        self.assertEqual(
+            len(writes), count,
+            f'{len(writes)} writes, expected {count}:\n' + '\n'.join(writes),
+        )
@@ -0,0 +1,110 @@
+"""
+Per-request time breakdown for the Server-Timing header and access log.
+
+RequestTimingMiddleware starts a RequestTimings for each request and counts
+its SQL. Code running in the request marks phases with `timed(name)`:
+ServerTimingMixin does this for DRF authentication, permission checks and
+the view handler, and TimedJSONRenderer for rendering. Phases nest and each
+records only its own time, excluding nested phases and SQL. That way auth,
+permissions, db, serialize and render add up to the time spent in the view,
+and a slow endpoint shows at a glance whether SQL or Python is to blame.
+"""
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .metrics import QueryTimer
+
+_current = ContextVar('request_timings', default=None)
+
+PHASE_DESCRIPTIONS = {
+    'auth': 'Authentication',
+    'permissions': 'Permission checks',
+    'db': 'Database',
+    'serialize': 'View and serializers',
+    'render': 'Rendering',
+    'total': 'Total',
+}
+
+
+class RequestTimings:
+    def __init__(self):
+        self.db = QueryTimer()
+        self.phases = defaultdict(float)
+        self._stack = []
+
+    def as_milliseconds(self, total=None):
+        result = {phase: round(seconds * 1000, 3) for phase, seconds in self.phases.items()}
+        result['db'] = round(self.db.duration * 1000, 3)
+        if total is not None:
+            result['total'] = round(total * 1000, 3)
+        return result
+
+    def server_timing(self, total=None):
+        entries = []
+        for phase, milliseconds in self.as_milliseconds(total).items():
+            description = PHASE_DESCRIPTIONS.get(phase, phase)
+            if phase == 'db':
+                description = f'{self.db.count} quer{"y" if self.db.count == 1 else "ies"}'
+            entries.append(f'{phase};dur={milliseconds:.2f};desc="{description}"')
+        return ', '.join(entries)
+
+
+@contextmanager
+def request_timings():
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def current_timings():
+    return _current.get()
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in this block, minus nested phases and SQL, to `phase`."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    frame = {'wall': 0.0, 'db': 0.0}
+    timings._stack.append(frame)
+    db_before = timings.db.duration
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - start
+        db = timings.db.duration - db_before
+        timings._stack.pop()
+        timings.phases[phase] += wall - frame['wall'] - (db - frame['db'])
+        if timings._stack:
+            timings._stack[-1]['wall'] += wall
+            timings._stack[-1]['db'] += db
+
+
+class ServerTimingMixin:
+    """Time a DRF view's authentication, permission checks and handler."""
+
+    def perform_authentication(self, request):
+        with timed('auth'):
+            super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        with timed('permissions'):
+            super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with timed('permissions'):
+            super().check_object_permissions(request, obj)
+
+    def dispatch(self, request, *args, **kwargs):
+        # Whatever the handler does outside SQL is, for these views, mostly
+        # building querysets and serializing them
+        with timed('serialize'):
+            return super().dispatch(request, *args, **kwargs)
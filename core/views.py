@@ -0,0 +1,62 @@
+import ipaddress
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .batch import identity_cache, max_requests, run_subrequest
+from .metrics import render
+from .models import Deletion
+from .serializers import DeletionSerializer
+from .timing import ServerTimingMixin
+
+
+def _metrics_allowed(request):
+    token = settings.METRICS_TOKEN
+    if token and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network) for network in settings.METRICS_ALLOWED_NETWORKS)
+
+
+def metrics(request):
+    """Prometheus scrape endpoint, aggregated over every worker process."""
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class DeletionDetailView(ServerTimingMixin, generics.RetrieveAPIView):
+    """Progress of a background deletion, for whoever requested it and staff"""
+    serializer_class = DeletionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        if self.request.user.is_staff:
+            return Deletion.objects.all()
+        return Deletion.objects.filter(requested_by=self.request.user)
+
+
+class BatchView(ServerTimingMixin, APIView):
+    """Run up to BATCH_MAX_REQUESTS GET requests against the API in one round trip (see core.batch)"""
+    permission_classes = [permissions.AllowAny]
+    
+    def post(self, request):
+        requests = request.data.get('requests') if isinstance(request.data, dict) else None
+        if not isinstance(requests, list) or not requests:
+            return Response({
+                'error': 'Send a non-empty "requests" list'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(requests) > max_requests():
+            return Response({
+                'error': f'At most {max_requests()} requests per batch'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        with identity_cache():
+            responses = [run_subrequest(request, item) for item in requests]
+        return Response({'responses': responses})
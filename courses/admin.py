@@ -1,25 +1,63 @@
 from django.contrib import admin
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from core.admin import delete_in_background
+from core.pagination import EstimatedCountPaginator
 from .models import Course, Lesson, Enrollment
 
+def count_subquery(model, field):
+    """Correlated COUNT(*) per course, without the row explosion of joining two relations"""
+    counts = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(n=Count('*')).values('n')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
     list_display = ['title', 'instructor', 'category', 'difficulty', 'created_at', 'total_lessons', 'total_enrollments']
     list_filter = ['category', 'difficulty', 'created_at']
+    list_select_related = ['instructor']
     search_fields = ['title', 'description', 'instructor__username']
     readonly_fields = ['total_lessons', 'total_enrollments']
+    autocomplete_fields = ['instructor']
     date_hierarchy = 'created_at'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = [delete_in_background]
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            lesson_count=count_subquery(Lesson, 'course'),
+            enrollment_count=count_subquery(Enrollment, 'course'),
+        )
+    
+    @admin.display(description='Total lessons', ordering='lesson_count')
+    def total_lessons(self, obj):
+        return obj.lesson_count
+    
+    @admin.display(description='Total enrollments', ordering='enrollment_count')
+    def total_enrollments(self, obj):
+        return obj.enrollment_count
 
 @admin.register(Lesson)
 class LessonAdmin(admin.ModelAdmin):
     list_display = ['title', 'course', 'order', 'created_at']
-    list_filter = ['course', 'created_at']
+    # Filtering by course goes through search: a sidebar listing every
+    # course doesn't scale
+    list_filter = ['created_at']
+    list_select_related = ['course']
     search_fields = ['title', 'course__title']
+    autocomplete_fields = ['course']
     ordering = ['course', 'order']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 @admin.register(Enrollment)
 class EnrollmentAdmin(admin.ModelAdmin):
     list_display = ['user', 'course', 'enrollment_date', 'progress', 'completed']
-    list_filter = ['enrollment_date', 'completed', 'course']
+    # No date_hierarchy: its year/month drill-down runs DISTINCT over the table
+    list_filter = ['enrollment_date', 'completed']
+    list_select_related = ['user', 'course']
     search_fields = ['user__username', 'course__title']
     readonly_fields = ['enrollment_date']
-    date_hierarchy = 'enrollment_date'
+    autocomplete_fields = ['user', 'course']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
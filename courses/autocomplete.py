@@ -0,0 +1,149 @@
+"""
+Course title autocomplete from an in-process prefix index.
+
+Each worker keeps every live course title in a sorted list of
+(normalized key, course id) entries, one per word a title can be matched
+from ("advanced python" is found by "adv" and by "pyth"). A query is a
+bisect to the first key starting with the normalized prefix and a walk to
+the last, with the matches ranked by enrollment count. Results are memoized
+per prefix until the index changes, so a search box firing on every
+keystroke costs no SQL at all.
+
+The index is built on first use and kept current from the catalog version
+stamp (courses.cache): when it moves, only courses updated since shortly
+before the last one seen are re-read. updated_at is stamped before its
+transaction commits, so a slow transaction can become visible after a
+later one; re-reading a SYNC_OVERLAP window picks it up. A row count check
+catches courses deleted without a save, which forces a full rebuild.
+Popularity is refreshed every AUTOCOMPLETE_POPULARITY_TTL seconds.
+"""
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count
+
+from core.metrics import record_cache
+
+from .cache import catalog_version
+from .models import Course, Enrollment
+
+MAX_MEMOIZED = 2048
+# Longer than any transaction saving a course can stay open
+SYNC_OVERLAP = timedelta(minutes=5)
+
+
+def normalize(text):
+    """Lowercase ASCII words separated by single spaces ("Café Basics!" -> "cafe basics")."""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return ' '.join(re.findall(r'[a-z0-9]+', text))
+
+
+def title_keys(title):
+    """The title from each of its words on, so a prefix of any word matches."""
+    words = normalize(title).split(' ')
+    return sorted({' '.join(words[start:]) for start in range(len(words)) if words[start]})
+
+
+class TitleIndex:
+    """
+    Readers never lock: updates build new lists and dicts and swap them in,
+    so a search in progress keeps a consistent snapshot.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (sorted (key, id) entries, {id: keys}, {id: title}, {id: enrollments},
+        # memoized results), swapped as one so results always match their index
+        self.snapshot = ([], {}, {}, {}, {})
+        self.popularity_loaded = 0.0
+        self.version = None
+        self.watermark = None
+
+    def search(self, query, limit=10):
+        """Up to `limit` (id, title) pairs for courses with a word starting with `query`, most enrolled first."""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        self.refresh()
+        entries, _, titles, popularity, memo = self.snapshot
+        results = memo.get((prefix, limit))
+        if results is not None:
+            return results
+
+        matches = set()
+        position = bisect_left(entries, (prefix,))
+        while position < len(entries) and entries[position][0].startswith(prefix):
+            matches.add(entries[position][1])
+            position += 1
+        best = heapq.nsmallest(limit, matches, key=lambda pk: (-popularity.get(pk, 0), titles[pk], pk))
+        results = [(pk, titles[pk]) for pk in best]
+        if len(memo) < MAX_MEMOIZED:
+            memo[(prefix, limit)] = results
+        return results
+
+    def refresh(self):
+        version = catalog_version()
+        popularity_due = time.monotonic() - self.popularity_loaded > getattr(settings, 'AUTOCOMPLETE_POPULARITY_TTL', 300)
+        fresh = version == self.version and not popularity_due
+        record_cache('course-autocomplete', fresh)
+        if fresh:
+            return
+        with self.lock:
+            entries, keys, titles, popularity, _ = self.snapshot
+            if self.version is None:
+                entries, keys, titles = self._rebuild()
+            elif version != self.version:
+                entries, keys, titles = self._apply_changes(entries, keys, titles)
+            if popularity_due:
+                popularity = dict(Enrollment.objects.order_by().values_list('course_id').annotate(n=Count('id')))
+                self.popularity_loaded = time.monotonic()
+            self.snapshot = (entries, keys, titles, popularity, {})
+            self.version = version
+
+    def _rebuild(self):
+        entries, keys, titles, watermark = [], {}, {}, None
+        for pk, title, updated_at in Course.objects.order_by().values_list('id', 'title', 'updated_at').iterator():
+            keys[pk], titles[pk] = title_keys(title), title
+            entries += [(key, pk) for key in keys[pk]]
+            watermark = max(watermark or updated_at, updated_at)
+        entries.sort()
+        self.watermark = watermark
+        return entries, keys, titles
+
+    def _apply_changes(self, entries, keys, titles):
+        changed = Course.all_objects.order_by()
+        if self.watermark is not None:
+            # Re-reading courses already applied is harmless: each is replaced
+            changed = changed.filter(updated_at__gte=self.watermark - SYNC_OVERLAP)
+        entries, keys, titles = (container.copy() for container in (entries, keys, titles))
+        watermark = self.watermark
+        for pk, title, updated_at, deleted_at in changed.values_list('id', 'title', 'updated_at', 'deleted_at'):
+            for key in keys.pop(pk, ()):
+                position = bisect_left(entries, (key, pk))
+                if position < len(entries) and entries[position] == (key, pk):
+                    del entries[position]
+            titles.pop(pk, None)
+            if deleted_at is None:
+                keys[pk], titles[pk] = title_keys(title), title
+                for key in keys[pk]:
+                    insort(entries, (key, pk))
+            watermark = max(watermark or updated_at, updated_at)
+        self.watermark = watermark
+        if len(titles) != Course.objects.count():
+            # Rows deleted outright leave no updated_at behind
+            return self._rebuild()
+        return entries, keys, titles
+
+
+_index = TitleIndex()
+
+
+def search_titles(query, limit=10):
+    return _index.search(query, limit)
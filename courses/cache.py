@@ -0,0 +1,28 @@
+"""
+Version stamp for cached catalog data (facet counts, search indexes).
+
+Cache keys embed the current version; saving or deleting a course bumps it
+once the transaction commits, so stale entries are simply never read again
+and expire on their own.
+"""
+import uuid
+
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def catalog_key(name):
+    return f'catalog:{catalog_version()}:{name}'
@@ -0,0 +1,45 @@
+from django.db.models import Count
+
+from .models import Course
+
+
+def course_facets(queryset):
+    """
+    Count `queryset` per category, difficulty and instructor with a single
+    GROUP BY over all three columns, folding the groups into each facet.
+    Every category and difficulty choice is listed, including empty ones.
+    """
+    groups = (
+        queryset.order_by()
+        .values('category', 'difficulty', 'instructor_id', 'instructor__username')
+        .annotate(count=Count('id'))
+    )
+    categories = dict.fromkeys(dict(Course.CATEGORY_CHOICES), 0)
+    difficulties = dict.fromkeys(dict(Course.DIFFICULTY_CHOICES), 0)
+    instructors = {}
+    total = 0
+    for group in groups:
+        count = group['count']
+        total += count
+        categories[group['category']] = categories.get(group['category'], 0) + count
+        difficulties[group['difficulty']] = difficulties.get(group['difficulty'], 0) + count
+        key = (group['instructor_id'], group['instructor__username'])
+        instructors[key] = instructors.get(key, 0) + count
+
+    category_labels = dict(Course.CATEGORY_CHOICES)
+    difficulty_labels = dict(Course.DIFFICULTY_CHOICES)
+    return {
+        'total': total,
+        'category': [
+            {'value': value, 'label': category_labels.get(value, value), 'count': count}
+            for value, count in categories.items()
+        ],
+        'difficulty': [
+            {'value': value, 'label': difficulty_labels.get(value, value), 'count': count}
+            for value, count in difficulties.items()
+        ],
+        'instructor': [
+            {'value': instructor_id, 'label': username, 'count': count}
+            for (instructor_id, username), count in sorted(instructors.items(), key=lambda item: (-item[1], item[0][0]))
+        ],
+    }
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from courses.recommendations import build_neighbors, neighbor_count
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the co-enrollment index behind course recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--neighbors', type=int, default=None, help='Neighbours kept per course (default: RECOMMENDATION_NEIGHBORS)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Enrollments fetched per round trip')
+
+    def handle(self, *args, **options):
+        count = build_neighbors(options['neighbors'], options['chunk_size'])
+        k = options['neighbors'] or neighbor_count()
+        self.stdout.write(f'Stored {count} neighbour(s), up to {k} per course')
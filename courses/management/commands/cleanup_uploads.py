@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from courses.uploads import cleanup_expired_uploads
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked uploads that expired before being finalized'
+
+    def handle(self, *args, **options):
+        count = cleanup_expired_uploads()
+        self.stdout.write(f'Removed {count} abandoned upload(s)')
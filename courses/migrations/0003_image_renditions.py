@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 07:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_course_enrollment_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='thumbnail_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-19 07:39
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_image_renditions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaterialUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.BigIntegerField(help_text='Total size in bytes')),
+                ('sha256', models.CharField(help_text='Hex SHA-256 of the complete file', max_length=64)),
+                ('received', models.BigIntegerField(default=0, help_text='Bytes stored so far; the next chunk starts here')),
+                ('status', models.CharField(choices=[('uploading', 'Uploading'), ('complete', 'Complete')], default='uploading', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='material_uploads', to='courses.lesson')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='material_uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='upload_expiry_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-19 07:44
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_material_upload'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='course',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.cas_storage, upload_to='course_thumbnails/'),
+        ),
+        migrations.AlterField(
+            model_name='lesson',
+            name='materials',
+            field=models.FileField(blank=True, null=True, storage=core.storage.cas_storage, upload_to='lesson_materials/'),
+        ),
+    ]
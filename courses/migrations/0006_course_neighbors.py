@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-19 07:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('co_enrollments', models.PositiveIntegerField(help_text='Learners enrolled in both courses')),
+                ('score', models.FloatField(help_text="Cosine similarity of the two courses' enrollments")),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='courses.course')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.course')),
+            ],
+            options={
+                'ordering': ['course', '-score'],
+                'indexes': [models.Index(fields=['course', '-score'], name='neighbor_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('course', 'neighbor'), name='unique_course_neighbor')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_course_neighbors'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='course',
+            name='course_created_idx',
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Set when the course is scheduled for deletion; it is hidden from then on', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at'], name='course_created_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_course_deleted_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='last_completed_order',
+            field=models.PositiveIntegerField(default=0, help_text='Order of the furthest lesson completed; learning resumes with the lesson after it'),
+        ),
+    ]
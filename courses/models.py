@@ -1,8 +1,28 @@
-from django.db import models
+import os
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError, connections, models, router
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from core.images import schedule_renditions
+from core.jobs import enqueue
+from core.deletion import deletion_scheduled
+from core.models import DirtyFieldsMixin
+from core.storage import cas_storage, track_references
+from .cache import bump_catalog_version
+
+class CourseManager(models.Manager):
+    """Courses that aren't being deleted (see core.deletion)"""
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
 
-class Course(models.Model):
+class Course(DirtyFieldsMixin, models.Model):
     CATEGORY_CHOICES = [
         ('programming', 'Programming'),
         ('design', 'Design'),
@@ -26,12 +46,30 @@ class Course(models.Model):
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
     difficulty = models.CharField(max_length=20, choices=DIFFICULTY_CHOICES)
     instructor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='courses_created')
-    thumbnail = models.ImageField(upload_to='course_thumbnails/', blank=True, null=True)
+    thumbnail = models.ImageField(upload_to='course_thumbnails/', storage=cas_storage, blank=True, null=True)
+    thumbnail_renditions = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(
+        blank=True, null=True, editable=False,
+        help_text="Set when the course is scheduled for deletion; it is hidden from then on"
+    )
+    
+    objects = CourseManager()
+    all_objects = models.Manager()
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Catalog: unfiltered and filtered listings ordered by newest first
+            # (the unfiltered one only over live courses, so it also covers COUNT(*))
+            models.Index(fields=['-created_at'], condition=models.Q(deleted_at__isnull=True), name='course_created_idx'),
+            models.Index(fields=['category', 'difficulty', '-created_at'], name='course_catalog_idx'),
+            models.Index(fields=['category', '-created_at'], name='course_category_idx'),
+            models.Index(fields=['difficulty', '-created_at'], name='course_difficulty_idx'),
+            # InstructorCoursesView / ?instructor= filter
+            models.Index(fields=['instructor', '-created_at'], name='course_instructor_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -44,11 +82,11 @@ class Course(models.Model):
     def total_enrollments(self):
         return self.enrollments.count()
 
-class Lesson(models.Model):
+class Lesson(DirtyFieldsMixin, models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='lessons')
     title = models.CharField(max_length=200)
     video_url = models.URLField(blank=True, null=True)
-    materials = models.FileField(upload_to='lesson_materials/', blank=True, null=True)
+    materials = models.FileField(upload_to='lesson_materials/', storage=cas_storage, blank=True, null=True)
     order = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -60,7 +98,103 @@ class Lesson(models.Model):
     def __str__(self):
         return f"{self.course.title} - Lesson {self.order}: {self.title}"
 
-class Enrollment(models.Model):
+class MaterialUpload(models.Model):
+    """A resumable, chunked upload that becomes a lesson's materials once finalized"""
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='material_uploads')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='material_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField(help_text="Total size in bytes")
+    sha256 = models.CharField(max_length=64, help_text="Hex SHA-256 of the complete file")
+    received = models.BigIntegerField(default=0, help_text="Bytes stored so far; the next chunk starts here")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='upload_expiry_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size}) for {self.lesson}"
+    
+    @property
+    def temp_path(self):
+        return os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{self.id}.part")
+
+class EnrollmentManager(models.Manager):
+    def enroll(self, user, course):
+        """
+        Enroll `user` in `course` with a single INSERT ... ON CONFLICT DO
+        NOTHING, returning the new enrollment, or None if one already
+        existed. There is no exists() check to race with, and post_save is
+        sent as for a regular create.
+        """
+        using = self._db or router.db_for_write(self.model)
+        connection = connections[using]
+        if not (connection.features.supports_ignore_conflicts and connection.features.can_return_rows_from_bulk_insert):
+            try:
+                with transaction.atomic(using=using):
+                    return self.db_manager(using).create(user=user, course=course)
+            except IntegrityError:
+                return None
+        
+        meta = self.model._meta
+        enrolled_at = timezone.now()
+        values = {'user_id': user.pk, 'course_id': course.pk, 'enrollment_date': enrolled_at}
+        for field in meta.concrete_fields:
+            if not field.primary_key and field.attname not in values:
+                values[field.attname] = field.get_default()
+        fields = [meta.get_field(attname) for attname in values]
+        quote = connection.ops.quote_name
+        sql = 'INSERT INTO {table} ({columns}) VALUES ({placeholders}) ON CONFLICT ({user}, {course}) DO NOTHING RETURNING {pk}'.format(
+            table=quote(meta.db_table),
+            columns=', '.join(quote(field.column) for field in fields),
+            placeholders=', '.join(['%s'] * len(fields)),
+            user=quote(meta.get_field('user').column),
+            course=quote(meta.get_field('course').column),
+            pk=quote(meta.pk.column),
+        )
+        params = [field.get_db_prep_save(values[field.attname], connection) for field in fields]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        enrollment = self.model.from_db(using, [meta.pk.attname, *values], [row[0], *values.values()])
+        enrollment.user = user
+        enrollment.course = course
+        post_save.send(sender=self.model, instance=enrollment, created=True, update_fields=None, raw=False, using=using)
+        return enrollment
+    
+    def resume_points(self, user):
+        """
+        `user`'s enrollments annotated with the lesson to resume, the first
+        one after last_completed_order (resume_lesson_id/_title/_order, None
+        once every lesson is done), and the lessons either side of it
+        (previous_lesson_id, next_lesson_id). Each annotation is a
+        correlated subquery seeking the (course, order) index, so this is
+        one query however many courses and lessons there are.
+        """
+        lessons = Lesson.objects.filter(course=OuterRef('course_id'))
+        ahead = lessons.filter(order__gt=OuterRef('last_completed_order')).order_by('order')
+        behind = lessons.filter(order__lte=OuterRef('last_completed_order')).order_by('-order')
+        return self.filter(user=user, course__deleted_at__isnull=True).select_related('course').annotate(
+            resume_lesson_id=Subquery(ahead.values('id')[:1]),
+            resume_lesson_title=Subquery(ahead.values('title')[:1]),
+            resume_lesson_order=Subquery(ahead.values('order')[:1]),
+            next_lesson_id=Subquery(ahead.values('id')[1:2]),
+            previous_lesson_id=Subquery(behind.values('id')[:1]),
+        )
+
+class Enrollment(DirtyFieldsMixin, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='enrollments')
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='enrollments')
     enrollment_date = models.DateTimeField(auto_now_add=True)
@@ -70,17 +204,81 @@ class Enrollment(models.Model):
         help_text="Progress percentage (0-100)"
     )
     completed = models.BooleanField(default=False)
+    last_completed_order = models.PositiveIntegerField(
+        default=0,
+        help_text="Order of the furthest lesson completed; learning resumes with the lesson after it"
+    )
+    
+    objects = EnrollmentManager()
     
     class Meta:
         unique_together = ['user', 'course']
         ordering = ['-enrollment_date']
+        indexes = [
+            # EnrollmentListView: a user's enrollments, newest first
+            models.Index(fields=['user', '-enrollment_date'], name='enrollment_user_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} enrolled in {self.course.title}"
     
     def update_progress(self, new_progress):
-        """Update progress and mark as completed if 100%"""
+        """Update progress and mark as completed if 100%; a no-op if nothing changes"""
         self.progress = min(100, max(0, new_progress))
         if self.progress >= 100:
             self.completed = True
         self.save()
+
+class CourseNeighbor(models.Model):
+    """
+    One of a course's top co-enrolled courses, precomputed by
+    courses.recommendations so "learners also took" is a single index read.
+    """
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    co_enrollments = models.PositiveIntegerField(help_text="Learners enrolled in both courses")
+    score = models.FloatField(help_text="Cosine similarity of the two courses' enrollments")
+    
+    class Meta:
+        ordering = ['course', '-score']
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'neighbor'], name='unique_course_neighbor'),
+        ]
+        indexes = [
+            models.Index(fields=['course', '-score'], name='neighbor_score_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.course_id} -> {self.neighbor_id} ({self.score:.3f})"
+
+@receiver(post_save, sender=Course)
+def render_course_thumbnail(sender, instance, **kwargs):
+    schedule_renditions(instance, 'thumbnail', 'thumbnail_renditions')
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_catalog_cache(sender, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+@receiver(deletion_scheduled, sender=Course)
+def hide_course(sender, instance, **kwargs):
+    instance.deleted_at = timezone.now()
+    instance.save()
+
+@receiver(deletion_scheduled, sender=User)
+def hide_instructor_courses(sender, instance, **kwargs):
+    now = timezone.now()
+    if Course.objects.filter(instructor=instance).update(deleted_at=now, updated_at=now):
+        transaction.on_commit(bump_catalog_version)
+
+@receiver(post_save, sender=Enrollment)
+def refresh_course_neighbors(sender, instance, created, raw=False, **kwargs):
+    # The job commits with the enrollment; dedup collapses bursts on a popular course
+    if created and not raw:
+        enqueue(
+            'courses.refresh_course_neighbors', {'course_id': instance.course_id},
+            dedup_key=f'neighbors:{instance.course_id}',
+        )
+
+track_references(Course, 'thumbnail')
+track_references(Lesson, 'materials')
@@ -0,0 +1,23 @@
+from django.urls import reverse
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class LessonCursorPagination(CursorPagination):
+    """
+    Keyset pagination over a course's lessons: each page is an index range
+    scan on (course, order) starting after the previous page's last lesson,
+    so late pages cost the same as the first. `order` is unique within a
+    course; `id` only makes the ordering total.
+    """
+    ordering = ('order', 'id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+def lessons_after_url(course_id, lesson, request=None):
+    """Link to the lesson list page that starts after `lesson`."""
+    paginator = LessonCursorPagination()
+    url = reverse('lesson-list-create', kwargs={'course_id': course_id})
+    paginator.base_url = request.build_absolute_uri(url) if request is not None else url
+    return paginator.encode_cursor(Cursor(offset=0, reverse=False, position=str(lesson.order)))
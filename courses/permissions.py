@@ -55,3 +55,18 @@ class IsEnrollmentOwnerOrReadOnly(permissions.BasePermission):
         
         # Check if user is the owner of the enrollment
         return obj.user == request.user
+
+class IsEnrolledOrCourseInstructor(permissions.BasePermission):
+    """
+    Custom permission to only allow students enrolled in the lesson's course,
+    or the course instructor, to access the lesson's files.
+    """
+    
+    def has_object_permission(self, request, view, obj):
+        if not request.user.is_authenticated:
+            return False
+        
+        if obj.course.instructor_id == request.user.id:
+            return True
+        
+        return obj.course.enrollments.filter(user=request.user).exists()
@@ -0,0 +1,179 @@
+"""
+"Learners also took" recommendations from a precomputed co-enrollment index.
+
+Two courses are similar when the same learners enroll in both. The score is
+the cosine similarity of their enrollment sets,
+
+    co_enrollments(a, b) / sqrt(enrollments(a) * enrollments(b))
+
+which keeps a handful of very popular courses from showing up as every
+course's neighbour. Each course's top neighbours are stored in
+CourseNeighbor so serving is one indexed lookup:
+
+- `build_neighbors` rebuilds the whole table from a streaming pass over
+  Enrollment (run `manage.py build_recommendations` periodically).
+- `refresh_neighbors` updates one course incrementally after new
+  enrollments; Enrollment's post_save handler queues it.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+from itertools import combinations
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import Course, CourseNeighbor, Enrollment
+
+# Learners enrolled in more courses than this (bulk-enrolled staff or test
+# accounts) are left out: they add pairs quadratically and little signal.
+MAX_BASKET = 500
+
+
+def neighbor_count():
+    return getattr(settings, 'RECOMMENDATION_NEIGHBORS', 20)
+
+
+def similarity(co_enrollments, size_a, size_b):
+    return co_enrollments / math.sqrt(size_a * size_b)
+
+
+def co_enrollment_counts(chunk_size=5000):
+    """
+    Return ({(a, b): co_enrollments} with a < b, {course: enrollments}).
+
+    Enrollments are streamed ordered by learner, which the (user, course)
+    unique index already provides, so only one learner's courses are held
+    at a time besides the sparse pair counts.
+    """
+    pairs = Counter()
+    sizes = Counter()
+    rows = Enrollment.objects.order_by('user_id', 'course_id').values_list('user_id', 'course_id')
+    current, basket = None, []
+    for user_id, course_id in rows.iterator(chunk_size=chunk_size):
+        if user_id != current:
+            if len(basket) <= MAX_BASKET:
+                pairs.update(combinations(basket, 2))
+            current, basket = user_id, []
+        basket.append(course_id)
+        sizes[course_id] += 1
+    if len(basket) <= MAX_BASKET:
+        pairs.update(combinations(basket, 2))
+    return pairs, sizes
+
+
+def top_neighbors(pairs, sizes, k):
+    """Keep the k best-scoring neighbours of every course, as {course: [(score, co, neighbor)]}."""
+    heaps = defaultdict(list)
+    for (a, b), co in pairs.items():
+        score = similarity(co, sizes[a], sizes[b])
+        for course, other in ((a, b), (b, a)):
+            heap = heaps[course]
+            if len(heap) < k:
+                heapq.heappush(heap, (score, co, other))
+            elif (score, co, other) > heap[0]:
+                heapq.heapreplace(heap, (score, co, other))
+    return heaps
+
+
+def build_neighbors(k=None, chunk_size=5000):
+    """Rebuild CourseNeighbor from scratch; returns the number of rows written."""
+    k = k or neighbor_count()
+    pairs, sizes = co_enrollment_counts(chunk_size)
+    heaps = top_neighbors(pairs, sizes, k)
+    with transaction.atomic():
+        # Skip courses deleted while we were counting
+        existing = set(Course.objects.values_list('id', flat=True))
+        rows = [
+            CourseNeighbor(course_id=course, neighbor_id=other, co_enrollments=co, score=score)
+            for course, heap in heaps.items() if course in existing
+            for score, co, other in heap if other in existing
+        ]
+        CourseNeighbor.objects.all().delete()
+        CourseNeighbor.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def refresh_neighbors(course_id, k=None):
+    """
+    Recompute `course_id`'s neighbours and fold its new scores into the
+    neighbour lists of the courses it shares learners with. Lists that this
+    doesn't touch can drift slightly (e.g. after unenrollments) until the
+    next full build.
+    """
+    k = k or neighbor_count()
+    learners = Enrollment.objects.filter(course_id=course_id).values('user_id')
+    related = Enrollment.objects.filter(user_id__in=learners)
+    co = dict(related.exclude(course_id=course_id).values_list('course_id').annotate(n=Count('id')).order_by())
+    sizes = dict(
+        Enrollment.objects.filter(course_id__in=related.values('course_id'))
+        .values_list('course_id').annotate(n=Count('id')).order_by()
+    )
+    scores = {other: similarity(count, sizes[course_id], sizes[other]) for other, count in co.items()}
+
+    with transaction.atomic():
+        # Serialize refreshes of the same course (a no-op on SQLite, where writes already are)
+        if not Course.objects.select_for_update().filter(pk=course_id).exists():
+            return
+        best = heapq.nlargest(k, ((score, co[other], other) for other, score in scores.items()))
+        CourseNeighbor.objects.filter(course_id=course_id).delete()
+        CourseNeighbor.objects.bulk_create([
+            CourseNeighbor(course_id=course_id, neighbor_id=other, co_enrollments=count, score=score)
+            for score, count, other in best
+        ])
+
+        # Similarity is symmetric: offer this course to each related course's list
+        lists = defaultdict(list)
+        for row in CourseNeighbor.objects.filter(course_id__in=related.values('course_id')):
+            lists[row.course_id].append(row)
+        updated, created, evicted = [], [], []
+        for other, score in scores.items():
+            rows = lists[other]
+            mine = next((row for row in rows if row.neighbor_id == course_id), None)
+            if mine is not None:
+                mine.score, mine.co_enrollments = score, co[other]
+                updated.append(mine)
+            elif len(rows) < k:
+                created.append(CourseNeighbor(course_id=other, neighbor_id=course_id, co_enrollments=co[other], score=score))
+            else:
+                worst = min(rows, key=lambda row: row.score)
+                if score > worst.score:
+                    evicted.append(worst.pk)
+                    created.append(CourseNeighbor(course_id=other, neighbor_id=course_id, co_enrollments=co[other], score=score))
+        CourseNeighbor.objects.filter(pk__in=evicted).delete()
+        CourseNeighbor.objects.bulk_update(updated, ['score', 'co_enrollments'], batch_size=500)
+        CourseNeighbor.objects.bulk_create(created, batch_size=500)
+
+
+def similar_courses(course_id, limit):
+    """The stored neighbours of a course, best first."""
+    neighbors = (
+        CourseNeighbor.objects.filter(course_id=course_id, neighbor__deleted_at__isnull=True)
+        .select_related('neighbor__instructor__profile')
+        .order_by('-score')[:limit]
+    )
+    return [
+        {'course': row.neighbor, 'score': row.score, 'co_enrollments': row.co_enrollments}
+        for row in neighbors
+    ]
+
+
+def recommend_for_user(user, limit):
+    """
+    Courses most similar to everything `user` is enrolled in, summing each
+    candidate's scores across their courses' neighbour lists.
+    """
+    enrolled = Enrollment.objects.filter(user=user).values('course_id')
+    ranked = list(
+        CourseNeighbor.objects.filter(course_id__in=enrolled, neighbor__deleted_at__isnull=True)
+        .exclude(neighbor_id__in=enrolled)
+        .values('neighbor_id')
+        .annotate(total=Sum('score'), co=Sum('co_enrollments'))
+        .order_by('-total', 'neighbor_id')[:limit]
+    )
+    courses = Course.objects.select_related('instructor__profile').in_bulk([row['neighbor_id'] for row in ranked])
+    return [
+        {'course': courses[row['neighbor_id']], 'score': row['total'], 'co_enrollments': row['co']}
+        for row in ranked if row['neighbor_id'] in courses
+    ]
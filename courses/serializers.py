@@ -1,27 +1,153 @@
+import os
+import re
+
+from django.conf import settings
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Course, Lesson, Enrollment
+from .models import Course, Lesson, Enrollment, MaterialUpload
+from .pagination import lessons_after_url
 from accounts.serializers import UserSerializer
+from core.images import rendition_urls
+
+class LessonMaterialsField(serializers.FileField):
+    """
+    Accepts an upload like a FileField, but reads as the lesson-materials
+    endpoint, which checks enrollment, rather than the file's storage URL.
+    """
+    
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = reverse('lesson-materials', kwargs={'pk': value.instance.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
 
 class LessonSerializer(serializers.ModelSerializer):
+    materials = LessonMaterialsField(required=False, allow_null=True)
+    
     class Meta:
         model = Lesson
         fields = ['id', 'title', 'video_url', 'materials', 'order', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
+def enrollment_states(user, course_ids):
+    """{course id: (progress, completed)} for `user`'s enrollments in `course_ids`, in one query"""
+    rows = Enrollment.objects.filter(user=user, course_id__in=course_ids).values_list('course_id', 'progress', 'completed')
+    return {course_id: (progress, completed) for course_id, progress, completed in rows}
+
+class CourseListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        courses = list(data.all() if hasattr(data, 'all') else data)
+        user = self.child.enrollment_user()
+        if user is not None:
+            # Shared with the child: one IN query for the whole page
+            self.context['enrollment_states'] = enrollment_states(user, [course.pk for course in courses])
+        return super().to_representation(courses)
+
 class CourseSerializer(serializers.ModelSerializer):
+    """
+    With `enrollment_state` in the context (the catalog and course detail
+    views), authenticated users also get `is_enrolled`, `progress` and
+    `completed`; anonymous responses are unchanged.
+    """
     instructor = UserSerializer(read_only=True)
     lessons = LessonSerializer(many=True, read_only=True)
     total_lessons = serializers.ReadOnlyField()
     total_enrollments = serializers.ReadOnlyField()
+    thumbnail_renditions = serializers.SerializerMethodField()
     
     class Meta:
         model = Course
         fields = [
             'id', 'title', 'description', 'category', 'difficulty', 
-            'instructor', 'thumbnail', 'created_at', 'updated_at',
+            'instructor', 'thumbnail', 'thumbnail_renditions', 'created_at', 'updated_at',
             'lessons', 'total_lessons', 'total_enrollments'
         ]
         read_only_fields = ['created_at', 'updated_at', 'instructor']
+        list_serializer_class = CourseListSerializer
+    
+    def get_thumbnail_renditions(self, obj):
+        return rendition_urls(obj.thumbnail_renditions, self.context.get('request'))
+    
+    def enrollment_user(self):
+        request = self.context.get('request')
+        if self.context.get('enrollment_state') and request is not None and request.user.is_authenticated:
+            return request.user
+        return None
+    
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        user = self.enrollment_user()
+        if user is None:
+            return data
+        states = self.context.get('enrollment_states')
+        if states is None:
+            states = enrollment_states(user, [instance.pk])
+        progress, completed = states.get(instance.pk, (None, False))
+        data['is_enrolled'] = instance.pk in states
+        data['progress'] = progress
+        data['completed'] = completed
+        return data
+
+class LessonSummarySerializer(serializers.ModelSerializer):
+    """Just enough of a lesson to list it in a course outline"""
+    class Meta:
+        model = Lesson
+        fields = ['id', 'title', 'order']
+        read_only_fields = fields
+
+class CourseDetailSerializer(CourseSerializer):
+    """
+    A course with only its first lessons, in summary form, and `lessons_next`
+    linking to the rest in the lesson list. With `?expand=lessons` every
+    lesson is included in full, as CourseSerializer does.
+    """
+    preview_lessons = 20
+    
+    class Meta(CourseSerializer.Meta):
+        # `lessons` and `lessons_next` come from one query in to_representation
+        fields = [field for field in CourseSerializer.Meta.fields if field != 'lessons']
+    
+    def expand_lessons(self):
+        request = self.context.get('request')
+        return request is not None and 'lessons' in request.query_params.get('expand', '').split(',')
+    
+    def lesson_preview(self, obj):
+        """The lessons to embed and the URL of the ones after them, if any."""
+        if self.expand_lessons():
+            return LessonSerializer(obj.lessons.order_by('order', 'id'), many=True, context=self.context).data, None
+        # One row past the preview tells whether there is a next page
+        lessons = list(obj.lessons.order_by('order', 'id').only('id', 'title', 'order', 'course_id')[:self.preview_lessons + 1])
+        preview = LessonSummarySerializer(lessons[:self.preview_lessons], many=True).data
+        if len(lessons) <= self.preview_lessons:
+            return preview, None
+        return preview, lessons_after_url(obj.pk, lessons[self.preview_lessons - 1], self.context.get('request'))
+    
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['lessons'], data['lessons_next'] = self.lesson_preview(instance)
+        return data
+
+class CourseSummarySerializer(serializers.ModelSerializer):
+    """A course without its lessons or counts, for lists that embed many courses"""
+    instructor = UserSerializer(read_only=True)
+    thumbnail_renditions = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Course
+        fields = [
+            'id', 'title', 'description', 'category', 'difficulty',
+            'instructor', 'thumbnail', 'thumbnail_renditions', 'created_at'
+        ]
+        read_only_fields = fields
+    
+    def get_thumbnail_renditions(self, obj):
+        return rendition_urls(obj.thumbnail_renditions, self.context.get('request'))
+
+class CourseRecommendationSerializer(serializers.Serializer):
+    course = CourseSummarySerializer(read_only=True)
+    score = serializers.FloatField(read_only=True)
+    co_enrollments = serializers.IntegerField(read_only=True)
 
 class CourseCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -59,19 +185,80 @@ class EnrollmentCreateSerializer(serializers.ModelSerializer):
         model = Enrollment
         fields = ['course']
     
-    def validate_course(self, value):
-        user = self.context['request'].user
-        if Enrollment.objects.filter(user=user, course=value).exists():
-            raise serializers.ValidationError("You are already enrolled in this course.")
-        return value
-    
     def create(self, validated_data):
-        validated_data['user'] = self.context['request'].user
-        return super().create(validated_data)
+        # The unique (user, course) constraint is the duplicate check
+        enrollment = Enrollment.objects.enroll(self.context['request'].user, validated_data['course'])
+        if enrollment is None:
+            raise serializers.ValidationError({'course': ["You are already enrolled in this course."]})
+        return enrollment
 
 class ProgressUpdateSerializer(serializers.Serializer):
-    progress = serializers.IntegerField(min_value=0, max_value=100)
+    progress = serializers.IntegerField(min_value=0, max_value=100, required=False)
+    completed_lesson = serializers.IntegerField(
+        required=False, write_only=True,
+        help_text="Id of a lesson just finished; resuming starts after the furthest one"
+    )
+    last_completed_order = serializers.IntegerField(read_only=True)
+    
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError("Send progress, completed_lesson or both.")
+        if 'completed_lesson' in attrs:
+            order = Lesson.objects.filter(
+                pk=attrs['completed_lesson'], course_id=self.instance.course_id,
+            ).values_list('order', flat=True).first()
+            if order is None:
+                raise serializers.ValidationError({'completed_lesson': ["No such lesson in this course."]})
+            attrs['completed_lesson'] = order
+        return attrs
     
     def update(self, instance, validated_data):
-        instance.update_progress(validated_data['progress'])
+        if 'completed_lesson' in validated_data:
+            instance.last_completed_order = max(instance.last_completed_order, validated_data['completed_lesson'])
+        instance.update_progress(validated_data.get('progress', instance.progress))
         return instance
+
+class ResumeSerializer(serializers.ModelSerializer):
+    """Where to continue an enrollment, from the annotations of Enrollment.objects.resume_points()"""
+    enrollment = serializers.IntegerField(source='id', read_only=True)
+    course_title = serializers.CharField(source='course.title', read_only=True)
+    lesson = serializers.SerializerMethodField()
+    previous_lesson = serializers.IntegerField(source='previous_lesson_id', read_only=True)
+    next_lesson = serializers.IntegerField(source='next_lesson_id', read_only=True)
+    
+    class Meta:
+        model = Enrollment
+        fields = [
+            'enrollment', 'course', 'course_title', 'progress', 'last_completed_order',
+            'lesson', 'previous_lesson', 'next_lesson'
+        ]
+        read_only_fields = fields
+    
+    def get_lesson(self, obj):
+        if obj.resume_lesson_id is None:
+            return None
+        return {'id': obj.resume_lesson_id, 'title': obj.resume_lesson_title, 'order': obj.resume_lesson_order}
+
+class MaterialUploadSerializer(serializers.ModelSerializer):
+    offset = serializers.IntegerField(source='received', read_only=True)
+    
+    class Meta:
+        model = MaterialUpload
+        fields = ['id', 'lesson', 'filename', 'size', 'sha256', 'offset', 'status', 'created_at', 'expires_at']
+        read_only_fields = ['id', 'lesson', 'status', 'created_at', 'expires_at']
+    
+    def validate_size(self, value):
+        if value <= 0 or value > settings.CHUNKED_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f"Size must be between 1 and {settings.CHUNKED_UPLOAD_MAX_SIZE} bytes.")
+        return value
+    
+    def validate_sha256(self, value):
+        if not re.fullmatch(r'[0-9a-fA-F]{64}', value):
+            raise serializers.ValidationError("Expected a hex encoded SHA-256 digest.")
+        return value.lower()
+    
+    def validate_filename(self, value):
+        name = os.path.basename(value.replace('\\', '/'))
+        if not name or name in ('.', '..'):
+            raise serializers.ValidationError("Invalid file name.")
+        return name
@@ -0,0 +1,13 @@
+from core.jobs import task
+
+from .recommendations import build_neighbors, refresh_neighbors
+
+
+@task(name='courses.refresh_course_neighbors')
+def refresh_course_neighbors(course_id):
+    refresh_neighbors(course_id)
+
+
+@task(name='courses.build_course_neighbors', queue='maintenance')
+def build_course_neighbors():
+    build_neighbors()
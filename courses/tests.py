@@ -1,10 +1,33 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.urls import reverse
 from django.contrib.auth.models import User
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .models import Course, Lesson, Enrollment
+from . import autocomplete
+from .cache import bump_catalog_version
+from .models import Course, CourseNeighbor, Lesson, Enrollment, MaterialUpload
+from .recommendations import refresh_neighbors
 from accounts.models import UserProfile
+from core.deletion import schedule_deletion
+from core.idempotency import purge_expired_keys
+from core.jobs import run_pending
+from core.models import IdempotencyKey, Job
+from core.testing import QueryPlanAssertionsMixin, WriteCountAssertionsMixin
 
 class CourseModelTest(TestCase):
     def setUp(self):
@@ -211,6 +234,150 @@ class CoursesAPITest(APITestCase):
         self.client.force_authenticate(user=self.student)
         response = self.client.post(self.course_enroll_url)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_course_enroll_is_a_single_insert(self):
+        """Test enrolling skips the exists() pre-check and still schedules neighbours"""
+        self.client.force_authenticate(user=self.student)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(self.course_enroll_url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        enrollment_queries = [query['sql'] for query in context.captured_queries if 'courses_enrollment' in query['sql']]
+        self.assertTrue(enrollment_queries[0].startswith('INSERT'))
+        self.assertIn('ON CONFLICT', enrollment_queries[0])
+        self.assertEqual(response.data['progress'], 0)
+        self.assertTrue(Job.objects.filter(dedup_key=f'neighbors:{self.course.id}').exists())
+        
+        response = self.client.post(reverse('enrollment-create'), {'course': self.course.id})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('course', response.data)
+    
+    def test_course_list_enrollment_state(self):
+        """Test the catalog shows the user's enrollment state from one query per page"""
+        for i in range(4):
+            Course.objects.create(
+                title=f'Other Course {i}', description='Test Description', category='design',
+                difficulty='beginner', instructor=self.instructor,
+            )
+        Enrollment.objects.create(user=self.student, course=self.course, progress=45)
+        anonymous = self.client.get(self.course_list_url)
+        self.assertNotIn('is_enrolled', anonymous.data['results'][0])
+        self.assertIn('Authorization', anonymous['Vary'])
+        self.assertNotIn('private', anonymous.get('Cache-Control', ''))
+        
+        self.client.force_authenticate(user=self.student)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.course_list_url)
+        enrollment_queries = [
+            query['sql'] for query in context.captured_queries
+            if 'FROM "courses_enrollment"' in query['sql'] and 'COUNT(' not in query['sql']
+        ]
+        self.assertEqual(len(enrollment_queries), 1)
+        self.assertIn(' IN (', enrollment_queries[0])
+        states = {course['id']: (course['is_enrolled'], course['progress'], course['completed']) for course in response.data['results']}
+        self.assertEqual(len(states), 5)
+        self.assertEqual(states.pop(self.course.id), (True, 45, False))
+        self.assertEqual(set(states.values()), {(False, None, False)})
+        
+        self.assertIn('private', response['Cache-Control'])
+        
+        response = self.client.get(self.course_detail_url)
+        self.assertTrue(response.data['is_enrolled'])
+        self.assertEqual(response.data['progress'], 45)
+        self.assertIn('Authorization', response['Vary'])
+        self.assertIn('private', response['Cache-Control'])
+    
+    def test_course_delete_runs_in_background(self):
+        """Test deleting a course hides it at once and removes its rows in a job"""
+        Lesson.objects.bulk_create([Lesson(course=self.course, title=f'Lesson {i}', order=i) for i in range(1, 6)])
+        Enrollment.objects.create(user=self.student, course=self.course)
+        self.client.force_authenticate(user=self.instructor)
+        
+        response = self.client.delete(self.course_detail_url)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'queued')
+        self.assertEqual(self.client.get(self.course_detail_url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(self.course_list_url).data['results'], [])
+        self.client.force_authenticate(user=self.student)
+        self.assertEqual(self.client.get(reverse('enrollment-list')).data['results'], [])
+        self.assertEqual(Lesson.objects.count(), 5)
+        
+        with override_settings(DELETION_CHUNK_SIZE=2):
+            run_pending()
+        self.assertFalse(Course.all_objects.exists())
+        self.assertFalse(Lesson.objects.exists())
+        self.assertFalse(Enrollment.objects.exists())
+        deletion_url = reverse('deletion-detail', args=[response.data['id']])
+        self.assertEqual(self.client.get(deletion_url).status_code, status.HTTP_404_NOT_FOUND)
+        self.client.force_authenticate(user=self.instructor)
+        deletion = self.client.get(deletion_url).data
+        self.assertEqual(deletion['status'], 'done')
+        self.assertEqual(deletion['deleted'], {'courses.Course': 1, 'courses.Lesson': 5, 'courses.Enrollment': 1})
+
+class IdempotencyAPITest(APITestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            username='instructor',
+            password='testpass123'
+        )
+        self.instructor.profile.user_type = 'instructor'
+        self.instructor.profile.save()
+        self.client.force_authenticate(user=self.instructor)
+        self.course_list_url = reverse('course-list-create')
+        self.course_data = {
+            'title': 'Retried Course',
+            'description': 'Sent twice',
+            'category': 'design',
+            'difficulty': 'beginner'
+        }
+    
+    def test_retry_replays_the_stored_response(self):
+        """Test a retried POST with the same key creates one course and gets the same response"""
+        first = self.client.post(self.course_list_url, self.course_data, HTTP_IDEMPOTENCY_KEY='create-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        second = self.client.post(self.course_list_url, self.course_data, HTTP_IDEMPOTENCY_KEY='create-1')
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(Course.objects.filter(title='Retried Course').count(), 1)
+        
+        third = self.client.post(self.course_list_url, self.course_data, HTTP_IDEMPOTENCY_KEY='create-2')
+        self.assertEqual(third.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Course.objects.filter(title='Retried Course').count(), 2)
+    
+    def test_key_reuse_and_in_progress(self):
+        """Test a key reused for another request is rejected, and a pending one conflicts"""
+        self.client.post(self.course_list_url, self.course_data, HTTP_IDEMPOTENCY_KEY='create-1')
+        response = self.client.post(self.course_list_url, {**self.course_data, 'title': 'Other'}, HTTP_IDEMPOTENCY_KEY='create-1')
+        self.assertEqual(response.status_code, 422)
+        
+        IdempotencyKey.objects.filter(key='create-1').update(response_status=None)
+        response = self.client.post(self.course_list_url, self.course_data, HTTP_IDEMPOTENCY_KEY='create-1')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        
+        # Abandoned by a request that died, then expired: both can be claimed again
+        IdempotencyKey.objects.filter(key='create-1').update(created_at=timezone.now() - timedelta(minutes=5))
+        response = self.client.post(self.course_list_url, self.course_data, HTTP_IDEMPOTENCY_KEY='create-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        IdempotencyKey.objects.filter(key='create-1').update(expires_at=timezone.now())
+        self.assertEqual(purge_expired_keys(), 1)
+    
+    def test_errors_are_replayed_but_keys_are_per_user(self):
+        """Test validation errors are stored too and other users' keys don't collide"""
+        first = self.client.post(self.course_list_url, {'title': 'Incomplete'}, HTTP_IDEMPOTENCY_KEY='shared')
+        second = self.client.post(self.course_list_url, {'title': 'Incomplete'}, HTTP_IDEMPOTENCY_KEY='shared')
+        self.assertEqual(second.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(second.content, first.content)
+        
+        student = User.objects.create_user(username='student', password='testpass123')
+        course = Course.objects.create(instructor=self.instructor, **self.course_data)
+        enrollment = Enrollment.objects.create(user=student, course=course)
+        self.client.force_authenticate(user=student)
+        url = reverse('progress-update', args=[enrollment.id])
+        response = self.client.patch(url, {'progress': 40}, HTTP_IDEMPOTENCY_KEY='shared')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Idempotent-Replayed', response)
+        replayed = self.client.patch(url, {'progress': 40}, HTTP_IDEMPOTENCY_KEY='shared')
+        self.assertEqual(replayed['Idempotent-Replayed'], 'true')
 
 class LessonAPITest(APITestCase):
     def setUp(self):
@@ -264,8 +431,41 @@ class LessonAPITest(APITestCase):
         response = self.client.get(self.lesson_detail_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['title'], 'Test Lesson')
+    
+    def test_course_detail_embeds_a_lesson_preview(self):
+        """Test course detail embeds the first lessons in brief and links to the rest"""
+        Lesson.objects.bulk_create([
+            Lesson(course=self.course, title=f'Lesson {order}', order=order) for order in range(2, 46)
+        ])
+        url = reverse('course-detail', args=[self.course.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lessons = response.data['lessons']
+        self.assertEqual([lesson['order'] for lesson in lessons], list(range(1, 21)))
+        self.assertEqual(set(lessons[0]), {'id', 'title', 'order'})
+        self.assertEqual(response.data['total_lessons'], 45)
+        
+        # Following the cursors walks the remaining lessons in order
+        orders = []
+        next_url = response.data['lessons_next'] + '&page_size=10'
+        while next_url:
+            page = self.client.get(next_url)
+            orders += [lesson['order'] for lesson in page.data['results']]
+            next_url = page.data['next']
+        self.assertEqual(orders, list(range(21, 46)))
+        
+        response = self.client.get(url, {'expand': 'lessons'})
+        self.assertEqual(len(response.data['lessons']), 45)
+        self.assertIn('video_url', response.data['lessons'][0])
+        self.assertIsNone(response.data['lessons_next'])
+    
+    def test_short_course_has_no_lesson_cursor(self):
+        """Test a course whose lessons fit in the preview has no next link"""
+        response = self.client.get(reverse('course-detail', args=[self.course.id]))
+        self.assertEqual(len(response.data['lessons']), 1)
+        self.assertIsNone(response.data['lessons_next'])
 
-class EnrollmentAPITest(APITestCase):
+class EnrollmentAPITest(WriteCountAssertionsMixin, APITestCase):
     def setUp(self):
         self.instructor = User.objects.create_user(
             username='instructor',
@@ -341,3 +541,643 @@ class EnrollmentAPITest(APITestCase):
         self.enrollment.refresh_from_db()
         self.assertEqual(self.enrollment.progress, 100)
         self.assertTrue(self.enrollment.completed)
+    
+    def test_progress_update_writes(self):
+        """Test a progress update writes only progress, and repeating it writes nothing"""
+        self.client.force_authenticate(user=self.student)
+        with self.assertNumWrites(1) as context:
+            self.client.patch(self.progress_update_url, {'progress': 60})
+        update = [query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE')][0]
+        self.assertNotIn('"enrollment_date"', update)
+        self.assertNotIn('"completed"', update)
+        
+        with self.assertNumWrites(0):
+            response = self.client.patch(self.progress_update_url, {'progress': 60})
+        self.assertEqual(response.data['progress'], 60)
+    
+    def test_resume_next_lesson(self):
+        """Test resuming continues after the furthest completed lesson"""
+        Lesson.objects.bulk_create([Lesson(course=self.course, title=f'Lesson {i}', order=i) for i in range(1, 6)])
+        lessons = list(Lesson.objects.filter(course=self.course).order_by('order'))
+        self.client.force_authenticate(user=self.student)
+        resume_url = reverse('course-resume', args=[self.course.id])
+        self.assertEqual(self.client.get(resume_url).data['lesson']['id'], lessons[0].id)
+        
+        self.client.patch(self.progress_update_url, {'completed_lesson': lessons[2].id}, format='json')
+        response = self.client.patch(self.progress_update_url, {'completed_lesson': lessons[1].id}, format='json')
+        self.assertEqual(response.data['last_completed_order'], 3)
+        response = self.client.get(resume_url)
+        self.assertEqual(response.data['lesson'], {'id': lessons[3].id, 'title': 'Lesson 4', 'order': 4})
+        self.assertEqual(response.data['previous_lesson'], lessons[2].id)
+        self.assertEqual(response.data['next_lesson'], lessons[4].id)
+        
+        self.client.patch(self.progress_update_url, {'completed_lesson': lessons[4].id}, format='json')
+        response = self.client.get(resume_url)
+        self.assertIsNone(response.data['lesson'])
+        self.assertEqual(response.data['previous_lesson'], lessons[4].id)
+        
+        other_lesson = Lesson.objects.create(course=Course.objects.create(
+            title='Other', description='Other', category='design', difficulty='beginner', instructor=self.instructor,
+        ), title='Other lesson', order=1)
+        response = self.client.patch(self.progress_update_url, {'completed_lesson': other_lesson.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse('course-resume', args=[other_lesson.course_id])).status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_resume_query_count_is_constant(self):
+        """Test the resume list costs the same queries for one course or many"""
+        self.client.force_authenticate(user=self.student)
+        Lesson.objects.create(course=self.course, title='Lesson 1', order=1)
+        with CaptureQueriesContext(connection) as one:
+            response = self.client.get(reverse('resume'))
+        self.assertEqual(len(response.data['results']), 1)
+        
+        for i in range(5):
+            course = Course.objects.create(
+                title=f'Course {i}', description='Test Description', category='design',
+                difficulty='beginner', instructor=self.instructor,
+            )
+            Lesson.objects.bulk_create([Lesson(course=course, title=f'Lesson {order}', order=order) for order in range(1, 4)])
+            Enrollment.objects.create(user=self.student, course=course)
+        Enrollment.objects.filter(course=course).update(completed=True)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(reverse('resume'))
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(len(many.captured_queries), len(one.captured_queries))
+
+class ListViewQueryPlanTest(QueryPlanAssertionsMixin, APITestCase):
+    """Every list view must be served from indexes, without table scans or temp sorts"""
+    
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            username='instructor',
+            password='testpass123'
+        )
+        self.instructor.profile.user_type = 'instructor'
+        self.instructor.profile.save()
+        
+        self.student = User.objects.create_user(
+            username='student',
+            password='testpass123'
+        )
+        
+        for number, (category, difficulty) in enumerate([('programming', 'beginner'), ('design', 'advanced')]):
+            course = Course.objects.create(
+                title=f'Course {number}',
+                description='Test Description',
+                category=category,
+                difficulty=difficulty,
+                instructor=self.instructor
+            )
+            Lesson.objects.create(course=course, title='Lesson', order=1)
+            Enrollment.objects.create(user=self.student, course=course)
+        self.course = course
+    
+    def get(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+    
+    def test_course_list(self):
+        """Test catalog listings for every filter combination"""
+        url = reverse('course-list-create')
+        for params in [
+            {},
+            {'category': 'programming'},
+            {'difficulty': 'beginner'},
+            {'category': 'programming', 'difficulty': 'beginner'},
+            {'instructor': self.instructor.id},
+        ]:
+            with self.subTest(params=params):
+                self.assertQueriesUseIndexes(self.get, url, params)
+    
+    def test_instructor_courses(self):
+        """Test instructor course listing"""
+        self.client.force_authenticate(user=self.instructor)
+        self.assertQueriesUseIndexes(self.get, reverse('instructor-courses'))
+    
+    def test_lesson_list(self):
+        """Test lesson listing for a course"""
+        self.assertQueriesUseIndexes(self.get, reverse('lesson-list-create', args=[self.course.id]))
+    
+    def test_enrollment_list(self):
+        """Test a student's enrollment listing"""
+        self.client.force_authenticate(user=self.student)
+        self.assertQueriesUseIndexes(self.get, reverse('enrollment-list'))
+    
+    def test_resume(self):
+        """Test the resume list seeks the lesson index per enrollment"""
+        self.client.force_authenticate(user=self.student)
+        self.assertQueriesUseIndexes(self.get, reverse('resume'))
+
+class MaterialUploadAPITest(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(
+            MEDIA_ROOT=media_root,
+            CHUNKED_UPLOAD_DIR=os.path.join(media_root, 'chunked_uploads'),
+        ))
+        
+        self.instructor = User.objects.create_user(
+            username='instructor',
+            password='testpass123'
+        )
+        self.instructor.profile.user_type = 'instructor'
+        self.instructor.profile.save()
+        
+        self.course = Course.objects.create(
+            title='Test Course',
+            description='Test Description',
+            category='programming',
+            difficulty='beginner',
+            instructor=self.instructor
+        )
+        self.lesson = Lesson.objects.create(course=self.course, title='Test Lesson', order=1)
+        
+        self.content = b'0123456789' * 100
+        self.client.force_authenticate(user=self.instructor)
+    
+    def start_upload(self, content=None):
+        content = content or self.content
+        response = self.client.post(reverse('material-upload-create', args=[self.lesson.id]), {
+            'filename': 'slides.pdf',
+            'size': len(content),
+            'sha256': hashlib.sha256(content).hexdigest()
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return reverse('material-upload-detail', args=[response.data['id']])
+    
+    def put_chunk(self, url, start, chunk, **extra):
+        return self.client.put(
+            url, chunk, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{start + len(chunk) - 1}/{len(self.content)}', **extra
+        )
+    
+    def test_chunked_upload_and_finalize(self):
+        """Test uploading in chunks, resuming from the reported offset and finalizing"""
+        url = self.start_upload()
+        response = self.put_chunk(url, 0, self.content[:400])
+        self.assertEqual(response.data['offset'], 400)
+        
+        # A client that lost track asks where to resume
+        offset = self.client.get(url).data['offset']
+        self.assertEqual(offset, 400)
+        self.put_chunk(url, offset, self.content[offset:])
+        
+        response = self.client.post(url + 'finalize/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.lesson.refresh_from_db()
+        with self.lesson.materials.open('rb') as materials:
+            self.assertEqual(materials.read(), self.content)
+        self.assertEqual(os.listdir(settings.CHUNKED_UPLOAD_DIR), [])
+    
+    def test_chunk_at_wrong_offset(self):
+        """Test chunks must start at the current offset"""
+        url = self.start_upload()
+        response = self.put_chunk(url, 100, self.content[100:200])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+    
+    def test_malformed_content_length(self):
+        """Test a chunk with a non-numeric Content-Length is rejected"""
+        url = self.start_upload()
+        response = self.put_chunk(url, 0, self.content[:100], CONTENT_LENGTH='100 bytes')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Content-Length', response.data)
+        self.assertEqual(self.client.get(url).data['offset'], 0)
+    
+    def test_chunk_checksum_mismatch(self):
+        """Test a corrupted chunk is rejected and the offset does not move"""
+        url = self.start_upload()
+        response = self.put_chunk(url, 0, self.content[:100], HTTP_X_CHUNK_SHA256='0' * 64)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url).data['offset'], 0)
+    
+    def test_finalize_verifies_checksum(self):
+        """Test finalizing a file that doesn't match the declared digest fails"""
+        url = self.start_upload()
+        self.put_chunk(url, 0, b'x' * len(self.content))
+        response = self.client.post(url + 'finalize/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.lesson.refresh_from_db()
+        self.assertFalse(self.lesson.materials)
+    
+    def test_finalize_incomplete_upload(self):
+        """Test finalizing before every byte arrived fails"""
+        url = self.start_upload()
+        self.put_chunk(url, 0, self.content[:10])
+        response = self.client.post(url + 'finalize/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_only_course_instructor_can_upload(self):
+        """Test students cannot start uploads"""
+        student = User.objects.create_user(username='student', password='testpass123')
+        self.client.force_authenticate(user=student)
+        response = self.client.post(reverse('material-upload-create', args=[self.lesson.id]), {
+            'filename': 'slides.pdf', 'size': 10, 'sha256': '0' * 64
+        })
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+    
+    def test_cleanup_removes_expired_uploads(self):
+        """Test the cleanup command removes abandoned uploads and partial files"""
+        self.start_upload()
+        MaterialUpload.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        call_command('cleanup_uploads', stdout=io.StringIO())
+        self.assertFalse(MaterialUpload.objects.exists())
+        self.assertEqual(os.listdir(settings.CHUNKED_UPLOAD_DIR), [])
+
+class LessonMaterialsAPITest(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        
+        self.instructor = User.objects.create_user(
+            username='instructor',
+            password='testpass123'
+        )
+        self.student = User.objects.create_user(
+            username='student',
+            password='testpass123'
+        )
+        self.course = Course.objects.create(
+            title='Test Course',
+            description='Test Description',
+            category='programming',
+            difficulty='beginner',
+            instructor=self.instructor
+        )
+        self.content = bytes(range(256)) * 40
+        self.lesson = Lesson.objects.create(
+            course=self.course,
+            title='Test Lesson',
+            order=1,
+            materials=SimpleUploadedFile('lecture.mp4', self.content)
+        )
+        Enrollment.objects.create(user=self.student, course=self.course)
+        self.url = reverse('lesson-materials', args=[self.lesson.id])
+    
+    def get(self, user=None, **headers):
+        if user:
+            self.client.force_authenticate(user=user)
+        response = self.client.get(self.url, **headers)
+        if response.streaming:
+            response.content_bytes = b''.join(response.streaming_content)
+        return response
+    
+    def test_enrolled_student_downloads(self):
+        """Test an enrolled student receives the whole file"""
+        response = self.get(self.student)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content_bytes, self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+    
+    def test_instructor_downloads(self):
+        """Test the course instructor can access materials"""
+        self.assertEqual(self.get(self.instructor).status_code, status.HTTP_200_OK)
+    
+    def test_lesson_payloads_link_to_the_checked_endpoint(self):
+        """Test lesson list and detail point at the materials endpoint, never the stored file"""
+        list_response = self.client.get(reverse('lesson-list-create', kwargs={'course_id': self.course.id}))
+        detail_response = self.client.get(reverse('lesson-detail', args=[self.lesson.id]))
+        for response in (list_response, detail_response):
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn(b'/media/', response.content)
+            self.assertNotIn(self.lesson.materials.name.encode(), response.content)
+        self.assertTrue(detail_response.data['materials'].endswith(self.url))
+        self.assertTrue(list_response.data['results'][0]['materials'].endswith(self.url))
+    
+    def test_access_requires_enrollment(self):
+        """Test other users and anonymous requests are refused"""
+        outsider = User.objects.create_user(username='outsider', password='testpass123')
+        self.assertEqual(self.get(outsider).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.get().status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_single_range(self):
+        """Test a single range returns only the requested bytes"""
+        response = self.get(self.student, HTTP_RANGE='bytes=9000-')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response.content_bytes, self.content[9000:])
+        self.assertEqual(response['Content-Range'], f'bytes 9000-{len(self.content) - 1}/{len(self.content)}')
+        self.assertEqual(int(response['Content-Length']), len(self.content) - 9000)
+    
+    def test_multiple_ranges(self):
+        """Test several ranges come back as multipart/byteranges"""
+        response = self.get(self.student, HTTP_RANGE='bytes=0-9,-5')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges; boundary='))
+        self.assertIn(self.content[:10], response.content_bytes)
+        self.assertIn(self.content[-5:], response.content_bytes)
+        self.assertEqual(int(response['Content-Length']), len(response.content_bytes))
+    
+    def test_unsatisfiable_range(self):
+        """Test a range past the end of the file is rejected"""
+        response = self.get(self.student, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+    
+    def test_if_none_match(self):
+        """Test a matching ETag returns 304 Not Modified"""
+        etag = self.get(self.student)['ETag']
+        response = self.get(self.student, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_accel_redirect(self):
+        """Test the transfer is handed to nginx when configured"""
+        response = self.get(self.student)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.lesson.materials.name)
+        self.assertEqual(response.content, b'')
+
+class AdminQueryCountTest(TestCase):
+    """Admin pages must issue a constant number of queries however many rows exist"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            password='testpass123'
+        )
+        self.client.force_login(self.admin)
+        self.instructor = User.objects.create_user(
+            username='instructor',
+            password='testpass123'
+        )
+        self.rows = 0
+        self.add_rows(2)
+    
+    def add_rows(self, count):
+        for _ in range(count):
+            self.rows += 1
+            course = Course.objects.create(
+                title=f'Course {self.rows}',
+                description='Test Description',
+                category='programming',
+                difficulty='beginner',
+                instructor=self.instructor
+            )
+            Lesson.objects.create(course=course, title='Lesson', order=1)
+            Lesson.objects.create(course=course, title='Lesson', order=2)
+            student = User.objects.create(username=f'student{self.rows}')
+            Enrollment.objects.create(user=student, course=course)
+    
+    def count_queries(self, url):
+        # Warm per-process caches (content types, session) first
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+    
+    def test_changelists(self):
+        """Test course, lesson, enrollment and user changelists don't grow with rows"""
+        for name in ['courses_course', 'courses_lesson', 'courses_enrollment', 'auth_user']:
+            with self.subTest(changelist=name):
+                url = reverse(f'admin:{name}_changelist')
+                before = self.count_queries(url)
+                self.add_rows(5)
+                self.assertEqual(self.count_queries(url), before)
+    
+    def test_course_changelist_counts(self):
+        """Test lesson and enrollment totals come from the annotated queryset"""
+        response = self.client.get(reverse('admin:courses_course_changelist'))
+        course = response.context['cl'].result_list[0]
+        self.assertEqual((course.lesson_count, course.enrollment_count), (2, 1))
+    
+    def test_enrollment_change_form(self):
+        """Test the change form doesn't render every user and course as options"""
+        enrollment = Enrollment.objects.first()
+        url = reverse('admin:courses_enrollment_change', args=[enrollment.id])
+        before = self.count_queries(url)
+        self.add_rows(5)
+        self.assertEqual(self.count_queries(url), before)
+        self.assertNotContains(self.client.get(url), 'student5</option>')
+
+class RecommendationsAPITest(APITestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            username='instructor',
+            password='testpass123'
+        )
+        self.instructor.profile.user_type = 'instructor'
+        self.instructor.profile.save()
+        
+        self.python, self.django, self.sql, self.guitar = [
+            Course.objects.create(
+                title=title,
+                description='Test Description',
+                category='programming',
+                difficulty='beginner',
+                instructor=self.instructor
+            )
+            for title in ['Python', 'Django', 'SQL', 'Guitar']
+        ]
+        baskets = [
+            [self.python, self.django, self.sql],
+            [self.python, self.django],
+            [self.python, self.django],
+            [self.python, self.sql],
+            [self.guitar],
+        ]
+        for number, basket in enumerate(baskets):
+            learner = User.objects.create_user(username=f'learner{number}', password='testpass123')
+            for course in basket:
+                Enrollment.objects.create(user=learner, course=course)
+        self.learner = User.objects.get(username='learner4')
+        call_command('build_recommendations', stdout=io.StringIO())
+    
+    def test_similar_courses_ranked_by_co_enrollment(self):
+        """Test a course's recommendations come from the precomputed index"""
+        url = reverse('course-recommendations', kwargs={'pk': self.python.pk})
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['course']['id'] for row in response.data], [self.django.pk, self.sql.pk])
+        self.assertEqual(response.data[0]['co_enrollments'], 3)
+        self.assertNotIn('lessons', response.data[0]['course'])
+    
+    def test_unknown_course_returns_404(self):
+        """Test recommendations for a missing course"""
+        response = self.client.get(reverse('course-recommendations', kwargs={'pk': 999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_personal_recommendations_exclude_enrolled_courses(self):
+        """Test personalized recommendations for an authenticated user"""
+        learner = User.objects.get(username='learner3')
+        self.client.force_authenticate(user=learner)
+        response = self.client.get(reverse('recommendations'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['course']['id'] for row in response.data], [self.django.pk])
+    
+    def test_personal_recommendations_skip_deleted_courses(self):
+        """Test courses pending deletion drop out of personalized recommendations"""
+        Course.objects.filter(pk=self.django.pk).update(deleted_at=timezone.now())
+        self.client.force_authenticate(user=User.objects.get(username='learner3'))
+        response = self.client.get(reverse('recommendations'))
+        self.assertEqual(response.data, [])
+    
+    def test_personal_recommendations_require_authentication(self):
+        """Test anonymous users can't get personalized recommendations"""
+        response = self.client.get(reverse('recommendations'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_new_enrollment_refreshes_neighbors_incrementally(self):
+        """Test an enrollment queues a refresh that updates both courses' lists"""
+        Enrollment.objects.create(user=self.learner, course=self.python)
+        run_pending()
+        url = reverse('course-recommendations', kwargs={'pk': self.guitar.pk})
+        response = self.client.get(url)
+        self.assertEqual([row['course']['id'] for row in response.data], [self.python.pk])
+        response = self.client.get(reverse('course-recommendations', kwargs={'pk': self.python.pk}))
+        self.assertIn(self.guitar.pk, [row['course']['id'] for row in response.data])
+    
+    def test_incremental_refresh_matches_full_build(self):
+        """Test refreshing every course gives the same index as a rebuild"""
+        rebuilt = set(CourseNeighbor.objects.values_list('course_id', 'neighbor_id', 'co_enrollments'))
+        CourseNeighbor.objects.all().delete()
+        for course in Course.objects.all():
+            refresh_neighbors(course.pk)
+        refreshed = set(CourseNeighbor.objects.values_list('course_id', 'neighbor_id', 'co_enrollments'))
+        self.assertEqual(refreshed, rebuilt)
+
+class CourseFacetsAPITest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.instructor = User.objects.create_user(
+            username='instructor',
+            password='testpass123'
+        )
+        self.instructor.profile.user_type = 'instructor'
+        self.instructor.profile.save()
+        self.other_instructor = User.objects.create_user(
+            username='other',
+            password='testpass123'
+        )
+        
+        for title, category, difficulty, instructor in [
+            ('Python Basics', 'programming', 'beginner', self.instructor),
+            ('Advanced Python', 'programming', 'advanced', self.instructor),
+            ('Logo Design', 'design', 'beginner', self.other_instructor),
+        ]:
+            Course.objects.create(
+                title=title,
+                description='Test Description',
+                category=category,
+                difficulty=difficulty,
+                instructor=instructor
+            )
+        self.url = reverse('course-facets')
+    
+    def counts(self, facet):
+        return {bucket['value']: bucket['count'] for bucket in facet}
+    
+    def test_facet_counts_in_one_query(self):
+        """Test every facet is counted from a single GROUP BY"""
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], 3)
+        self.assertEqual(self.counts(response.data['category'])['programming'], 2)
+        self.assertEqual(self.counts(response.data['category'])['music'], 0)
+        self.assertEqual(self.counts(response.data['difficulty']), {'beginner': 2, 'intermediate': 0, 'advanced': 1})
+        self.assertEqual(response.data['instructor'][0], {'value': self.instructor.pk, 'label': 'instructor', 'count': 2})
+    
+    def test_facets_respect_search_and_filters(self):
+        """Test facets count only the courses the list view would return"""
+        response = self.client.get(self.url, {'search': 'python', 'difficulty': 'beginner'})
+        self.assertEqual(response.data['total'], 1)
+        self.assertEqual(self.counts(response.data['category'])['programming'], 1)
+        self.assertEqual(self.counts(response.data['category'])['design'], 0)
+    
+    def test_unfiltered_facets_cached_until_catalog_changes(self):
+        """Test unfiltered counts are cached and invalidated by course writes"""
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['total'], 3)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.create(
+                title='Guitar',
+                description='Test Description',
+                category='music',
+                difficulty='beginner',
+                instructor=self.instructor
+            )
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['total'], 4)
+        self.assertEqual(self.counts(response.data['category'])['music'], 1)
+
+class CourseAutocompleteTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.enterContext(mock.patch.object(autocomplete, '_index', autocomplete.TitleIndex()))
+        self.instructor = User.objects.create_user(
+            username='instructor',
+            password='testpass123'
+        )
+        students = [User.objects.create_user(username=f'student{i}', password='testpass123') for i in range(3)]
+        self.courses = {}
+        for title, learners in [('Python Basics', 1), ('Advanced Python', 3), ('Logo Design', 0), ('Café Crème Basics', 2)]:
+            course = Course.objects.create(
+                title=title,
+                description='Test Description',
+                category='programming',
+                difficulty='beginner',
+                instructor=self.instructor
+            )
+            for student in students[:learners]:
+                Enrollment.objects.create(user=student, course=course)
+            self.courses[title] = course
+        self.url = reverse('course-autocomplete')
+    
+    def titles(self, query, **params):
+        response = self.client.get(self.url, {'q': query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [course['title'] for course in response.data]
+    
+    def test_word_prefixes_ranked_by_popularity(self):
+        """Test any word of a title matches, most enrolled course first"""
+        self.assertEqual(self.titles('pyth'), ['Advanced Python', 'Python Basics'])
+        self.assertEqual(self.titles('BAS'), ['Café Crème Basics', 'Python Basics'])
+        self.assertEqual(self.titles('cafe cr'), ['Café Crème Basics'])
+        self.assertEqual(self.titles('python b'), ['Python Basics'])
+        self.assertEqual(self.titles('pyth', limit=1), ['Advanced Python'])
+        self.assertEqual(self.titles('  '), [])
+        self.assertEqual(self.titles('rust'), [])
+    
+    def test_served_from_memory(self):
+        """Test a built index answers without SQL"""
+        self.titles('pyth')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles('logo'), ['Logo Design'])
+    
+    def test_incremental_updates(self):
+        """Test saved and deleted courses show up after re-reading only the changed rows"""
+        self.titles('pyth')
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.create(
+                title='Pythonic Patterns', description='Test Description', category='programming',
+                difficulty='advanced', instructor=self.instructor,
+            )
+            logo = self.courses['Logo Design']
+            logo.title = 'Python Logos'
+            logo.save()
+            schedule_deletion(self.courses['Python Basics'])
+        with self.assertNumQueries(2):
+            titles = self.titles('pyth')
+        self.assertEqual(titles[0], 'Advanced Python')
+        self.assertEqual(sorted(titles[1:]), ['Python Logos', 'Pythonic Patterns'])
+        self.assertEqual(self.titles('logo d'), [])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.all_objects.filter(pk=self.courses['Advanced Python'].pk).delete()
+        self.assertEqual(sorted(self.titles('pyth')), ['Python Logos', 'Pythonic Patterns'])
+    
+    def test_late_commit_is_not_missed(self):
+        """Test a change stamped before the last one seen, but committed after it, is picked up"""
+        self.titles('logo')
+        stamped = autocomplete._index.watermark - timedelta(seconds=30)
+        Course.objects.filter(pk=self.courses['Logo Design'].pk).update(title='Logo Python', updated_at=stamped)
+        bump_catalog_version()
+        self.assertEqual(self.titles('logo'), ['Logo Python'])
@@ -0,0 +1,190 @@
+"""
+Resumable chunked uploads for Lesson.materials.
+
+    POST /api/lessons/<id>/uploads/            {filename, size, sha256} -> upload
+    PUT  /api/uploads/<uuid>/                   raw bytes + Content-Range: bytes <start>-<end>/<size>
+    GET  /api/uploads/<uuid>/                   current offset, to resume after a failure
+    POST /api/uploads/<uuid>/finalize/          verify checksum and attach to the lesson
+
+Chunks are streamed from the request straight into a partial file and must
+arrive in order: a chunk has to start at the current offset.
+"""
+import fcntl
+import hashlib
+import os
+import re
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from core.storage import file_sha256
+
+from .models import Lesson, MaterialUpload
+
+COPY_BUFFER_SIZE = 1024 * 1024
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class OffsetMismatch(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Chunk does not start at the current upload offset.'
+    default_code = 'offset_mismatch'
+
+
+class UploadBusy(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Another chunk for this upload is being written.'
+    default_code = 'upload_busy'
+
+
+class TemporaryUploadFile(File):
+    """A file already on disk: storage moves it instead of copying."""
+
+    def __init__(self, file, sha256=None):
+        super().__init__(file)
+        # Already verified, so content-addressed storage needn't hash again
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def create_upload(lesson, user, filename, size, sha256):
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    upload = MaterialUpload.objects.create(
+        lesson=lesson, user=user, filename=filename, size=size, sha256=sha256.lower(),
+        expires_at=timezone.now() + settings.CHUNKED_UPLOAD_TTL,
+    )
+    # Create the partial file up front so chunk writes can open it r+b
+    open(upload.temp_path, 'xb').close()
+    return upload
+
+
+def parse_content_length(header):
+    """Return a request's Content-Length, 0 when it is missing."""
+    try:
+        return int(header or 0)
+    except ValueError:
+        raise ValidationError({'Content-Length': 'Expected a number of bytes.'})
+
+
+def parse_content_range(header, length):
+    """Return the chunk's start offset from a Content-Range header."""
+    match = CONTENT_RANGE_RE.match(header or '')
+    if not match:
+        raise ValidationError({'Content-Range': 'Expected "bytes <start>-<end>/<size>".'})
+    start, end, total = (int(group) for group in match.groups())
+    if end < start or end - start + 1 != length:
+        raise ValidationError({'Content-Range': 'Range does not match Content-Length.'})
+    return start, total
+
+
+def write_chunk(upload, offset, stream, length, chunk_sha256=None):
+    """
+    Stream `length` bytes from `stream` into the partial file at `offset`.
+    The offset only advances once the whole chunk is on disk (and matches
+    `chunk_sha256`, when given), so a failed chunk can simply be resent.
+    """
+    if upload.status != 'uploading':
+        raise ValidationError('Upload is already finalized.')
+    if length <= 0 or length > settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE:
+        raise ValidationError(f'Chunks must be between 1 and {settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE} bytes.')
+    if offset != upload.received:
+        raise OffsetMismatch()
+    if offset + length > upload.size:
+        raise ValidationError('Chunk extends past the declared upload size.')
+
+    with open(upload.temp_path, 'r+b') as partial:
+        try:
+            fcntl.flock(partial, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadBusy()
+        partial.seek(offset)
+        digest = hashlib.sha256()
+        remaining = length
+        while remaining:
+            data = stream.read(min(COPY_BUFFER_SIZE, remaining))
+            if not data:
+                raise ValidationError('Request body ended before Content-Length bytes.')
+            digest.update(data)
+            partial.write(data)
+            remaining -= len(data)
+        if chunk_sha256 and digest.hexdigest() != chunk_sha256.lower():
+            raise ValidationError('Chunk checksum mismatch.')
+        partial.flush()
+        os.fsync(partial.fileno())
+
+        # Compare-and-set so a concurrent writer can't move the offset twice
+        updated = MaterialUpload.objects.filter(pk=upload.pk, received=offset, status='uploading').update(
+            received=offset + length,
+            expires_at=timezone.now() + settings.CHUNKED_UPLOAD_TTL,
+        )
+    if not updated:
+        raise OffsetMismatch()
+    upload.received = offset + length
+    return upload
+
+
+def finalize_upload(upload):
+    """Verify the complete file and attach it to the lesson's materials."""
+    if upload.status != 'uploading':
+        raise ValidationError('Upload is already finalized.')
+    if upload.received != upload.size:
+        raise ValidationError(f'Upload is incomplete: {upload.received} of {upload.size} bytes received.')
+    if file_sha256(upload.temp_path) != upload.sha256:
+        raise ValidationError('Checksum mismatch: the uploaded file is corrupt, restart the upload.')
+
+    lesson = upload.lesson
+    field = lesson.materials
+    with open(upload.temp_path, 'rb') as partial:
+        stored_name = field.storage.save(
+            field.field.generate_filename(lesson, upload.filename),
+            TemporaryUploadFile(partial, sha256=upload.sha256),
+            max_length=field.field.max_length,
+        )
+    try:
+        with transaction.atomic():
+            lesson = Lesson.objects.select_for_update().get(pk=lesson.pk)
+            if not MaterialUpload.objects.filter(pk=upload.pk, status='uploading').update(status='complete'):
+                raise ValidationError('Upload is already finalized.')
+            lesson.materials.name = stored_name
+            lesson.save(update_fields=['materials', 'updated_at'])
+    except Exception:
+        field.storage.delete(stored_name)
+        raise
+    upload.status = 'complete'
+    upload.lesson = lesson
+    return lesson
+
+
+def discard_upload(upload):
+    try:
+        os.remove(upload.temp_path)
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def cleanup_expired_uploads(now=None):
+    """Remove abandoned uploads and their partial files; returns how many."""
+    now = now or timezone.now()
+    count = 0
+    for upload in MaterialUpload.objects.filter(status='uploading', expires_at__lt=now).iterator():
+        discard_upload(upload)
+        count += 1
+    MaterialUpload.objects.filter(status='complete', expires_at__lt=now).delete()
+
+    # Partial files whose upload row is gone (e.g. the lesson was deleted)
+    if os.path.isdir(settings.CHUNKED_UPLOAD_DIR):
+        cutoff = (now - settings.CHUNKED_UPLOAD_TTL).timestamp()
+        active = {str(pk) for pk in MaterialUpload.objects.filter(status='uploading').values_list('pk', flat=True)}
+        for entry in os.scandir(settings.CHUNKED_UPLOAD_DIR):
+            upload_id = entry.name.removesuffix('.part')
+            if upload_id not in active and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                count += 1
+    return count
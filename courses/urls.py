@@ -2,30 +2,52 @@ from django.urls import path
 from .views import (
     CourseListCreateView,
     CourseDetailView,
+    CourseFacetsView,
+    CourseAutocompleteView,
+    CourseRecommendationsView,
+    RecommendationsView,
     LessonListCreateView,
     LessonDetailView,
+    LessonMaterialsView,
     EnrollmentListView,
     EnrollmentCreateView,
     EnrollmentDetailView,
     ProgressUpdateView,
+    ResumeView,
+    CourseResumeView,
     CourseEnrollView,
-    InstructorCoursesView
+    InstructorCoursesView,
+    MaterialUploadCreateView,
+    MaterialUploadDetailView,
+    MaterialUploadFinalizeView
 )
 
 urlpatterns = [
     # Course endpoints
     path('courses/', CourseListCreateView.as_view(), name='course-list-create'),
+    path('courses/facets/', CourseFacetsView.as_view(), name='course-facets'),
+    path('courses/autocomplete/', CourseAutocompleteView.as_view(), name='course-autocomplete'),
     path('courses/<int:pk>/', CourseDetailView.as_view(), name='course-detail'),
     path('courses/<int:course_id>/enroll/', CourseEnrollView.as_view(), name='course-enroll'),
+    path('courses/<int:pk>/recommendations/', CourseRecommendationsView.as_view(), name='course-recommendations'),
+    path('recommendations/', RecommendationsView.as_view(), name='recommendations'),
     path('instructor/courses/', InstructorCoursesView.as_view(), name='instructor-courses'),
     
     # Lesson endpoints
     path('courses/<int:course_id>/lessons/', LessonListCreateView.as_view(), name='lesson-list-create'),
     path('lessons/<int:pk>/', LessonDetailView.as_view(), name='lesson-detail'),
+    path('lessons/<int:pk>/materials/', LessonMaterialsView.as_view(), name='lesson-materials'),
+    
+    # Resumable lesson material uploads
+    path('lessons/<int:pk>/uploads/', MaterialUploadCreateView.as_view(), name='material-upload-create'),
+    path('uploads/<uuid:pk>/', MaterialUploadDetailView.as_view(), name='material-upload-detail'),
+    path('uploads/<uuid:pk>/finalize/', MaterialUploadFinalizeView.as_view(), name='material-upload-finalize'),
     
     # Enrollment endpoints
     path('enrollments/', EnrollmentListView.as_view(), name='enrollment-list'),
     path('enrollments/create/', EnrollmentCreateView.as_view(), name='enrollment-create'),
     path('enrollments/<int:pk>/', EnrollmentDetailView.as_view(), name='enrollment-detail'),
     path('enrollments/<int:pk>/progress/', ProgressUpdateView.as_view(), name='progress-update'),
+    path('resume/', ResumeView.as_view(), name='resume'),
+    path('courses/<int:course_id>/resume/', CourseResumeView.as_view(), name='course-resume'),
 ]
@@ -1,22 +1,66 @@
 from rest_framework import generics, status, permissions, filters
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.settings import api_settings
 from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from .models import Course, Lesson, Enrollment
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from core.batch import IdentityCacheMixin
+from core.deletion import schedule_deletion
+from core.idempotency import IdempotencyMixin
+from core.media import serve_file
+from core.metrics import record_cache
+from core.serializers import DeletionSerializer
+from core.sqlite import retry_on_lock
+from core.timing import ServerTimingMixin
+from .models import Course, Lesson, Enrollment, MaterialUpload
 from .serializers import (
-    CourseSerializer, CourseCreateSerializer,
+    CourseSerializer, CourseDetailSerializer, CourseCreateSerializer,
     LessonSerializer, LessonCreateSerializer,
     EnrollmentSerializer, EnrollmentCreateSerializer,
-    ProgressUpdateSerializer
+    ProgressUpdateSerializer, ResumeSerializer, MaterialUploadSerializer,
+    CourseRecommendationSerializer
+)
+from .autocomplete import search_titles
+from .cache import catalog_key
+from .facets import course_facets
+from .pagination import LessonCursorPagination
+from .recommendations import neighbor_count, recommend_for_user, similar_courses
+from .uploads import (
+    create_upload, discard_upload, finalize_upload, parse_content_length, parse_content_range, write_chunk
 )
 from .permissions import (
     IsInstructorOrReadOnly, IsCourseInstructorOrReadOnly,
-    IsLessonInstructorOrReadOnly, IsEnrollmentOwnerOrReadOnly
+    IsLessonInstructorOrReadOnly, IsEnrollmentOwnerOrReadOnly,
+    IsEnrolledOrCourseInstructor
 )
 
-class CourseListCreateView(generics.ListCreateAPIView):
+class EnrollmentStateMixin:
+    """
+    Course responses carrying the requesting user's enrollment state. They
+    differ per user, so shared caches must key them on the token and never
+    store an authenticated one.
+    """
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['enrollment_state'] = True
+        return context
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        patch_vary_headers(response, ['Authorization'])
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True)
+        return response
+
+class CourseListCreateView(EnrollmentStateMixin, IdempotencyMixin, ServerTimingMixin, generics.ListCreateAPIView):
     queryset = Course.objects.all()
+    replica_reads = True
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'difficulty', 'instructor']
     search_fields = ['title', 'description']
@@ -33,18 +77,94 @@ class CourseListCreateView(generics.ListCreateAPIView):
             return [IsInstructorOrReadOnly()]
         return [permissions.AllowAny()]
 
-class CourseDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CourseFacetsView(ServerTimingMixin, generics.GenericAPIView):
+    """Course counts per category, difficulty and instructor for the catalog filters"""
     queryset = Course.objects.all()
-    serializer_class = CourseSerializer
+    permission_classes = [permissions.AllowAny]
+    replica_reads = True
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filterset_fields = CourseListCreateView.filterset_fields
+    search_fields = CourseListCreateView.search_fields
+    
+    def get(self, request):
+        filter_params = {*self.filterset_fields, api_settings.SEARCH_PARAM}
+        if not filter_params.isdisjoint(request.query_params):
+            return Response(course_facets(self.filter_queryset(self.get_queryset())))
+        
+        # The unfiltered counts are the same for everyone until the catalog changes
+        key = catalog_key('facets')
+        facets = cache.get(key)
+        record_cache('catalog-facets', facets is not None)
+        if facets is None:
+            facets = course_facets(self.get_queryset())
+            cache.set(key, facets, settings.CATALOG_CACHE_TIMEOUT)
+        return Response(facets)
+
+class CourseAutocompleteView(ServerTimingMixin, APIView):
+    """Ids and titles of courses with a word starting with `?q=`, most enrolled first"""
+    # Same answer for everyone: skip decoding the token on every keystroke
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    replica_reads = True
+    max_limit = 20
+    
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 10
+        results = search_titles(request.query_params.get('q', ''), min(max(limit, 1), self.max_limit))
+        return Response([{'id': pk, 'title': title} for pk, title in results])
+
+class CourseDetailView(EnrollmentStateMixin, IdentityCacheMixin, ServerTimingMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Course.objects.all()
+    serializer_class = CourseDetailSerializer
     permission_classes = [IsCourseInstructorOrReadOnly]
+    
+    def destroy(self, request, *args, **kwargs):
+        # Hidden at once; lessons and enrollments are removed in the background
+        deletion = schedule_deletion(self.get_object(), requested_by=request.user)
+        return Response(DeletionSerializer(deletion).data, status=status.HTTP_202_ACCEPTED)
+
+def recommendation_limit(request):
+    """`?limit=` clamped to the number of neighbours stored per course"""
+    try:
+        limit = int(request.query_params.get('limit', 10))
+    except ValueError:
+        limit = 10
+    return min(max(limit, 1), neighbor_count())
+
+class CourseRecommendationsView(ServerTimingMixin, APIView):
+    """Courses most often taken by learners of this course"""
+    permission_classes = [permissions.AllowAny]
+    replica_reads = True
+    
+    def get(self, request, pk):
+        recommendations = similar_courses(pk, recommendation_limit(request))
+        if not recommendations and not Course.objects.filter(pk=pk).exists():
+            raise Http404("Course not found.")
+        serializer = CourseRecommendationSerializer(recommendations, many=True, context={'request': request})
+        return Response(serializer.data)
 
-class LessonListCreateView(generics.ListCreateAPIView):
+class RecommendationsView(ServerTimingMixin, APIView):
+    """Courses similar to the ones the current user is enrolled in"""
+    permission_classes = [permissions.IsAuthenticated]
+    replica_reads = True
+    
+    def get(self, request):
+        recommendations = recommend_for_user(request.user, recommendation_limit(request))
+        serializer = CourseRecommendationSerializer(recommendations, many=True, context={'request': request})
+        return Response(serializer.data)
+
+class LessonListCreateView(IdempotencyMixin, ServerTimingMixin, generics.ListCreateAPIView):
     serializer_class = LessonSerializer
     permission_classes = [IsInstructorOrReadOnly]
+    pagination_class = LessonCursorPagination
+    replica_reads = True
     
     def get_queryset(self):
         course_id = self.kwargs.get('course_id')
-        return Lesson.objects.filter(course_id=course_id)
+        return Lesson.objects.filter(course_id=course_id, course__deleted_at__isnull=True)
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -60,60 +180,140 @@ class LessonListCreateView(generics.ListCreateAPIView):
         course = get_object_or_404(Course, id=self.kwargs.get('course_id'))
         serializer.save(course=course)
 
-class LessonDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Lesson.objects.all()
+class LessonDetailView(IdentityCacheMixin, ServerTimingMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Lesson.objects.filter(course__deleted_at__isnull=True)
     serializer_class = LessonSerializer
     permission_classes = [IsLessonInstructorOrReadOnly]
 
-class EnrollmentListView(generics.ListAPIView):
+class LessonMaterialsView(ServerTimingMixin, generics.GenericAPIView):
+    """Download a lesson's materials; supports Range requests for seeking in videos"""
+    queryset = Lesson.objects.select_related('course').filter(course__deleted_at__isnull=True)
+    permission_classes = [permissions.IsAuthenticated, IsEnrolledOrCourseInstructor]
+    
+    def get(self, request, *args, **kwargs):
+        lesson = self.get_object()
+        if not lesson.materials:
+            raise Http404("This lesson has no materials.")
+        return serve_file(request, lesson.materials)
+
+class EnrollmentListView(ServerTimingMixin, generics.ListAPIView):
     serializer_class = EnrollmentSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Enrollment.objects.filter(user=self.request.user)
+        return Enrollment.objects.filter(user=self.request.user, course__deleted_at__isnull=True)
 
-class EnrollmentCreateView(generics.CreateAPIView):
+class EnrollmentCreateView(IdempotencyMixin, ServerTimingMixin, generics.CreateAPIView):
     serializer_class = EnrollmentCreateSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    @retry_on_lock
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class EnrollmentDetailView(generics.RetrieveUpdateDestroyAPIView):
+class EnrollmentDetailView(IdentityCacheMixin, ServerTimingMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = EnrollmentSerializer
     permission_classes = [IsEnrollmentOwnerOrReadOnly]
     
     def get_queryset(self):
-        return Enrollment.objects.filter(user=self.request.user)
+        return Enrollment.objects.filter(user=self.request.user, course__deleted_at__isnull=True)
 
-class ProgressUpdateView(generics.UpdateAPIView):
+class ProgressUpdateView(IdempotencyMixin, ServerTimingMixin, generics.UpdateAPIView):
     serializer_class = ProgressUpdateSerializer
     permission_classes = [IsEnrollmentOwnerOrReadOnly]
+    idempotent_methods = ('PUT', 'PATCH')
     
     def get_queryset(self):
-        return Enrollment.objects.filter(user=self.request.user)
+        return Enrollment.objects.filter(user=self.request.user, course__deleted_at__isnull=True)
+    
+    @retry_on_lock
+    def perform_update(self, serializer):
+        serializer.save()
 
-class CourseEnrollView(APIView):
+class ResumeView(ServerTimingMixin, generics.ListAPIView):
+    """Where to continue each course the user is enrolled in and hasn't completed"""
+    serializer_class = ResumeSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    def get_queryset(self):
+        return Enrollment.objects.resume_points(self.request.user).filter(completed=False)
+
+class CourseResumeView(IdentityCacheMixin, ServerTimingMixin, generics.RetrieveAPIView):
+    """Where to continue one course"""
+    serializer_class = ResumeSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_field = 'course_id'
+    
+    def get_queryset(self):
+        return Enrollment.objects.resume_points(self.request.user)
+
+class CourseEnrollView(IdempotencyMixin, ServerTimingMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    @retry_on_lock
     def post(self, request, course_id):
         course = get_object_or_404(Course, id=course_id)
         
-        # Check if already enrolled
-        if Enrollment.objects.filter(user=request.user, course=course).exists():
+        # One conflict-tolerant INSERT: no exists() check for a double click to race past
+        enrollment = Enrollment.objects.enroll(request.user, course)
+        if enrollment is None:
             return Response({
                 'error': 'You are already enrolled in this course'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Create enrollment
-        enrollment = Enrollment.objects.create(user=request.user, course=course)
         serializer = EnrollmentSerializer(enrollment)
         
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-class InstructorCoursesView(generics.ListAPIView):
+class InstructorCoursesView(ServerTimingMixin, generics.ListAPIView):
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
         return Course.objects.filter(instructor=self.request.user)
+
+class MaterialUploadCreateView(ServerTimingMixin, generics.CreateAPIView):
+    """Start a resumable upload of a lesson's materials"""
+    serializer_class = MaterialUploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def perform_create(self, serializer):
+        lesson = get_object_or_404(Lesson.objects.select_related('course'), pk=self.kwargs['pk'], course__deleted_at__isnull=True)
+        if lesson.course.instructor_id != self.request.user.id:
+            raise PermissionDenied("Only the course instructor can upload lesson materials.")
+        serializer.instance = create_upload(lesson, self.request.user, **serializer.validated_data)
+
+class MaterialUploadDetailView(ServerTimingMixin, APIView):
+    """Report the current offset (GET), append a chunk (PUT) or abort (DELETE)"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_object(self, request, pk):
+        return get_object_or_404(MaterialUpload, pk=pk, user=request.user)
+    
+    def get(self, request, pk):
+        return Response(MaterialUploadSerializer(self.get_object(request, pk)).data)
+    
+    def put(self, request, pk):
+        upload = self.get_object(request, pk)
+        length = parse_content_length(request.META.get('CONTENT_LENGTH'))
+        offset, total = parse_content_range(request.META.get('HTTP_CONTENT_RANGE'), length)
+        if total != upload.size:
+            return Response({
+                'error': 'Content-Range total does not match the upload size'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        # Read the raw body stream; touching request.data would buffer it
+        write_chunk(upload, offset, request.stream, length, request.META.get('HTTP_X_CHUNK_SHA256'))
+        return Response(MaterialUploadSerializer(upload).data)
+    
+    def delete(self, request, pk):
+        discard_upload(self.get_object(request, pk))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class MaterialUploadFinalizeView(ServerTimingMixin, APIView):
+    """Verify a complete upload and attach it to the lesson"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request, pk):
+        upload = get_object_or_404(MaterialUpload.objects.select_related('lesson'), pk=pk, user=request.user)
+        lesson = finalize_upload(upload)
+        return Response(LessonSerializer(lesson, context={'request': request}).data)
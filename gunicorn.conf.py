@@ -1,6 +1,12 @@
 # Gunicorn configuration file
 import os
 import multiprocessing
+import shutil
+import tempfile
+
+# Imported up front: child_exit runs inside a signal handler, where a first
+# import can interrupt another one half-way
+from core.metrics import merge_process
 
 # Server socket
 bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
@@ -35,3 +41,18 @@ tmp_upload_dir = None
 # SSL (not needed for Render as it handles SSL)
 keyfile = None
 certfile = None
+
+# Metrics: every worker writes to its own file in METRICS_DIR (core.metrics).
+# Set it here so the master and all workers agree on the directory.
+metrics_dir = os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'elearning-metrics'))
+
+
+def on_starting(server):
+    # Start from zero; files left by a previous run would be summed in
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Fold the dead worker's counters into the archive so they stay monotonic
+    merge_process(metrics_dir, worker.pid)
@@ -18,11 +18,15 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from core.views import BatchView, DeletionDetailView, metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('accounts.urls')),
     path('api/', include('courses.urls')),
+    path('api/deletions/<int:pk>/', DeletionDetailView.as_view(), name='deletion-detail'),
+    path('api/batch/', BatchView.as_view(), name='batch'),
+    path('metrics', metrics, name='metrics'),
 ]
 
 # Serve media files during development